@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------------------------------------------------
+# Project:             my-renamer
+# Repository:          http://code.google.com/p/my-renamer/
+# License:             Creative Commons GNU GPL v2 (http://creativecommons.org/licenses/GPL/2.0/)
+# Purpose of document: Headless (no Qt) batch renaming driven by a json config
+# --------------------------------------------------------------------------------------------------------------------
+"""
+sample config:
+{
+  "mode": "tv",
+  "input": {"folder": "/data/incoming", "recursive": true},
+  "output": {"folder": "/data/tv", "use_source": true, "is_move": true},
+  "cache_file": "cache.db",
+  "dry_run": false
+}
+
+input and output hold the attributes of common.config.InputConfig and OutputConfig. Anything not given keeps its
+default value. The result of each item is written to the output stream as a json line, followed by a summary line.
+"""
+import json
+import sys
+
+from common import cache
+from common import config
+from common import file_helper
+from common import formatting
+from common import renamer
+from common import scan_index
+from common import utils
+from media.base import types as base_types
+from media.movie import manager as movie_manager
+from media.tv import manager as tv_manager
+
+DRY_RUN = "Dry run" #result status of items that would have been renamed
+SKIPPED = "Skipped" #result status of items that are not ready to be renamed
+_COMPATIBLE_TYPES = ((bool, int, long), (str, unicode)) #a setting takes any value in the group of its default's type
+
+# --------------------------------------------------------------------------------------------------------------------
+class BatchConfig(object):
+  """ settings of a batch run. see module doc for the json layout """
+  def __init__(self):
+    super(BatchConfig, self).__init__()
+    self.mode = base_types.TV_MODE
+    self.input = config.InputConfig()
+    self.output = config.OutputConfig()
+    self.cache_file = ""
+    self.dry_run = False
+
+  @staticmethod
+  def fromDict(data):
+    """ raises ValueError if data contains an unknown or invalid setting """
+    ret = BatchConfig()
+    data = dict(data)
+    ret.mode = data.pop("mode", ret.mode)
+    if ret.mode not in base_types.VALID_MODES:
+      raise ValueError("invalid mode: {}. must be one of {}".format(ret.mode, ", ".join(base_types.VALID_MODES)))
+    _setAttributes(ret.input, data.pop("input", {}), "input")
+    _setAttributes(ret.output, data.pop("output", {}), "output")
+    ret.cache_file = _checkType("cache_file", data.pop("cache_file", ret.cache_file), ret.cache_file)
+    ret.dry_run = bool(_checkType("dry_run", data.pop("dry_run", ret.dry_run), ret.dry_run))
+    if data:
+      raise ValueError("unknown settings: {}".format(", ".join(sorted(data))))
+    if not ret.input.folder:
+      raise ValueError("input.folder must be set")
+    if ret.output.format:
+      _getFormatter(ret.mode).compile(ret.output.format) #raises formatting.FormatError (a ValueError)
+    if ret.output.fsync_policy not in renamer.FSYNC_POLICIES:
+      raise ValueError("invalid output.fsync_policy: {}".format(ret.output.fsync_policy))
+    return ret
+
+  @staticmethod
+  def fromFile(filename):
+    with open(filename) as f:
+      return BatchConfig.fromDict(json.load(f))
+
+def _getFormatter(mode):
+  return formatting.TvNameFormatter() if mode == base_types.TV_MODE else formatting.MovieNameFormatter()
+
+def _checkType(name, value, default):
+  """ returns value if it has the same type as the setting's default, otherwise raises ValueError. settings without
+  a default (None) take a string """
+  if value is None and default is None:
+    return value
+  default_type = type(default) if default is not None else str
+  valid_types = next((types for types in _COMPATIBLE_TYPES if issubclass(default_type, types)), default_type)
+  if not isinstance(value, valid_types):
+    raise ValueError("invalid setting: {}={}. expected type: {}".format(name, json.dumps(value, default=repr), 
+                                                                      default_type.__name__))
+  return value
+
+def _setAttributes(obj, values, name):
+  for key, value in values.items():
+    if not hasattr(obj, key):
+      raise ValueError("unknown setting: {}.{}".format(name, key))
+    setattr(obj, key, _checkType("{}.{}".format(name, key), value, getattr(obj, key)))
+
+# --------------------------------------------------------------------------------------------------------------------
+class BatchRenamer(object):
+  """ finds, looks up and renames every item under the input folder, writing a json line per item to out """
+  def __init__(self, batch_config, out=None):
+    super(BatchRenamer, self).__init__()
+    self._config = batch_config
+    self._out = out or sys.stdout
+    self._is_tv = batch_config.mode == base_types.TV_MODE
+    self._manager = tv_manager.getManager() if self._is_tv else movie_manager.getManager()
+    self._scan_index = None
+    formatter = _getFormatter(batch_config.mode)
+    if not batch_config.output.format:
+      batch_config.output.format = formatter.DEFAULT_FORMAT_STR
+    self._generator = renamer.RenameItemGenerator(formatter, batch_config.output)
+    self._counts = {}
+
+  def run(self):
+    """ returns a dictionary of the number of items with each status """
+    self._counts = {}
+    self._openCache()
+    unsynced = [] #only kept for the batch policy so memory use doesn't grow with the number of files
+    try:
+      for item in self._iterItems():
+        rename_item = self._processItem(item)
+        if rename_item and self._config.output.fsync_policy == renamer.FSYNC_BATCH:
+          unsynced.append(rename_item)
+      for rename_item in unsynced:
+        rename_item.sync()
+    finally:
+      self._closeCache()
+    self._write({"summary": self._counts})
+    return self._counts
+
+  def _iterItems(self):
+    input_config = self._config.input
+    if self._is_tv:
+      for folder in file_helper.FileHelper.iterFolders(input_config.folder, input_config.recursive, self._scan_index,
+                                                       input_config.num_scan_threads):
+        season = self._manager.getSeasonForFolder(folder, input_config.getExtensions(),
+                                                  input_config.getMinFileSizeBytes())
+        if season:
+          for item in season.episode_move_items:
+            if item.filename: #skip the episodes with no matching file
+              yield item
+    else:
+      for movie in movie_manager.MovieHelper.iterMovies(input_config.folder, input_config.getExtensions(),
+                                                        input_config.recursive, input_config.getMinFileSizeBytes(),
+                                                        self._scan_index, input_config.num_scan_threads):
+        yield self._manager.lookupMovies([movie])[0]
+
+  def _processItem(self, item):
+    """ renames the item if it is valid. returns the common.renamer.BaseRenamer if the rename was performed """
+    result = {"source": item.filename, "dest": None, "status": SKIPPED, "reason": item.getStatus(), "digest": None}
+    rename_item = None
+    if item.isValid():
+      rename_item = self._generator.getRenameItem(item)
+      result["dest"] = rename_item.dest
+      result["reason"] = None
+      if self._config.dry_run:
+        result["status"] = DRY_RUN
+        rename_item = None
+      else:
+        status = rename_item.performAction()
+        result["status"] = renamer.BaseRenamer.SUCCESS if status == renamer.BaseRenamer.SUCCESS else \
+                           renamer.BaseRenamer.FAILED
+        result["reason"] = None if status == renamer.BaseRenamer.SUCCESS else status
+        result["digest"] = rename_item.digest or None
+        if status != renamer.BaseRenamer.SUCCESS:
+          rename_item = None
+    elif item.getStatus() == base_types.BaseRenameItem.READY:
+      result["reason"] = "{} not found".format(self._config.mode)
+    self._counts[result["status"]] = self._counts.get(result["status"], 0) + 1
+    self._write(result)
+    return rename_item
+
+  def _write(self, data):
+    self._out.write(json.dumps(data, sort_keys=True))
+    self._out.write("\n")
+    self._out.flush()
+
+  def _openCache(self):
+    cache_file = self._config.cache_file
+    if not cache_file:
+      return
+    self._scan_index = scan_index.ScanIndex(cache_file)
+    self._manager.setCache(cache.InfoCache(cache_file, self._config.mode, config.CACHE_VERSION))
+    self._manager.setScanIndex(self._scan_index)
+
+  def _closeCache(self):
+    if not self._config.cache_file:
+      return
+    self._manager.cache().close()
+    self._scan_index.close()
+
+# --------------------------------------------------------------------------------------------------------------------
+def run(config_file, out=None):
+  """ runs the batch described by the json config_file. returns the process exit code """
+  try:
+    batch_config = BatchConfig.fromFile(config_file)
+  except (EnvironmentError, ValueError) as e:
+    utils.logError("could not load batch config: {}".format(e))
+    sys.stderr.write("could not load batch config: {}\n".format(e))
+    return 2
+  counts = BatchRenamer(batch_config, out).run()
+  return 1 if counts.get(renamer.BaseRenamer.FAILED) else 0
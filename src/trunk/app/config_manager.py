@@ -21,8 +21,6 @@ import os
 import sys
 import traceback
 
-from PyQt4 import QtGui
-
 from common import file_helper
 from common import utils
 
@@ -30,12 +28,18 @@ jsonpickle.set_encoder_options("simplejson", indent=2)
 
 # --------------------------------------------------------------------------------------------------------------------
 class ConfigManager(object):
-  """ manages serialization to / from file using json pickle """
+  """ manages serialization to / from file using json pickle 
+  
+  Args:
+    error_cb: called with the filename and the error details if the config could not be saved. eg. the gui uses this
+      to show a message box
+  """
 
-  def __init__(self):
+  def __init__(self, error_cb=None):
     """ """
     super(ConfigManager, self).__init__()
     self._data = {}
+    self._error_cb = error_cb
 
   def getData(self, key, default=""):
     """ retrieve value from data. assumes loadConfig() has already been performed """
@@ -72,9 +76,8 @@ class ConfigManager(object):
         os.remove(filename)
       os.rename(tmp_file, filename)
     except Exception as ex: #json pickle catches Exception so I guess we have to too
-      message_box = QtGui.QMessageBox(QtGui.QMessageBox.Information,
-                             "An error occured", "Unable to save to settings file:\n{}".format(filename))
       error = ["Error:\n{}\n\n".format(str(ex)), "Exception:\n", "".join(traceback.format_exception(*sys.exc_info()))]
-      message_box.setDetailedText("".join(error))
-      message_box.exec_()
+      utils.logError("Unable to save to settings file: {}".format(filename), "".join(error))
+      if self._error_cb:
+        self._error_cb(filename, "".join(error))
       #raise #for debugging
@@ -7,73 +7,12 @@
 # --------------------------------------------------------------------------------------------------------------------
 from threading import Lock
 from PyQt4 import QtCore
-from functools import partial
 
-from common import file_helper
+from common import formatting
 from common import thread
-from media.base import types as base_types
+from common import utils
 from app import factory
-
-# --------------------------------------------------------------------------------------------------------------------
-class SearchThread(thread.AdvancedWorkerThread):
-  """ Thread responsible for finding renamable items 
-  
-  Args:
-    mode: used for logging etc.
-    manager: media.base.manager.BaseManager object that uses the config to apply the search
-    config: common.config.InputConfig object
-  """
-  def __init__(self, mode, manager, config):
-    super(SearchThread, self).__init__("search {}".format(mode))
-    self._manager = manager
-    self._config = config
-
-  def _getAllItems(self):
-    raise NotImplementedError("SearchThread._getAllItems not implemented")
-
-  def _applyToItem(self, item):
-    raise NotImplementedError("SearchThread._applyToItem not implemented")
-
-# --------------------------------------------------------------------------------------------------------------------
-class TvSearchThread(SearchThread):
-  """ class that performs a search for tv folders and their episode files """
-  def __init__(self, manager, config):
-    super(TvSearchThread, self).__init__(base_types.TV_MODE, manager, config)
-
-  def _getAllItems(self):
-    return file_helper.FileHelper.getFolders(self._config.folder, self._config.recursive)
-
-  def _applyToItem(self, item):
-    season = self._manager.getSeasonForFolder(item, self._config.getExtensions(), self._config.getMinFileSizeBytes())
-    ret = None
-    if season:
-      ret = thread.WorkItem(season, season.getStatus())
-    return ret
-
-# --------------------------------------------------------------------------------------------------------------------
-class MovieSearchThread(SearchThread):
-  """ class that performs a search for movie files """
-  def __init__(self, manager, config):
-    super(MovieSearchThread, self).__init__(base_types.MOVIE_MODE, manager, config)
-
-  def _getAllItems(self):
-    return self._manager.helper.getFiles(self._config.folder,
-                                         self._config.getExtensions(),
-                                         self._config.recursive,
-                                         self._config.getMinFileSizeBytes())
-
-  def _applyToItem(self, item):
-    item = self._manager.processFile(item)
-    ret = None
-    if item:
-      ret = thread.WorkItem(item, item.getStatus())
-    return ret
-
-def getSearchThread(mode, manager, config):
-  if mode == base_types.MOVIE_MODE:
-    return MovieSearchThread(manager, config)
-  else:
-    return TvSearchThread(manager, config)
+from app import search
 
 # --------------------------------------------------------------------------------------------------------------------
 class RenamerModule(QtCore.QObject):
@@ -118,7 +57,8 @@ class RenamerModule(QtCore.QObject):
     for widget in self._widgets:
       widget.startExploring()
 
-    self._search_thread = getSearchThread(self.mode, self._manager, self.input_widget.getConfig())
+    self._search_thread = thread.WorkerThread(search.getSearchWorker(self.mode, self._manager,
+                                                                     self.input_widget.getConfig()))
     self._search_thread.progress_signal.connect(self.input_widget.progress_widget.setProgress)
     self._search_thread.new_data_signal.connect(self.work_bench.addItem)
     #self._search_thread.log_signal.connect(self.log_signal)
@@ -128,7 +68,11 @@ class RenamerModule(QtCore.QObject):
 
   def _rename(self):
     self._renamer.config = self.output_widget.getConfig()
-    items = [self._renamer.getRenameItem(i) for i in self.work_bench.actionableItems()]
+    try:
+      items = [self._renamer.getRenameItem(i) for i in self.work_bench.actionableItems()]
+    except formatting.FormatError as ex: #the output widget's preview shows the error
+      utils.logError("invalid output format: {}".format(ex))
+      return
     self.new_rename_items_signal.emit(items)
 
   def setActive(self):
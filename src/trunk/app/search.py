@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------------------------------------------------
+# Project:             my-renamer
+# Repository:          http://code.google.com/p/my-renamer/
+# License:             Creative Commons GNU GPL v2 (http://creativecommons.org/licenses/GPL/2.0/)
+# Purpose of document: Workers that find the renamable items of a mode
+# --------------------------------------------------------------------------------------------------------------------
+from functools import partial
+
+from common import file_helper
+from common import pipeline
+from common import worker
+from media.base import types as base_types
+
+_LOOKUP_BATCH_SIZE = 50 # max number of items looked up together. smaller batches are sent if that is all that's ready
+
+# --------------------------------------------------------------------------------------------------------------------
+class SearchWorker(worker.AdvancedWorker):
+  """ Worker responsible for finding renamable items
+
+  Args:
+    mode: used for logging etc.
+    manager: media.base.manager.BaseManager object that uses the config to apply the search
+    config: common.config.InputConfig object
+  """
+  def __init__(self, mode, manager, config):
+    super(SearchWorker, self).__init__("search {}".format(mode))
+    self._manager = manager
+    self._config = config
+
+  def _getAllItems(self):
+    raise NotImplementedError("SearchWorker._getAllItems not implemented")
+
+  def _applyToItem(self, item):
+    raise NotImplementedError("SearchWorker._applyToItem not implemented")
+
+# --------------------------------------------------------------------------------------------------------------------
+class TvSearchWorker(SearchWorker):
+  """ class that performs a search for tv folders and their episode files. folders are streamed through a pipeline
+  that parses the season from the folder name and then looks up the seasons in batches, so seasons are emitted while
+  the search is still finding folders """
+  def __init__(self, manager, config):
+    super(TvSearchWorker, self).__init__(base_types.TV_MODE, manager, config)
+
+  def _getAllItems(self):
+    folders = file_helper.FileHelper.iterFolders(self._config.folder, self._config.recursive,
+                                                 self._manager.scanIndex(), self._config.num_scan_threads)
+    return pipeline.Pipeline(folders).addStage(
+        self._parseFolders).addStage(
+        partial(self._manager.lookupSeasons,
+                extension_filter=self._config.getExtensions(),
+                min_file_size_bytes=self._config.getMinFileSizeBytes()),
+        batch_size=_LOOKUP_BATCH_SIZE)
+
+  def _parseFolders(self, folders):
+    return zip(folders, self._manager.helper.seasonsFromFolderNames(folders))
+
+  def _applyToItem(self, item):
+    ret = None
+    if item:
+      ret = worker.WorkItem(item, item.getStatus())
+    return ret
+
+# --------------------------------------------------------------------------------------------------------------------
+class MovieSearchWorker(SearchWorker):
+  """ class that performs a search for movie files. the movies parsed from the files of each folder as it is found 
+  are streamed through a pipeline that looks them up in batches, so movies are emitted while the search is still 
+  finding files """
+  def __init__(self, manager, config):
+    super(MovieSearchWorker, self).__init__(base_types.MOVIE_MODE, manager, config)
+
+  def _getAllItems(self):
+    movies = self._manager.helper.iterMovies(self._config.folder,
+                                             self._config.getExtensions(),
+                                             self._config.recursive,
+                                             self._config.getMinFileSizeBytes(),
+                                             self._manager.scanIndex(),
+                                             self._config.num_scan_threads)
+    return pipeline.Pipeline(movies).addStage(self._manager.lookupMovies, batch_size=_LOOKUP_BATCH_SIZE)
+
+  def _applyToItem(self, item):
+    ret = None
+    if item:
+      ret = worker.WorkItem(item, item.getStatus())
+    return ret
+
+def getSearchWorker(mode, manager, config):
+  if mode == base_types.MOVIE_MODE:
+    return MovieSearchWorker(manager, config)
+  else:
+    return TvSearchWorker(manager, config)
@@ -6,13 +6,15 @@
 # Purpose of document: MainWindow for the application
 # --------------------------------------------------------------------------------------------------------------------
 import functools
-import threading
 from PyQt4 import QtGui
 from PyQt4 import QtCore
 from PyQt4 import uic
 
+from common import cache
 from common import config
 from common import file_helper
+from common import renamer
+from common import scan_index
 from common import utils
 from common import thread
 from common import widget as base_widget
@@ -26,7 +28,7 @@ from app import factory
 # --------------------------------------------------------------------------------------------------------------------
 class MainWindow(QtGui.QMainWindow):
   """ main window for the app """
-  def __init__(self, config_file="config.txt", cache_file="cache.txt", parent=None):
+  def __init__(self, config_file="config.txt", cache_file="cache.db", parent=None):
     super(MainWindow, self).__init__(parent)
     self.setWindowIcon(QtGui.QIcon("img/icon.ico"))
     self._config_file = config_file
@@ -49,8 +51,8 @@ class MainWindow(QtGui.QMainWindow):
     self._addDockWidget(self._output_widget, dock_areas, QtCore.Qt.BottomDockWidgetArea, "Output Settings")
     self._addDockWidget(self._log_widget, dock_areas, QtCore.Qt.BottomDockWidgetArea, "Rename Items")
 
-    self._config_manager = config_manager.ConfigManager()
-    self._cache_manager = config_manager.ConfigManager()
+    self._config_manager = config_manager.ConfigManager(error_cb=self._onSaveConfigError)
+    self._scan_index = None
 
     self._mode_to_module = {}
     for mode in base_types.VALID_MODES:
@@ -170,7 +172,7 @@ class MainWindow(QtGui.QMainWindow):
 
   def _saveSettings(self):
     self._saveSettingsConfig()
-    self._saveCache()
+    self._closeCache()
 
   def _saveSettingsConfig(self):
     data = config.MainWindowConfig()
@@ -186,12 +188,17 @@ class MainWindow(QtGui.QMainWindow):
         self._config_manager.setData(widget.config_name, widget.getConfig())
     self._config_manager.saveConfig(self._config_file)
 
-  def _saveCache(self):
-    self._cache_manager.setData("version", config.CACHE_VERSION)
-    for m in base_types.VALID_MODES:
-      manager = factory.Factory.getManager(m)
-      self._cache_manager.setData("cache/{}".format(m), manager.cache())
-    self._cache_manager.saveConfig(self._cache_file)
+  def _onSaveConfigError(self, filename, details):
+    message_box = QtGui.QMessageBox(QtGui.QMessageBox.Information,
+                           "An error occured", "Unable to save to settings file:\n{}".format(filename))
+    message_box.setDetailedText(details)
+    message_box.exec_()
+
+  def _closeCache(self):
+    """ writes the caches to disk and stops their flusher threads. only called when the window is closing """
+    for mode in base_types.VALID_MODES:
+      factory.Factory.getManager(mode).cache().close()
+    self._scan_index.close()
 
   def _loadSettings(self):
     self._loadSettingsConfig()
@@ -227,15 +234,11 @@ class MainWindow(QtGui.QMainWindow):
         QtGui.QMessageBox.warning(self, "Config error", "Default config is in a bad state. Fix me!")
 
   def _loadCache(self):
-    self._cache_manager.loadConfig(self._cache_file)
-    cache_version = self._cache_manager.getData("version", "0.0")
-    if cache_version != config.CACHE_VERSION:
-      utils.logDebug(
-          "cache version of out date, loading default. old={} new={}".format(cache_version, config.CACHE_VERSION))
-      return
-
+    self._scan_index = scan_index.ScanIndex(self._cache_file)
     for mode in base_types.VALID_MODES:
-      factory.Factory.getManager(mode).setCache(self._cache_manager.getData("cache/{}".format(mode), {}))
+      manager = factory.Factory.getManager(mode)
+      manager.setCache(cache.InfoCache(self._cache_file, mode, config.CACHE_VERSION))
+      manager.setScanIndex(self._scan_index)
 
   def _restoreDefaults(self):
     self._is_restoring_defaults = True
@@ -244,8 +247,9 @@ class MainWindow(QtGui.QMainWindow):
     self._is_restoring_defaults = False
 
   def _clearCache(self):
-    file_helper.FileHelper.removeFile(self._cache_file)
-    self._loadCache()
+    for mode in base_types.VALID_MODES:
+      factory.Factory.getManager(mode).cache().clear()
+    self._scan_index.clear()
 
 # --------------------------------------------------------------------------------------------------------------------
 class WelcomeWidget(QtGui.QDialog):
@@ -351,36 +355,16 @@ class _LogModel(QtCore.QAbstractTableModel):
 
 # --------------------------------------------------------------------------------------------------------------------
 class _RenameThread(thread.WorkerThread):
+  """ runs a common.renamer.RenameWorker, emitting item_changed_signal as each item progresses """
   item_changed_signal = QtCore.pyqtSignal(object, int)
-  """ 
-  thread responsible for performing the rename
-  
-  Args:
-    items: list of common.renamer.BaseRenamer objects to be renamed
-  """
-  def __init__(self, name="renamer", items=None):
-    super(_RenameThread, self).__init__(name)
-    self._mutex = threading.Lock()
-    self._items = items or []
-    self._current_item = None
-    
-  def _run(self):
-    while not self._user_stopped:
-      self._current_item = None
-      with self._mutex:
-        if not self._items:
-          break
-        self._current_item = self._items.pop(0)
-      self._current_item.performAction(progress_cb=self._itemUpdated)
-      self._itemUpdated()
-      
-  def _itemUpdated(self, percentage=0):
-    self.item_changed_signal.emit(self._current_item, percentage)
-    return not self._user_stopped
+
+  def __init__(self, items=None):
+    super(_RenameThread, self).__init__(renamer.RenameWorker(items=items))
+    self.worker.item_changed_cb = self.item_changed_signal.emit
 
   def addItems(self, items):
-    with self._mutex:
-      self._items.extend(items)
+    """ returns True if the items will be renamed without calling start() """
+    return self.worker.addItems(items)
 
 # --------------------------------------------------------------------------------------------------------------------
 class LogWidget(QtGui.QWidget):
@@ -423,9 +407,9 @@ class LogWidget(QtGui.QWidget):
       self._rename_thread = _RenameThread(items=items)
       self._rename_thread.item_changed_signal.connect(self._model.itemChanged)
       self._rename_thread.log_signal.connect(self._onLog)      
-    else:
-      self._rename_thread.addItems(items)      
-    if not self.isExecuting():
+      self._rename_thread.start()
+    elif not self._rename_thread.addItems(items):
+      self._rename_thread.wait() #the worker has finished but the thread may not have exited yet
       self._rename_thread.start()
     
   def isExecuting(self):
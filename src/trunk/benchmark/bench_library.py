@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------------------------------------------------
+# Project:             my-renamer
+# Repository:          http://code.google.com/p/my-renamer/
+# License:             Creative Commons GNU GPL v2 (http://creativecommons.org/licenses/GPL/2.0/)
+# Purpose of document: Times each stage of a tv and movie rename over generated libraries
+# --------------------------------------------------------------------------------------------------------------------
+"""
+For each size a library is generated with benchmark.library and then each stage is timed on its own:
+  scan: FileHelper.getFolders() / MovieHelper.getFiles()
+  parse: TvManager.getSeasonForFolder() / MovieManager.processFile()
+  generate: RenameItemGenerator.getRenameItem()
+  rename: FileRenamer.performAction(), moving the files to an output folder in the same file system
+
+The info cache is filled with the generated infos and no info clients are used, so no network requests are made.
+Compare the json from different versions to find regressions.
+
+sample usage:
+$ python benchmark/bench_library.py --sizes 1000 10000 100000 --output library.json
+"""
+if __name__ == "__main__":
+  import sys
+  import os
+  sys.path.insert(0, os.path.abspath(__file__+"/../../"))
+
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmark import library
+from common import config
+from common import file_helper
+from common import formatting
+from common import renamer
+from media.base import client as base_client
+from media.movie import manager as movie_manager
+from media.tv import manager as tv_manager
+
+# --------------------------------------------------------------------------------------------------------------------
+def _time(results, stage, fn, *args):
+  start = time.time()
+  ret = fn(*args)
+  results[stage + "_secs"] = time.time() - start
+  return ret
+
+def _getGenerator(formatter, output_folder):
+  output_config = config.OutputConfig()
+  output_config.format = formatter.DEFAULT_FORMAT_STR
+  output_config.folder = output_folder
+  return renamer.RenameItemGenerator(formatter, output_config)
+
+def _renameItems(items, generator, results):
+  """ times the generate and rename stages for the valid items """
+  items = [item for item in items if item.isValid()]
+  results["valid_items"] = len(items)
+  rename_items = _time(results, "generate", lambda: [generator.getRenameItem(item) for item in items])
+  statuses = _time(results, "rename", lambda: [rename_item.performAction() for rename_item in rename_items])
+  results["renamed"] = statuses.count(renamer.BaseRenamer.SUCCESS)
+
+def _runTv(lib, input_config, output_folder):
+  ret = {}
+  manager = tv_manager.TvManager(base_client.InfoClientHolder())
+  for season in lib.seasons:
+    manager.setInfo(season)
+  folders = _time(ret, "scan", file_helper.FileHelper.getFolders, lib.tv_folder, True)
+  seasons = _time(ret, "parse", lambda: [manager.getSeasonForFolder(folder, input_config.getExtensions(),
+                                                                    input_config.getMinFileSizeBytes())
+                                         for folder in folders])
+  items = [item for season in seasons if season for item in season.episode_move_items if item.filename]
+  ret.update({"folders": len(folders), "items": len(items)})
+  _renameItems(items, _getGenerator(formatting.TvNameFormatter(), output_folder), ret)
+  return ret
+
+def _runMovies(lib, input_config, output_folder):
+  ret = {}
+  manager = movie_manager.MovieManager(base_client.InfoClientHolder())
+  for movie in lib.movies:
+    manager.setInfo(movie)
+  ext_counts = {}
+  files = _time(ret, "scan", movie_manager.MovieHelper.getFiles, lib.movie_folder, input_config.getExtensions(), True,
+                input_config.getMinFileSizeBytes(), None, 1, ext_counts)
+  items = _time(ret, "parse", lambda: [manager.processFile(filename, ext_counts) for filename in files])
+  ret["items"] = len(items)
+  _renameItems(items, _getGenerator(formatting.MovieNameFormatter(), output_folder), ret)
+  return ret
+
+def run(sizes, root, seed=0, keep=False):
+  ret = {"python": sys.version.split()[0], "root": root, "seed": seed, "results": []}
+  for size in sizes:
+    folder = tempfile.mkdtemp(prefix="my-renamer-bench-", dir=root)
+    try:
+      result = {"size": size}
+      lib = _time(result, "create_library", library.generateLibrary, file_helper.FileHelper.joinPath(folder, "in"),
+                  size, seed)
+      result["files"] = lib.num_files
+      input_config = config.InputConfig()
+      output_folder = file_helper.FileHelper.joinPath(folder, "out")
+      result["tv"] = _runTv(lib, input_config, file_helper.FileHelper.joinPath(output_folder, "tv"))
+      result["movie"] = _runMovies(lib, input_config, file_helper.FileHelper.joinPath(output_folder, "movies"))
+      ret["results"].append(result)
+    finally:
+      if not keep:
+        shutil.rmtree(folder, ignore_errors=True)
+  return ret
+
+def main():
+  parser = argparse.ArgumentParser(description="time each stage of a rename over generated libraries")
+  parser.add_argument("--sizes", type=int, nargs="+", default=[1000], help="number of files in each library")
+  parser.add_argument("--root", default=library.getDefaultRoot(), help="folder to create the libraries in")
+  parser.add_argument("--seed", type=int, default=0, help="random seed used to generate the libraries")
+  parser.add_argument("--keep", action="store_true", help="don't delete the libraries afterwards")
+  parser.add_argument("--output", help="json file to write the results to (default stdout)")
+  args = parser.parse_args()
+  results = json.dumps(run(args.sizes, args.root, args.seed, args.keep), indent=2, sort_keys=True)
+  if args.output:
+    with open(args.output, "w") as f:
+      f.write(results)
+  else:
+    print(results)
+
+# --------------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+  main()
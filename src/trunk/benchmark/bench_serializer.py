@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------------------------------------------------
+# Project:             my-renamer
+# Repository:          http://code.google.com/p/my-renamer/
+# License:             Creative Commons GNU GPL v2 (http://creativecommons.org/licenses/GPL/2.0/)
+# Purpose of document: Compares common.serializer with jsonpickle on the info types stored in the cache
+# --------------------------------------------------------------------------------------------------------------------
+"""
+sample usage:
+$ python benchmark/bench_serializer.py --count 10000 --output serializer.json
+"""
+if __name__ == "__main__":
+  import sys
+  import os
+  sys.path.insert(0, os.path.abspath(__file__+"/../../"))
+
+import argparse
+import json
+import time
+
+import jsonpickle
+
+from common import serializer
+from media.movie import types as movie_types
+from media.tv import types as tv_types
+
+_EPISODES_PER_SEASON = 22
+
+def _makeInfos(count):
+  """ returns count movies and count seasons """
+  ret = []
+  for i in range(count):
+    ret.append(movie_types.MovieInfo("Movie Title {}".format(i), str(1950 + i % 70), ["action", "comedy"], "", i % 3))
+    season = tv_types.SeasonInfo("Show Name {}".format(i), i % 10 + 1)
+    season.episodes = [tv_types.EpisodeInfo(ep, "Episode Name {}".format(ep))
+                       for ep in range(1, _EPISODES_PER_SEASON + 1)]
+    ret.append(season)
+  return ret
+
+def _time(fn, values):
+  start = time.time()
+  ret = [fn(value) for value in values]
+  return time.time() - start, ret
+
+def run(count):
+  infos = _makeInfos(count)
+  ret = {"count": len(infos)}
+  for name, encode, decode in (("jsonpickle", jsonpickle.encode, jsonpickle.decode),
+                               ("serializer", serializer.encode, serializer.decode)):
+    encode_secs, encoded = _time(encode, infos)
+    decode_secs, _ = _time(decode, encoded)
+    ret[name] = {"encode_secs": encode_secs, "decode_secs": decode_secs, "bytes": sum(len(e) for e in encoded)}
+  for key in ("encode_secs", "decode_secs", "bytes"): #how many times larger jsonpickle is
+    ret["ratio_" + key] = float(ret["jsonpickle"][key]) / max(ret["serializer"][key], 1e-9)
+  return ret
+
+def main():
+  parser = argparse.ArgumentParser(description="compare jsonpickle and common.serializer")
+  parser.add_argument("--count", type=int, default=5000, help="number of movies and seasons to encode")
+  parser.add_argument("--output", help="json file to write the results to (default stdout)")
+  args = parser.parse_args()
+  results = json.dumps(run(args.count), indent=2, sort_keys=True)
+  if args.output:
+    with open(args.output, "w") as f:
+      f.write(results)
+  else:
+    print(results)
+
+# --------------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------------------------------------------------
+# Project:             my-renamer
+# Repository:          http://code.google.com/p/my-renamer/
+# License:             Creative Commons GNU GPL v2 (http://creativecommons.org/licenses/GPL/2.0/)
+# Purpose of document: Measures the time taken to import the modules used at startup
+# --------------------------------------------------------------------------------------------------------------------
+"""
+Each import is timed in a fresh interpreter so nothing is already loaded. The client libraries that are installed are
+timed separately as that is what every startup paid for when the clients imported them eagerly.
+
+sample usage:
+$ python benchmark/bench_startup.py --repeat 10 --output startup.json
+"""
+if __name__ == "__main__":
+  import sys
+  import os
+  sys.path.insert(0, os.path.abspath(__file__+"/../../"))
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from media.base import client as base_client
+
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+_MODULES = ("common.file_helper", "common.cache", "media.tv.client", "media.movie.client", "media.tv.manager",
+            "media.movie.manager", "app.batch")
+_CLIENT_LIBS = ("tvdb_api", "tvrage.api", "pymdb", "tmdb", "imdb", "rottentomatoes")
+_TIMER = "import time; t = time.time(); import {}; print(time.time() - t)"
+
+def _timeImport(modules, repeat):
+  """ returns the median seconds taken to import modules in a new interpreter """
+  times = []
+  for _ in range(repeat):
+    out = subprocess.check_output([sys.executable, "-c", _TIMER.format(", ".join(modules))], cwd=_ROOT)
+    times.append(float(out.strip()))
+  return sorted(times)[len(times) // 2]
+
+def run(repeat):
+  ret = {"python": sys.version.split()[0], "repeat": repeat, "modules": {}}
+  for module in _MODULES:
+    ret["modules"][module] = _timeImport([module], repeat)
+  libs = [lib for lib in _CLIENT_LIBS if base_client.hasLibrary(lib)]
+  ret["installed_client_libs"] = libs
+  ret["client_libs"] = _timeImport(libs, repeat) if libs else 0.0 #the cost deferred until a lookup is made
+  return ret
+
+def main():
+  parser = argparse.ArgumentParser(description="time the imports made at startup")
+  parser.add_argument("--repeat", type=int, default=5, help="number of times to time each import")
+  parser.add_argument("--output", help="json file to write the results to (default stdout)")
+  args = parser.parse_args()
+  results = json.dumps(run(args.repeat), indent=2, sort_keys=True)
+  if args.output:
+    with open(args.output, "w") as f:
+      f.write(results)
+  else:
+    print(results)
+
+# --------------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+  main()
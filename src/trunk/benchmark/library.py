@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------------------------------------------------
+# Project:             my-renamer
+# Repository:          http://code.google.com/p/my-renamer/
+# License:             Creative Commons GNU GPL v2 (http://creativecommons.org/licenses/GPL/2.0/)
+# Purpose of document: Generates a synthetic media library of sparse files for the benchmarks
+# --------------------------------------------------------------------------------------------------------------------
+"""
+Files are sparse so a large library takes next to no space, but each one is still bigger than the default minimum
+video size. Names are in the styles found in the wild (release names, 1x02, multi part movies, subtitles etc.) and
+the same seed always gives the same library.
+
+sample usage:
+>>> lib = generateLibrary("/dev/shm/library", 1000)
+>>> lib.tv_folder, lib.movie_folder, lib.num_files
+"""
+import os
+import random
+import tempfile
+
+from common import file_helper
+from common import utils
+from media.movie import types as movie_types
+from media.tv import types as tv_types
+
+DEFAULT_FILE_SIZE_BYTES = utils.MIN_VIDEO_SIZE_BYTES + 1
+_MIN_EPISODES, _MAX_EPISODES = 6, 24
+_MAX_SEASONS = 8
+_MULTI_PART_PERCENT = 10
+_SUBTITLE_PERCENT = 20
+
+_WORDS = ("the", "dark", "city", "night", "blue", "house", "wild", "lost", "river", "king", "last", "man", "star",
+          "road", "fire", "girl", "summer", "ghost", "empire", "code", "silent", "little", "iron", "glass", "north")
+_QUALITIES = ("480p", "720p", "1080p", "2160p", "HDTV", "DVDRip")
+_SOURCES = ("HDTV", "WEB-DL", "BluRay", "WEBRip")
+_GROUPS = ("LOL", "DIMENSION", "SPARKS", "FGT", "YIFY", "NTb")
+
+_FOLDER_FORMATS = (u"{show}/Season {season}", u"{show} - Season {season}", u"{show}/Series {season}")
+_EPISODE_FORMATS = (u"{dotted}.S{season:02d}E{ep:02d}.{quality}.{source}.x264-{group}{ext}",
+                    u"{show} - {season}x{ep:02d} - {name}{ext}",
+                    u"{dotted}.S{season:02d}E{ep:02d}.{dotted_name}.{quality}-{group}{ext}",
+                    u"{ep:02d} - {name}{ext}")
+_MOVIE_FORMATS = (u"{dotted}.{year}.{quality}.{source}.x264-{group}{ext}",
+                  u"{title} ({year}) [{quality}]{ext}",
+                  u"{title} {year}{ext}")
+_EXTENSIONS = (".avi", ".mkv", ".mp4")
+
+# --------------------------------------------------------------------------------------------------------------------
+class Library(object):
+  """ details of a generated library.
+
+  Attributes:
+    root: folder holding the library
+    tv_folder: root of the tv shows (<show>/<season>/<episode>)
+    movie_folder: root of the movies
+    seasons: list of media.tv.types.SeasonInfo for each generated season
+    movies: list of media.movie.types.MovieInfo for each generated movie
+    num_files: number of files created, excluding subtitles
+  """
+  def __init__(self, root):
+    super(Library, self).__init__()
+    self.root = root
+    self.tv_folder = file_helper.FileHelper.joinPath(root, "tv")
+    self.movie_folder = file_helper.FileHelper.joinPath(root, "movies")
+    self.seasons = []
+    self.movies = []
+    self.num_files = 0
+
+# --------------------------------------------------------------------------------------------------------------------
+def getDefaultRoot():
+  """ tmpfs where available so that the benchmarks measure the code rather than the disk """
+  return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+def _createFile(path, size):
+  folder = os.path.dirname(path)
+  if not os.path.isdir(folder):
+    os.makedirs(folder)
+  with open(path, "wb") as f:
+    f.truncate(size)
+
+def _words(rand, min_words, max_words):
+  return " ".join(rand.choice(_WORDS).capitalize() for _ in range(rand.randint(min_words, max_words)))
+
+def _uniqueName(rand, used, min_words, max_words):
+  name = _words(rand, min_words, max_words)
+  while name in used:
+    name = "{} {}".format(name, _words(rand, 1, 1))
+  used.add(name)
+  return name
+
+def _dotted(name):
+  return name.replace(" ", ".")
+
+def generateLibrary(root, num_items, seed=0, file_size=DEFAULT_FILE_SIZE_BYTES):
+  """ creates about num_items files in root, half of them episodes and half movies. returns a Library """
+  rand = random.Random(seed)
+  ret = Library(root)
+  used = set()
+
+  num_episodes = num_items // 2
+  while num_episodes > 0:
+    show = _uniqueName(rand, used, 1, 3)
+    for season_num in range(1, rand.randint(1, _MAX_SEASONS) + 1):
+      if num_episodes <= 0:
+        break
+      season = tv_types.SeasonInfo(show, season_num)
+      folder = file_helper.FileHelper.joinPath(ret.tv_folder, rand.choice(_FOLDER_FORMATS).format(show=show,
+                                                                                                season=season_num))
+      episode_format = rand.choice(_EPISODE_FORMATS) #the same release style for the whole season
+      ext = rand.choice(_EXTENSIONS)
+      for ep_num in range(1, min(rand.randint(_MIN_EPISODES, _MAX_EPISODES), num_episodes) + 1):
+        name = _words(rand, 1, 4)
+        season.episodes.append(tv_types.EpisodeInfo(ep_num, name))
+        filename = episode_format.format(show=show, dotted=_dotted(show), season=season_num, ep=ep_num, name=name,
+                                         dotted_name=_dotted(name), quality=rand.choice(_QUALITIES),
+                                         source=rand.choice(_SOURCES), group=rand.choice(_GROUPS), ext=ext)
+        _createFile(file_helper.FileHelper.joinPath(folder, filename), file_size)
+        num_episodes -= 1
+        ret.num_files += 1
+      ret.seasons.append(season)
+
+  num_movies = num_items - num_items // 2
+  while num_movies > 0:
+    movie = movie_types.MovieInfo(_uniqueName(rand, used, 1, 4), str(rand.randint(1950, 2020)))
+    ext = rand.choice(_EXTENSIONS)
+    values = {"title": movie.title, "dotted": _dotted(movie.title), "year": movie.year,
+              "quality": rand.choice(_QUALITIES), "source": rand.choice(_SOURCES), "group": rand.choice(_GROUPS),
+              "ext": ext}
+    if rand.randint(1, 100) <= _MULTI_PART_PERCENT and num_movies > 1:
+      folder = file_helper.FileHelper.joinPath(ret.movie_folder, u"{title} ({year})".format(**values))
+      paths = [file_helper.FileHelper.joinPath(folder, u"{title} ({year}) CD{part}{ext}".format(part=part, **values))
+               for part in (1, 2)]
+    else:
+      paths = [file_helper.FileHelper.joinPath(ret.movie_folder, rand.choice(_MOVIE_FORMATS).format(**values))]
+    for path in paths:
+      _createFile(path, file_size)
+      if rand.randint(1, 100) <= _SUBTITLE_PERCENT:
+        _createFile(os.path.splitext(path)[0] + ".srt", 0)
+    num_movies -= len(paths)
+    ret.num_files += len(paths)
+    ret.movies.append(movie)
+  return ret
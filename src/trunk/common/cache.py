@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------------------------------------------------
+# Project:             my-renamer
+# Repository:          http://code.google.com/p/my-renamer/
+# License:             Creative Commons GNU GPL v2 (http://creativecommons.org/licenses/GPL/2.0/)
+# Purpose of document: Persistent (sqlite) cache of info client results
+# --------------------------------------------------------------------------------------------------------------------
+"""
+sample usage:
+>>> cache = InfoCache("cache.db", "movie")
+>>> cache.set("Alien (1979)", info, aliases=["alien"])
+>>> cache.get("alien")
+<MovieInfo>
+>>> cache.flush()
+>>> cache.dump(open("cache.jsonl", "w")) # portable copy, see load()
+"""
+import json
+import sqlite3
+import threading
+import time
+
+from common import serializer
+from common import utils
+
+IN_MEMORY = ":memory:"
+DEFAULT_POSITIVE_TTL_SECS = 90 * 24 * 60 * 60 # 90 days
+DEFAULT_NEGATIVE_TTL_SECS = 7 * 24 * 60 * 60 # 7 days
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024 # 64 MB
+DEFAULT_FLUSH_INTERVAL_SECS = 5 # how often pending writes are committed in the background
+DEFAULT_COMPACT_INTERVAL_SECS = 5 * 60 # how often the background flush also evicts and checkpoints the journal
+_COMMIT_EVERY = 100 # number of writes before they are committed when there is no background flush
+_EVICT_RATIO = 0.9 # when over budget, evict down to this fraction of max_bytes
+
+def _toText(value):
+  return value if isinstance(value, unicode) else value.decode("utf-8", "replace")
+
+def openDatabase(filename):
+  """ returns a sqlite connection that can be shared between threads. Files use a write ahead log so commits append to
+  the log rather than rewriting pages in place, and don't wait for the disk """
+  conn = sqlite3.connect(filename, check_same_thread=False)
+  if filename != IN_MEMORY:
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+  return conn
+
+# --------------------------------------------------------------------------------------------------------------------
+class BackgroundFlusher(object):
+  """ calls fn every interval_secs on a daemon thread until stop() is called """
+  def __init__(self, fn, interval_secs, name="flusher"):
+    super(BackgroundFlusher, self).__init__()
+    self._fn = fn
+    self._interval_secs = interval_secs
+    self._stopped = threading.Event()
+    self._thread = threading.Thread(target=self._run, name=name)
+    self._thread.daemon = True
+    self._thread.start()
+
+  def _run(self):
+    while not self._stopped.wait(self._interval_secs):
+      try:
+        self._fn()
+      except Exception as ex: #keep flushing, the next attempt may succeed
+        utils.logWarning("background flush failed: {}".format(ex))
+
+  def stop(self):
+    self._stopped.set()
+    if self._thread is not threading.current_thread():
+      self._thread.join()
+
+# --------------------------------------------------------------------------------------------------------------------
+class InfoCache(object):
+  """ key value store backed by a sqlite table. Each value is stored once along with the time it was created and last
+  accessed. Other keys that resolve to the same value (eg. the search key that was used to find the info) are stored as
+  aliases rather than duplicating the value. A key is either stored or an alias, so storing a key replaces any alias 
+  with that name and an alias replaces any entry stored under it (eg. a miss for a search key that has since been 
+  found).
+
+  Entries are either positive (a value was found) or negative (a miss). They each expire after their own ttl. When the
+  encoded size of all the values exceeds max_bytes, the least recently used entries are evicted on flush().
+
+  Writes are held in memory and written in a single transaction by a background flush every flush_interval_secs
+  (write behind). The database isn't locked against the other connections to the file between flushes and at most 
+  the last interval of writes is lost in a crash. Every compact_interval_secs the background flush also evicts and 
+  checkpoints the journal, leaving only a small final flush() on shutdown. Lookups don't wait on set(), but they do 
+  wait while a background flush writes its batch, as both use the connection under the same lock. In memory caches 
+  and a flush_interval_secs of 0 write immediately and commit every _COMMIT_EVERY writes instead.
+
+  Values are stored with common.serializer so only the supported info types (and plain json values) can be cached.
+
+  Attributes:
+    positive_ttl_secs: seconds before a found value expires
+    negative_ttl_secs: seconds before a miss expires
+    max_bytes: byte budget of the encoded values
+  """
+  def __init__(self, filename=IN_MEMORY, name="cache", version="",
+               positive_ttl_secs=DEFAULT_POSITIVE_TTL_SECS,
+               negative_ttl_secs=DEFAULT_NEGATIVE_TTL_SECS,
+               max_bytes=DEFAULT_MAX_BYTES,
+               flush_interval_secs=DEFAULT_FLUSH_INTERVAL_SECS,
+               compact_interval_secs=DEFAULT_COMPACT_INTERVAL_SECS):
+    super(InfoCache, self).__init__()
+    self.positive_ttl_secs = positive_ttl_secs
+    self.negative_ttl_secs = negative_ttl_secs
+    self.max_bytes = max_bytes
+    self._table = "cache_{}".format(name)
+    self._alias_table = "alias_{}".format(name)
+    self._lock = threading.RLock()
+    self._num_pending_writes = 0
+    self._pending = {} #key to (value, is_miss, created) not yet written
+    self._pending_aliases = {} #alias to key not yet written
+    self._pending_deletes = set() #keys not yet deleted
+    self._pending_alias_deletes = set() #aliases not yet deleted
+    self._touched = {} #key to accessed time, written on flush
+    self._conn = openDatabase(filename)
+    self._createTables(name, version)
+    self._compact_interval_secs = compact_interval_secs
+    self._last_compact_time = time.time()
+    self._flusher = None
+    if filename != IN_MEMORY and flush_interval_secs > 0:
+      self._flusher = BackgroundFlusher(self._backgroundFlush, flush_interval_secs, "{} flusher".format(name))
+
+  def _createTables(self, name, version):
+    with self._lock:
+      self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, version TEXT)")
+      self._conn.execute("CREATE TABLE IF NOT EXISTS {} (key TEXT PRIMARY KEY, value TEXT, is_miss INTEGER, "
+                         "size INTEGER, created REAL, accessed REAL)".format(self._table))
+      self._conn.execute("CREATE INDEX IF NOT EXISTS {0}_accessed ON {0} (accessed)".format(self._table))
+      self._conn.execute("CREATE TABLE IF NOT EXISTS {} (alias TEXT PRIMARY KEY, key TEXT)".format(self._alias_table))
+      row = self._conn.execute("SELECT version FROM meta WHERE name = ?", (name,)).fetchone()
+      if row and row[0] != version:
+        utils.logDebug("cache version of out date, clearing. old={} new={}".format(row[0], version))
+        self._clear()
+      self._conn.execute("INSERT OR REPLACE INTO meta (name, version) VALUES (?, ?)", (name, version))
+      self._conn.commit()
+
+  def get(self, key, default=None):
+    """ returns the value stored for key (or one of its aliases). default is returned for missing, expired and
+    negative entries. """
+    row = self._getRow(key)
+    if not row or row[1]:
+      return default
+    return serializer.decode(row[0])
+
+  def isMiss(self, key):
+    """ returns True if key has been stored as a miss that has not yet expired """
+    row = self._getRow(key)
+    return bool(row and row[1])
+
+  def getMissSources(self, key):
+    """ returns the list of sources recorded by setMiss() for key, or None if key is not a miss """
+    row = self._getRow(key)
+    if not row or not row[1]:
+      return None
+    return serializer.decode(row[0])
+
+  def _getRow(self, key):
+    key = _toText(key)
+    now = time.time()
+    with self._lock:
+      #a key is never both stored and an alias (see _set()), so the order the pending and stored rows are checked in 
+      #doesn't change the result
+      real_key = self._pending_aliases.get(key, key)
+      if real_key in self._pending:
+        row = (real_key,) + self._pending[real_key]
+      else:
+        row = self._conn.execute("SELECT key, value, is_miss, created FROM {} WHERE key = ?".format(self._table),
+                                 (real_key,)).fetchone()
+        if not row and real_key == key and key not in self._pending_alias_deletes:
+          row = self._conn.execute("SELECT c.key, c.value, c.is_miss, c.created FROM {} a JOIN {} c ON c.key = a.key "
+                                   "WHERE a.alias = ?".format(self._alias_table, self._table), (key,)).fetchone()
+      if not row or row[0] in self._pending_deletes:
+        return None
+      real_key, value, is_miss, created = row
+      if created + (self.negative_ttl_secs if is_miss else self.positive_ttl_secs) < now:
+        self._delete([real_key])
+        return None
+      self._touched[real_key] = now
+      return value, is_miss
+
+  def set(self, key, value, aliases=()):
+    """ stores value under key. aliases are additional keys that will return the same value """
+    self._set(key, serializer.encode(value), False, aliases)
+
+  def setMiss(self, key, sources=(), aliases=()):
+    """ records that nothing could be found for key. sources is the list of names of where the lookup failed """
+    self._set(key, serializer.encode(sorted(sources)), True, aliases)
+
+  def _set(self, key, encoded, is_miss, aliases):
+    key = _toText(key)
+    now = time.time()
+    with self._lock:
+      self._pending[key] = (encoded, int(is_miss), now)
+      self._pending_deletes.discard(key)
+      self._pending_aliases.pop(key, None)
+      self._pending_alias_deletes.add(key)
+      for alias in aliases:
+        alias = _toText(alias)
+        if alias != key:
+          self._pending_aliases[alias] = key
+          self._pending_alias_deletes.discard(alias)
+          self._pending.pop(alias, None) #eg. an earlier miss for the search key
+          self._pending_deletes.add(alias)
+      self._touched.pop(key, None)
+      self._num_pending_writes += 1
+      if not self._flusher:
+        self._writePending()
+        if self._num_pending_writes >= _COMMIT_EVERY:
+          self._commit()
+
+  def _delete(self, keys):
+    for key in keys:
+      self._pending.pop(key, None)
+      self._pending_deletes.add(key)
+    self._num_pending_writes += 1
+    if not self._flusher:
+      self._writePending()
+
+  def _writePending(self):
+    """ writes the pending changes to the open transaction """
+    if self._pending:
+      self._conn.executemany("INSERT OR REPLACE INTO {} (key, value, is_miss, size, created, accessed) "
+                             "VALUES (?, ?, ?, ?, ?, ?)".format(self._table),
+                             [(key, encoded, is_miss, len(encoded), created, created)
+                              for key, (encoded, is_miss, created) in self._pending.items()])
+    if self._pending_aliases:
+      self._conn.executemany("INSERT OR REPLACE INTO {} (alias, key) VALUES (?, ?)".format(self._alias_table),
+                             self._pending_aliases.items())
+    keys = list(self._pending_deletes)
+    for i in range(0, len(keys), 500): #keep under the sqlite variable limit
+      chunk = keys[i:i + 500]
+      marks = ",".join("?" * len(chunk))
+      self._conn.execute("DELETE FROM {} WHERE key IN ({})".format(self._table, marks), chunk)
+      self._conn.execute("DELETE FROM {} WHERE key IN ({})".format(self._alias_table, marks), chunk)
+    aliases = list(self._pending_alias_deletes)
+    for i in range(0, len(aliases), 500):
+      chunk = aliases[i:i + 500]
+      self._conn.execute("DELETE FROM {} WHERE alias IN ({})".format(self._alias_table, ",".join("?" * len(chunk))),
+                         chunk)
+    self._pending = {}
+    self._pending_aliases = {}
+    self._pending_deletes = set()
+    self._pending_alias_deletes = set()
+
+  def _evict(self):
+    total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM {}".format(self._table)).fetchone()[0]
+    if total <= self.max_bytes:
+      return
+    target = total - int(self.max_bytes * _EVICT_RATIO)
+    freed = 0
+    keys = []
+    cursor = self._conn.execute("SELECT key, size FROM {} ORDER BY accessed".format(self._table))
+    for key, size in cursor:
+      if freed >= target:
+        break
+      keys.append(key)
+      freed += size
+    cursor.close()
+    utils.logDebug("evicting {} cache entries ({} bytes)".format(len(keys), freed))
+    self._delete(keys)
+
+  def _commit(self):
+    self._writePending()
+    if self._touched:
+      self._conn.executemany("UPDATE {} SET accessed = ? WHERE key = ?".format(self._table),
+                             [(accessed, key) for key, accessed in self._touched.items()])
+      self._touched = {}
+    self._conn.commit()
+    self._num_pending_writes = 0
+
+  def flush(self):
+    """ writes pending changes to disk, evicting entries if the cache is over budget """
+    with self._lock:
+      self._commit() #write the access times first so eviction sees them
+      self._evict()
+      self._commit()
+
+  def _backgroundFlush(self):
+    #the lookups share the connection and read the pending changes, so they wait for the whole write
+    with self._lock:
+      if time.time() - self._last_compact_time >= self._compact_interval_secs:
+        self.flush()
+        self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._last_compact_time = time.time()
+      elif self._num_pending_writes or self._touched:
+        self._commit()
+
+  def _clear(self):
+    self._pending = {}
+    self._pending_aliases = {}
+    self._pending_deletes = set()
+    self._pending_alias_deletes = set()
+    self._conn.execute("DELETE FROM {}".format(self._table))
+    self._conn.execute("DELETE FROM {}".format(self._alias_table))
+    self._touched = {}
+
+  def clear(self):
+    """ removes all entries """
+    with self._lock:
+      self._clear()
+      self._commit()
+
+  def dump(self, file_obj):
+    """ writes every entry to file_obj as a json line. The stored values are written as is, without decoding them """
+    with self._lock:
+      self._commit()
+      aliases = {}
+      for alias, key in self._conn.execute("SELECT alias, key FROM {}".format(self._alias_table)):
+        aliases.setdefault(key, []).append(alias)
+      cursor = self._conn.execute("SELECT key, value, is_miss, created FROM {}".format(self._table))
+      for key, value, is_miss, created in cursor:
+        file_obj.write('{{"key":{},"aliases":{},"is_miss":{},"created":{!r},"value":{}}}\n'.format(
+            json.dumps(key), json.dumps(aliases.get(key, [])), is_miss, created, value))
+      cursor.close()
+
+  def load(self, file_obj):
+    """ adds the entries written by dump(), reading one line at a time. returns the number of entries """
+    count = 0
+    with self._lock:
+      self._writePending() #so the loaded entries replace them
+      for line in file_obj:
+        if not line.strip():
+          continue
+        entry = json.loads(line)
+        encoded = json.dumps(entry["value"], separators=(",", ":"))
+        self._conn.execute("DELETE FROM {} WHERE alias = ?".format(self._alias_table), (entry["key"],))
+        self._conn.executemany("DELETE FROM {} WHERE key = ?".format(self._table),
+                               [(alias,) for alias in entry["aliases"]])
+        self._conn.execute("INSERT OR REPLACE INTO {} (key, value, is_miss, size, created, accessed) "
+                           "VALUES (?, ?, ?, ?, ?, ?)".format(self._table),
+                           (entry["key"], encoded, entry["is_miss"], len(encoded), entry["created"], time.time()))
+        self._conn.executemany("INSERT OR REPLACE INTO {} (alias, key) VALUES (?, ?)".format(self._alias_table),
+                               [(alias, entry["key"]) for alias in entry["aliases"]])
+        count += 1
+      self._commit()
+    return count
+
+  def close(self):
+    if self._flusher:
+      self._flusher.stop()
+    with self._lock:
+      self.flush()
+      self._conn.close()
+
+  def __len__(self):
+    with self._lock:
+      self._writePending()
+      return self._conn.execute("SELECT COUNT(*) FROM {}".format(self._table)).fetchone()[0]
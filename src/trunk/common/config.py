@@ -7,11 +7,12 @@
 # Purpose of document: Config data
 # --------------------------------------------------------------------------------------------------------------------
 from common import extension
+from common import file_helper
 from common import utils
 from media.base import types as base_types
 
-CONFIG_VERSION = "1.0"
-CACHE_VERSION = "1.0"
+CONFIG_VERSION = "1.3"
+CACHE_VERSION = "3.0"
 
 # --------------------------------------------------------------------------------------------------------------------
 class BaseConfig(object):
@@ -28,6 +29,7 @@ class InputConfig(BaseConfig):
     self.all_file_sizes = False
     self.min_file_size_bytes = utils.MIN_VIDEO_SIZE_BYTES
     self.sources = []
+    self.num_scan_threads = file_helper.DEFAULT_NUM_WALK_THREADS #threads used to read folders
 
   def getExtensions(self):
     return extension.ALL_FILE_EXTENSIONS if self.all_extensions else extension.FileExtensions(self.extensions.split())
@@ -48,6 +50,8 @@ class OutputConfig(BaseConfig):
     self.use_source = True
     self.is_move = True
     self.dont_overwrite = True
+    self.verify = False #checksum files that are copied
+    self.fsync_policy = "none" #one of common.renamer.FSYNC_POLICIES
     self.show_help = True
     self.action_subtitles = True
     self.subtitle_exts = extension.DEFAULT_SUBTITLE_EXTENSIONS.extensionString()
@@ -5,19 +5,136 @@
 # License:             Creative Commons GNU GPL v2 (http://creativecommons.org/licenses/GPL/2.0/)
 # Purpose of document: Interface to python's file libraries
 # --------------------------------------------------------------------------------------------------------------------
+import collections
+import ctypes
+import ctypes.util
+import errno
+import hashlib
+import io
 import os
+import Queue
 import re
 import shutil
+import stat as statmod
 import string
+import sys
+import threading
+import time
 
-_BLOCK_SIZE = pow(2, 15)
+from common import utils
+
+_HAS_SCANDIR = hasattr(os, "scandir")
+if _HAS_SCANDIR:
+  from os import scandir
+else:
+  try:
+    from scandir import scandir #backport for python < 3.5
+    _HAS_SCANDIR = True
+  except ImportError:
+    pass
+
+_HAS_XXHASH = False
+try:
+  import xxhash
+  _HAS_XXHASH = True
+except ImportError:
+  pass
+
+def _loadLibcFunction(name, argtypes, restype=ctypes.c_int):
+  """ returns the named function from the c library on linux. None on other platforms or if the library doesn't have
+  it (eg. an older glibc) """
+  if not sys.platform.startswith("linux"):
+    return None
+  try:
+    fn = getattr(ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True), name)
+  except (EnvironmentError, AttributeError):
+    return None
+  fn.argtypes = argtypes
+  fn.restype = restype
+  return fn
+
+def _checkLibcResult(ret):
+  """ raises the c library's errno as an OSError if ret is -1, like the os module does """
+  if ret < 0:
+    err = ctypes.get_errno()
+    raise OSError(err, os.strerror(err))
+  return ret
+
+def _loadFadvise():
+  """ returns posix_fadvise(fd, offset, length, advice) from os, or from the c library on linux where python (eg. 2.7)
+  doesn't have it. None if neither has it """
+  if hasattr(os, "posix_fadvise"):
+    return os.posix_fadvise
+  #64 bit offsets on all cpus
+  return _loadLibcFunction("posix_fadvise64", [ctypes.c_int, ctypes.c_int64, ctypes.c_int64, ctypes.c_int])
+
+def _loadCopyFileRange():
+  """ returns copy_file_range(src_fd, dst_fd, count, offset_src, offset_dst) from os, or a wrapper of the c library's
+  on linux where python doesn't have it. None if neither has it """
+  if hasattr(os, "copy_file_range"):
+    return os.copy_file_range
+  fn = _loadLibcFunction("copy_file_range", [ctypes.c_int, ctypes.POINTER(ctypes.c_int64), ctypes.c_int,
+                                             ctypes.POINTER(ctypes.c_int64), ctypes.c_size_t, ctypes.c_uint],
+                         ctypes.c_ssize_t)
+  if fn is None:
+    return None
+  def copyFileRange(src_fd, dst_fd, count, offset_src, offset_dst):
+    return _checkLibcResult(fn(src_fd, ctypes.byref(ctypes.c_int64(offset_src)),
+                               dst_fd, ctypes.byref(ctypes.c_int64(offset_dst)), count, 0))
+  return copyFileRange
+
+def _loadSendFile():
+  """ returns sendfile(out_fd, in_fd, offset, count) from os, or a wrapper of the c library's on linux where python
+  doesn't have it. None if neither has it """
+  if hasattr(os, "sendfile"):
+    return os.sendfile
+  fn = _loadLibcFunction("sendfile64", [ctypes.c_int, ctypes.c_int, ctypes.POINTER(ctypes.c_int64), ctypes.c_size_t],
+                         ctypes.c_ssize_t)
+  if fn is None:
+    return None
+  def sendFile(out_fd, in_fd, offset, count):
+    return _checkLibcResult(fn(out_fd, in_fd, ctypes.byref(ctypes.c_int64(offset)), count))
+  return sendFile
+
+def _loadFallocate():
+  """ returns posix_fallocate(fd, offset, length) from os, or a wrapper of the c library's on linux where python (eg.
+  2.7) doesn't have it. None if neither has it """
+  if hasattr(os, "posix_fallocate"):
+    return os.posix_fallocate
+  fn = _loadLibcFunction("posix_fallocate64", [ctypes.c_int, ctypes.c_int64, ctypes.c_int64])
+  if fn is None:
+    return None
+  def fallocate(fd, offset, length):
+    err = fn(fd, offset, length) #returns the error rather than setting errno
+    if err:
+      raise OSError(err, os.strerror(err))
+  return fallocate
+
+_FADVISE = _loadFadvise()
+_FALLOCATE = _loadFallocate()
+_COPY_FILE_RANGE = _loadCopyFileRange()
+_SENDFILE = _loadSendFile()
+_FADVISE_ADVICE = {"POSIX_FADV_SEQUENTIAL": 2, "POSIX_FADV_DONTNEED": 4} #linux values for when os doesn't have them
+
+_BLOCK_SIZE = pow(2, 15) #files smaller than this are copied without progress
+_MIN_CHUNK_SIZE = pow(2, 20)
+_MAX_CHUNK_SIZE = pow(2, 24)
+_CHUNK_SECS = 0.25 #chunk sizes are adjusted so that progress is reported (and cancels checked) about this often
+#errors raised by copy_file_range / sendfile when the kernel or filesystem can't do the copy
+_KERNEL_COPY_ERRORS = (errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EBADF, getattr(errno, "ENOTSUP", errno.EINVAL),
+                       getattr(errno, "EOPNOTSUPP", errno.EINVAL))
+DEFAULT_NUM_WALK_THREADS = 8
 _VALID_BASENAME_CHARACTERS = "".join([string.ascii_letters,
                                       string.digits,
                                       r" !#$%&'()+,-.\\/;=@[\]^_`{}~"]) # string.punctuation without :?"<>|
 _RE_PATH = re.compile(r"(\\|/+)")
 _RE_INALID_FILENAME = re.compile("[^{}]".format(re.escape(_VALID_BASENAME_CHARACTERS)))
+_DEVICE_CACHE = {} #folder to st_dev. see FileHelper.getDevice()
+
 _RE_VALID_FILENAME = re.compile("^([{}])*$".format(re.escape(_VALID_BASENAME_CHARACTERS)))
 
+FileRecord = collections.namedtuple("FileRecord", ["path", "size", "mtime"])
+
 # --------------------------------------------------------------------------------------------------------------------
 class FileHelper:
   """ Collection of static functions abstracting the python libraries. """
@@ -71,8 +188,9 @@ class FileHelper:
     if not FileHelper.dirExists(dir_obj):
       try:
         os.makedirs(dir_obj)
-      except os.error:
-        ret = False
+      except os.error as ex:
+        #renames run in parallel so another one may have just created it
+        ret = ex.errno == errno.EEXIST and os.path.isdir(dir_obj)
     return ret
 
   @staticmethod
@@ -108,7 +226,11 @@ class FileHelper:
 
   @staticmethod
   def getFileSize(file_obj):
-    return os.path.getsize(file_obj) if FileHelper.fileExists(file_obj) else 0
+    try:
+      stat = os.stat(file_obj)
+    except os.error:
+      return 0
+    return stat.st_size if statmod.S_ISREG(stat.st_mode) else 0
 
   @staticmethod
   def replaceSeparators(name, replace_char="-"):
@@ -130,7 +252,71 @@ class FileHelper:
     return "{}{}".format(os.path.splitext(file_obj)[0], ext)
 
   @staticmethod
-  def moveFile(source, dest, progress_cb=None):
+  def getDevice(path):
+    """ returns the id (st_dev) of the device holding the folder that path is in. If the folder doesn't exist (eg. for 
+    a destination) its nearest existing parent is used. Returns None if no part of the path exists.
+    
+    Folder devices are cached so checking a batch of files in the same folders costs one stat per folder. Call 
+    clearDeviceCache() if drives may have been mounted or unmounted since. """
+    folder = os.path.dirname(os.path.abspath(path))
+    ret = _DEVICE_CACHE.get(folder)
+    if ret is None:
+      parent = folder
+      while ret is None:
+        try:
+          ret = os.stat(parent).st_dev
+        except os.error:
+          if os.path.dirname(parent) == parent:
+            return None
+          parent = os.path.dirname(parent)
+      if parent == folder:
+        _DEVICE_CACHE[folder] = ret #folders that don't exist yet may be created on a different device later
+    return ret
+
+  @staticmethod
+  def clearDeviceCache():
+    _DEVICE_CACHE.clear()
+
+  @staticmethod
+  def isSameDevice(source, dest):
+    """ returns True if source can be renamed to dest without copying the data. """
+    device = FileHelper.getDevice(source)
+    return device is not None and device == FileHelper.getDevice(dest)
+
+  @staticmethod
+  def newHasher():
+    """ returns a new hash object for verifying copies. xxhash if it is installed, otherwise blake2b if the hashlib 
+    has it, otherwise sha1 """
+    if _HAS_XXHASH:
+      return xxhash.xxh64()
+    elif hasattr(hashlib, "blake2b"):
+      return hashlib.blake2b()
+    return hashlib.sha1()
+
+  @staticmethod
+  def canDropCache():
+    """ returns True if files can be dropped from the os' page cache, so a verified copy is read back from the disk 
+    rather than from memory """
+    return _FADVISE is not None
+
+  @staticmethod
+  def syncFile(filename):
+    """ flushes filename to disk. returns False if it couldn't be """
+    ret = True
+    try:
+      fd = os.open(filename, os.O_RDONLY)
+      try:
+        os.fsync(fd)
+      finally:
+        os.close(fd)
+    except os.error:
+      ret = False
+    return ret
+
+  @staticmethod
+  def moveFile(source, dest, progress_cb=None, hasher=None, fsync=False):
+    """ moves source to dest. if the data has to be copied and a hasher (see newHasher()) is given the copy is 
+    verified, and if fsync is True the copy is flushed to disk before returning (see copyFile()) """
     #utils.verifyType(source, str)
     #utils.verifyType(dest, str)
 
@@ -144,14 +330,25 @@ class FileHelper:
       return ret
 
     def unsafeMoveFile(source, dest, progress_cb):
-      ret = FileHelper.copyFile(source, dest, progress_cb) and FileHelper.removeFile(source)
+      ret = FileHelper.copyFile(source, dest, progress_cb, hasher, fsync) and FileHelper.removeFile(source)
+      return ret
+
+    def renameFile(source, dest):
+      ret = False
+      try:
+        os.rename(source, dest)
+        ret = True
+      except os.error: #eg. dest exists on windows
+        ret = safeMoveFile(source, dest)
       return ret
 
     ret = False
     if FileHelper.fileExists(source):
       dest_folder = FileHelper.dirname(dest)
       if not dest_folder or FileHelper.createDir(dest_folder):
-        if os.path.commonprefix([source, dest]) or not progress_cb or FileHelper.getFileSize(source) < _BLOCK_SIZE:
+        if FileHelper.isSameDevice(source, dest):
+          ret = renameFile(source, dest)
+        elif not hasher and not fsync and (not progress_cb or FileHelper.getFileSize(source) < _BLOCK_SIZE):
           ret = safeMoveFile(source, dest)
         else:
           ret = unsafeMoveFile(source, dest, progress_cb)
@@ -159,31 +356,31 @@ class FileHelper:
     return ret
 
   @staticmethod
-  def copyFile(source, dest, progress_cb=None):
+  def copyFile(source, dest, progress_cb=None, hasher=None, fsync=False):
+    """ copies source to dest. if a hasher (see newHasher()) is given the data is hashed as it is copied and the 
+    copy only succeeds if the destination, read back from disk, has the same hash. hasher then holds the digest. 
+    if fsync is True the destination is flushed to disk before returning. """
     #utils.verifyType(source, str)
     #utils.verifyType(dest, str)
 
     def unsafeCopyFile(source_name, dest_name, progress_cb):
-      """ bitwise copy so that we can be more responsive to user cancels etc. """
-      assert(progress_cb)
-      copied = 0
+      """ chunked copy so that we can be more responsive to user cancels etc. """
       ret = False
       try:
-        source_size = FileHelper.getFileSize(source_name)
-        with open(source_name, "rb") as source:
-          with open(dest_name, "wb") as dest:
-            chunk = ""
-            while True:
-              chunk = source.read(_BLOCK_SIZE)
-              if not chunk:
-                break
-              copied += len(chunk)
-              dest.write(chunk)
-              # why 90%? closing of file handles can take a while after
-              if not progress_cb(int(90.0 * copied / source_size)):
-                break
-            ret = FileHelper.getFileSize(dest_name) == source_size
-      except os.error:
+        dest_hasher = hasher.copy() if hasher else None #copy before any data so it starts empty
+        with io.open(source_name, "rb", buffering=0) as source:
+          with io.open(dest_name, "wb", buffering=0) as dest:
+            source_size = os.fstat(source.fileno()).st_size
+            _preallocate(dest, source_size)
+            ret = FileHelper._copyData(source, dest, source_size, progress_cb or (lambda _: True), 
+                                       hasher) == source_size
+            if ret and (hasher or fsync):
+              os.fsync(dest.fileno())
+        if ret and hasher:
+          ret = FileHelper._hashFile(dest_name, dest_hasher).digest() == hasher.digest()
+          if not ret:
+            utils.logWarning("verify failed. source={} dest={}".format(source_name, dest_name))
+      except EnvironmentError:
         pass
       if not ret:
         FileHelper.removeFile(dest_name)
@@ -202,19 +399,257 @@ class FileHelper:
     if FileHelper.fileExists(source):
       dest_folder = FileHelper.dirname(dest)
       if not dest_folder or FileHelper.createDir(dest_folder):
-        if FileHelper.getFileSize(source) < _BLOCK_SIZE or not progress_cb:
+        if not hasher and not fsync and (FileHelper.getFileSize(source) < _BLOCK_SIZE or not progress_cb):
           ret = safeCopyFile(source, dest)
         else:
           ret = unsafeCopyFile(source, dest, progress_cb)
     return ret
   
   @staticmethod
-  def getFolders(root_folder, is_recursive):
-    folders = []
-    for root, _dirs, _files in os.walk(FileHelper.replaceSeparators(root_folder, os.sep)):
-      folders.append(root)
-      if not is_recursive:
+  def _copyData(source, dest, size, progress_cb, hasher=None):
+    """ copies size bytes from the source to the dest file object in chunks, calling progress_cb after each one.
+    The copy stops early if progress_cb returns False. Returns the number of bytes copied.
+
+    The kernel copies the data where possible (copy_file_range, then sendfile) so that it doesn't pass through 
+    python. Otherwise, or if the data is being hashed, it is read into a reusable buffer. The chunk size grows or 
+    shrinks with the measured throughput so fast disks aren't held back by tiny chunks and slow ones still report 
+    progress regularly. """
+    copiers = [_copyChunkWithReadInto]
+    if not hasher:
+      if _SENDFILE and sys.platform.startswith("linux"): #only linux can sendfile to a regular file
+        copiers.insert(0, _copyChunkWithSendFile)
+      if _COPY_FILE_RANGE:
+        copiers.insert(0, _copyChunkWithCopyFileRange)
+
+    _advise(source, 0, 0, "POSIX_FADV_SEQUENTIAL")
+    copied = 0
+    chunk_size = _MIN_CHUNK_SIZE
+    buf = []
+    while copied < size:
+      start = time.time()
+      try:
+        num_bytes = copiers[0](source, dest, copied, min(chunk_size, size - copied), buf)
+      except EnvironmentError as e:
+        if len(copiers) == 1 or e.errno not in _KERNEL_COPY_ERRORS:
+          raise
+        copiers.pop(0)
+        continue
+      if not num_bytes:
+        break
+      if hasher:
+        hasher.update(memoryview(buf[0])[:num_bytes])
+      #done with this chunk so don't let a big copy push everything else out of the page cache. for the dest this 
+      #also starts writing the chunk out
+      _advise(source, copied, num_bytes, "POSIX_FADV_DONTNEED")
+      _advise(dest, copied, num_bytes, "POSIX_FADV_DONTNEED")
+      copied += num_bytes
+      # why 90%? closing of file handles can take a while after
+      if not progress_cb(int(90.0 * copied / size)):
         break
-    return folders  
+      elapsed = time.time() - start
+      if elapsed > 0:
+        chunk_size = max(_MIN_CHUNK_SIZE, min(_MAX_CHUNK_SIZE, int(num_bytes * _CHUNK_SECS / elapsed)))
+      else:
+        chunk_size = min(_MAX_CHUNK_SIZE, chunk_size * 2)
+    return copied
+
+  @staticmethod
+  def _hashFile(filename, hasher):
+    """ reads filename in to hasher, dropping it from the page cache first where possible (see canDropCache()) so the 
+    data comes from the disk. The file must already be synced as dirty pages can't be dropped. returns hasher """
+    with io.open(filename, "rb", buffering=0) as f:
+      _advise(f, 0, 0, "POSIX_FADV_DONTNEED")
+      buf = bytearray(_MIN_CHUNK_SIZE)
+      view = memoryview(buf)
+      while True:
+        num_bytes = f.readinto(view)
+        if not num_bytes:
+          break
+        hasher.update(view[:num_bytes])
+    return hasher
+
+  @staticmethod
+  def readDir(folder):
+    """ returns a tuple of the sub folder names and a list of (name, size, mtime) tuples for the files in folder. 
+    Symbolic links to folders are not included (same as os.walk()). 
+    
+    With scandir the file type comes from the directory entry itself, so each file costs a single stat (none at all on
+    Windows where the stat is returned with the listing). """
+    if not _HAS_SCANDIR:
+      return FileHelper._readDirWithListDir(folder)
+    dirs, files = [], []
+    for entry in scandir(folder):
+      try:
+        if entry.is_dir():
+          if not entry.is_symlink():
+            dirs.append(entry.name)
+        elif entry.is_file():
+          stat = entry.stat()
+          files.append((entry.name, stat.st_size, stat.st_mtime))
+      except os.error:
+        pass
+    return dirs, files
+
+  @staticmethod
+  def _readDirWithListDir(folder):
+    dirs, files = [], []
+    for name in os.listdir(folder):
+      path = os.path.join(folder, name)
+      try:
+        stat = os.stat(path)
+      except os.error:
+        continue
+      if statmod.S_ISDIR(stat.st_mode):
+        if not os.path.islink(path):
+          dirs.append(name)
+      elif statmod.S_ISREG(stat.st_mode):
+        files.append((name, stat.st_size, stat.st_mtime))
+    return dirs, files
+
+  @staticmethod
+  def listDir(folder, scan_index=None):
+    """ same as readDir(), but the listing is retrieved from the common.scan_index.ScanIndex if one is given """
+    return scan_index.listDir(folder) if scan_index is not None else FileHelper.readDir(folder)
+
+  @staticmethod
+  def getFileRecords(folder, scan_index=None):
+    """ returns a list of FileRecord objects for the files in folder """
+    _, files = FileHelper.listDir(folder, scan_index)
+    return [FileRecord(FileHelper.joinPath(folder, name), size, mtime) for name, size, mtime in files]
+
+  @staticmethod
+  def walk(root_folder, is_recursive, scan_index=None):
+    """ generator similar to os.walk() yielding (folder, sub folder names, FileRecord list) tuples. Folders that 
+    can't be read are skipped. """
+    folders = [root_folder]
+    while folders:
+      folder = folders.pop()
+      try:
+        dirs, files = FileHelper.listDir(folder, scan_index)
+      except os.error:
+        continue
+      yield folder, dirs, [FileRecord(FileHelper.joinPath(folder, name), size, mtime) for name, size, mtime in files]
+      if is_recursive:
+        folders.extend(FileHelper.joinPath(folder, name) for name in reversed(dirs))
+
+  @staticmethod
+  def parallelWalk(root_folder, is_recursive, num_threads=DEFAULT_NUM_WALK_THREADS, scan_index=None):
+    """ same as walk() except the folders are read by num_threads threads at once. Folders are yielded in the same 
+    order as walk(), each one as soon as it and the folders before it have been read. Useful when reading a folder is 
+    latency bound (eg. on a network share). """
+    if num_threads <= 1 or not is_recursive:
+      for ret in FileHelper.walk(root_folder, is_recursive, scan_index):
+        yield ret
+      return
+
+    walker = _ParallelWalker(root_folder, num_threads, scan_index)
+    try:
+      for ret in walker.results():
+        yield ret
+    finally:
+      walker.stop()
+
+  @staticmethod
+  def iterFolders(root_folder, is_recursive, scan_index=None, num_threads=1):
+    """ generator version of getFolders() """
+    for folder, _dirs, _files in FileHelper.parallelWalk(FileHelper.replaceSeparators(root_folder, os.sep), 
+                                                         is_recursive, num_threads, scan_index):
+      yield folder
+
+  @staticmethod
+  def getFolders(root_folder, is_recursive, scan_index=None, num_threads=1):
+    return list(FileHelper.iterFolders(root_folder, is_recursive, scan_index, num_threads))  
+
+# --------------------------------------------------------------------------------------------------------------------
+def _preallocate(f, size):
+  """ reserves size bytes for f up front where the os supports it, which avoids fragmenting large files """
+  if size and _FALLOCATE:
+    try:
+      _FALLOCATE(f.fileno(), 0, size)
+    except EnvironmentError: #not supported by the filesystem
+      pass
+
+def _advise(f, offset, length, advice):
+  """ passes an access pattern hint (eg. "POSIX_FADV_SEQUENTIAL") for f to the os where it is supported """
+  if _FADVISE:
+    try:
+      _FADVISE(f.fileno(), offset, length, getattr(os, advice, _FADVISE_ADVICE[advice]))
+    except EnvironmentError:
+      pass
+
+def _copyChunkWithCopyFileRange(source, dest, offset, count, _buf):
+  return _COPY_FILE_RANGE(source.fileno(), dest.fileno(), count, offset, offset)
+
+def _copyChunkWithSendFile(source, dest, offset, count, _buf):
+  dest.seek(offset)
+  return _SENDFILE(dest.fileno(), source.fileno(), offset, count)
+
+def _copyChunkWithReadInto(source, dest, offset, count, buf):
+  """ buf is a list holding the buffer so it is only reallocated when a bigger chunk is needed """
+  if not buf or len(buf[0]) < count:
+    buf[:] = [bytearray(count)]
+  view = memoryview(buf[0])[:count]
+  source.seek(offset)
+  dest.seek(offset)
+  num_bytes = source.readinto(view)
+  written = 0
+  while written < num_bytes: #unbuffered writes may be partial
+    written += dest.write(view[written:num_bytes])
+  return num_bytes
+
+# --------------------------------------------------------------------------------------------------------------------
+class _ParallelWalker(object):
+  """ reads folders on a pool of threads. Every thread takes the next folder from a shared queue and pushes the 
+  sub folders it finds back on to it, so idle threads pick up work found by busy ones. The listings are put on a 
+  results queue as they are read and put back into walk() order by results(). """
+  def __init__(self, root_folder, num_threads, scan_index):
+    super(_ParallelWalker, self).__init__()
+    self._root_folder = root_folder
+    self._scan_index = scan_index
+    self._folders = Queue.Queue()
+    self._results = Queue.Queue()
+    self._is_stopped = False
+    self._folders.put(root_folder)
+    self._threads = [threading.Thread(target=self._run, name="walk {}".format(i)) for i in range(num_threads)]
+    for t in self._threads:
+      t.daemon = True
+      t.start()
+
+  def _run(self):
+    while True:
+      folder = self._folders.get()
+      if folder is None or self._is_stopped:
+        return
+      try:
+        dirs, files = FileHelper.listDir(folder, self._scan_index)
+        records = [FileRecord(FileHelper.joinPath(folder, name), size, mtime) for name, size, mtime in files]
+        for name in dirs:
+          self._folders.put(FileHelper.joinPath(folder, name))
+        self._results.put((folder, dirs, records))
+      except os.error:
+        self._results.put((folder, None, None))
+      except Exception:
+        self._results.put(sys.exc_info())
 
+  def results(self):
+    """ generator of (folder, sub folder names, FileRecord list) tuples. Errors other than os.error are re-raised 
+    here. """
+    read = {} #folders read ahead of their turn
+    folders = [self._root_folder]
+    while folders:
+      folder = folders.pop()
+      while folder not in read:
+        ret = self._results.get()
+        if isinstance(ret[0], type) and issubclass(ret[0], BaseException):
+          raise ret[0], ret[1], ret[2]
+        read[ret[0]] = ret
+      ret = read.pop(folder)
+      if ret[1] is None: #couldn't be read
+        continue
+      yield ret
+      folders.extend(FileHelper.joinPath(folder, name) for name in reversed(ret[1]))
 
+  def stop(self):
+    self._is_stopped = True
+    for _ in self._threads:
+      self._folders.put(None)
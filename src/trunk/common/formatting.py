@@ -5,6 +5,7 @@
 # License:             Creative Commons GNU GPL v2 (http://creativecommons.org/licenses/GPL/2.0/)
 # Purpose of document: Generates an output filename based on TvInputValues attributes
 # --------------------------------------------------------------------------------------------------------------------
+import os
 import re
 
 from common import utils
@@ -12,7 +13,10 @@ from common import file_helper
 
 CONDITIONAL_START = "%("
 CONDITIONAL_END = ")%"
-_RE_CONDITIONAL = re.compile("({}.*?{})".format(re.escape(CONDITIONAL_START), re.escape(CONDITIONAL_END)))
+_RE_KEY = r"<\w+>"
+_RE_OUTSIDE = re.compile("{}|{}".format(re.escape(CONDITIONAL_START), _RE_KEY)) #tokens outside a conditional
+_RE_INSIDE = re.compile("{}|{}|{}".format(re.escape(CONDITIONAL_END), re.escape(CONDITIONAL_START), _RE_KEY))
+_MAX_CACHED_PLANS = 256 # the preview compiles every edit of the format so don't keep them forever
 
 def _leftPad(val, places=2):
   ret = utils.toString(val).zfill(places)
@@ -21,9 +25,56 @@ def _leftPad(val, places=2):
 def _wrapReplaceStr(val):
   return "<{}>".format(val)
 
+def _toText(value):
+  return value if isinstance(value, basestring) else str(value)
+
+# --------------------------------------------------------------------------------------------------------------------
+class FormatError(ValueError):
+  """ raised for a format string that can't be compiled """
+  pass
+
+# --------------------------------------------------------------------------------------------------------------------
+class _Plan(object):
+  """ compiled format string. nodes is a list of (kind, data) pairs:
+    _TEXT, string: literal text
+    _FIELD, key: replaced by the key's value
+    _CONDITIONAL, (keys, nodes): nodes are only rendered if one of the keys has a value
+  """
+  def __init__(self, nodes, is_absolute):
+    super(_Plan, self).__init__()
+    self.nodes = nodes
+    self.is_absolute = is_absolute
+
+  def render(self, values):
+    return "".join(_renderNodes(self.nodes, values, []))
+
+_TEXT, _FIELD, _CONDITIONAL = range(3)
+
+def _renderNodes(nodes, values, out):
+  for kind, data in nodes:
+    if kind == _TEXT:
+      out.append(data)
+    elif kind == _FIELD:
+      out.append(_toText(values[data]) if data in values else data)
+    else:
+      keys, conditional_nodes = data
+      for key in keys:
+        if values.get(key):
+          _renderNodes(conditional_nodes, values, out)
+          break
+  return out
+
 # --------------------------------------------------------------------------------------------------------------------
 class BaseNameFormatter(object):
+  """ generates names from a format string where each key (eg. <t>) is replaced by the info's value. Text between 
+  CONDITIONAL_START and CONDITIONAL_END is only included if one of the keys in it has a value.
+
+  Format strings are compiled once by compile() and cached for each formatter type.
+  """
   DEFAULT_FORMAT_STR = ""
+  KEYS = ()
+
+  _plans = {} #(formatter type, format) to _Plan
 
   def __init__(self):
     super(BaseNameFormatter, self).__init__()
@@ -34,17 +85,61 @@ class BaseNameFormatter(object):
     return self.getNameFromInfo(fmt, item.getInfo(), file_helper.FileHelper.getExtension(item.filename), folder)
 
   def getNameFromInfo(self, fmt, info, ext="", folder=""):
-    ret = file_helper.FileHelper.joinPath(folder, fmt)
-    key_values = self.getValues(info).items()
-    for match in _RE_CONDITIONAL.finditer(ret):
-      text = match.group(1)
-      new_text = ""
-      if any(key in text and value for key, value in key_values):
-        new_text = self.getNameFromInfo(text[len(CONDITIONAL_START):-len(CONDITIONAL_END)], info) #strip delimiters
-      ret = ret.replace(text, new_text)
-    for key, value in key_values: #TODO: fix this. i'm sure there is a built in function for this.
-      ret = ret.replace(key, str(value))
-    return "".join([ret, ext])
+    """ raises FormatError if fmt is not valid """
+    plan = self.compile(fmt)
+    prefix = "" if plan.is_absolute else file_helper.FileHelper.joinPath(folder, "")
+    return "".join([prefix, plan.render(self.getValues(info)), ext])
+
+  def compile(self, fmt):
+    """ returns the compiled fmt. raises FormatError if fmt has an unterminated or nested conditional or an unknown 
+    key. Same as before compiling, CONDITIONAL_END outside of a conditional is just text """
+    cache_key = (type(self), fmt)
+    plan = BaseNameFormatter._plans.get(cache_key)
+    if not plan:
+      plan = _Plan(self._parse(fmt), os.path.isabs(fmt))
+      if len(BaseNameFormatter._plans) >= _MAX_CACHED_PLANS:
+        BaseNameFormatter._plans.clear()
+      BaseNameFormatter._plans[cache_key] = plan
+    return plan
+
+  def validate(self, fmt):
+    """ returns an error message if fmt is not valid, otherwise an empty string """
+    try:
+      self.compile(fmt)
+    except FormatError as ex:
+      return str(ex)
+    return ""
+
+  def _parse(self, fmt):
+    nodes = []
+    conditional = None #(keys, nodes) of the open conditional
+    pos = 0
+    while True:
+      match = (_RE_OUTSIDE if conditional is None else _RE_INSIDE).search(fmt, pos)
+      end = match.start() if match else len(fmt)
+      if end > pos:
+        (nodes if conditional is None else conditional[1]).append((_TEXT, fmt[pos:end]))
+      if not match:
+        break
+      token = match.group(0)
+      pos = match.end()
+      if token == CONDITIONAL_START:
+        if conditional is not None:
+          raise FormatError("nested {}".format(CONDITIONAL_START))
+        conditional = ([], [])
+        nodes.append((_CONDITIONAL, conditional))
+      elif token == CONDITIONAL_END:
+        conditional = None
+      elif token not in self.KEYS:
+        raise FormatError("unknown key {}. must be one of: {}".format(token, ", ".join(self.KEYS)))
+      elif conditional is None:
+        nodes.append((_FIELD, token))
+      else:
+        conditional[1].append((_FIELD, token))
+        conditional[0].append(token)
+    if conditional is not None:
+      raise FormatError("{} without a {}".format(CONDITIONAL_START, CONDITIONAL_END))
+    return nodes
 
   def getValues(self, info):
     raise NotImplementedError("BaseNameFormatter.getValues not implemented")
@@ -56,6 +151,7 @@ class TvNameFormatter(BaseNameFormatter):
   KEY_SERIES_NUM = _wrapReplaceStr("s_num")
   KEY_EP_NUM     = _wrapReplaceStr("ep_num")
   KEY_EP_NAME    = _wrapReplaceStr("ep_name")
+  KEYS = (KEY_SHOW_NAME, KEY_SERIES_NUM, KEY_EP_NUM, KEY_EP_NAME)
   DEFAULT_FORMAT_STR = "<show> - S<s_num>E<ep_num> - <ep_name>"
 
   def __init__(self):
@@ -78,6 +174,7 @@ class MovieNameFormatter(BaseNameFormatter):
   KEY_GENRE  = _wrapReplaceStr("g")
   KEY_DISC   = _wrapReplaceStr("p")
   KEY_SERIES = _wrapReplaceStr("s")
+  KEYS = (KEY_TITLE, KEY_YEAR, KEY_GENRE, KEY_DISC, KEY_SERIES)
   DEFAULT_FORMAT_STR = "<g>/%(<s> - )%<t> (<y>)%( - Disc <p>)%"
 
   def __init__(self):
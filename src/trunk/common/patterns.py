@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------------------------------------------------
+# Project:             my-renamer
+# Repository:          http://code.google.com/p/my-renamer/
+# License:             Creative Commons GNU GPL v2 (http://creativecommons.org/licenses/GPL/2.0/)
+# Purpose of document: Named filename and folder patterns compiled into a single regex
+# --------------------------------------------------------------------------------------------------------------------
+"""
+Each rule of a PatternSet is an alternative of one combined regex, so a path is scanned once no matter how many rules
+there are. Rules are tried in the order they were added, so match() returns the same result as calling match() on each
+rule's regex in turn. Named groups of a rule are only visible in that rule's matches.
+
+Python 2 applies inline flags to the whole regex, so flags are set for the PatternSet and rules must not use (?i) etc.
+
+sample usage:
+>>> folders = PatternSet(re.IGNORECASE).add("season", r".*/(?P<show>.*)/season (?P<num>\d+)$")
+>>> m = folders.match("/tv/Entourage/Season 1")
+>>> m.rule, m.groups["show"]
+('season', 'Entourage')
+"""
+import collections
+import re
+
+from common import utils
+
+_GROUP_SEPARATOR = "__" # rule name and group name are joined to keep the group names unique in the combined regex
+_RE_NAMED_GROUP = re.compile(r"\(\?P(?P<kind>[<=])(?P<name>\w+)")
+_RE_RULE_NAME = re.compile(r"^[A-Za-z]\w*$")
+
+# --------------------------------------------------------------------------------------------------------------------
+class PatternMatch(object):
+  """ result of a PatternSet match.
+
+  Attributes:
+    rule: name of the rule that matched
+    text: the text matched by the rule
+    groups: OrderedDict of the rule's named groups, in the order they appear in the rule. see also values()
+  """
+  __slots__ = ("rule", "_match", "_group_names")
+
+  def __init__(self, rule, match, group_names):
+    super(PatternMatch, self).__init__()
+    self.rule = rule
+    self._match = match
+    self._group_names = group_names
+
+  @property
+  def text(self):
+    return self._match.group(self.rule)
+
+  @property
+  def groups(self):
+    return collections.OrderedDict((group, self._match.group(prefixed)) for prefixed, group in self._group_names)
+
+  def values(self):
+    """ same as groups.values() without creating the dictionary """
+    return [self._match.group(prefixed) for prefixed, _ in self._group_names]
+
+  def __repr__(self):
+    return "<PatternMatch {} {!r}>".format(self.rule, self.text)
+
+# --------------------------------------------------------------------------------------------------------------------
+class PatternSet(object):
+  """ ordered collection of named regexes that are matched together """
+  def __init__(self, flags=0):
+    super(PatternSet, self).__init__()
+    self._flags = flags
+    self._rules = [] #list of (name, pattern)
+    self._group_names = {} #rule name to the list of its (prefixed group name, group name)
+    self._regex = None
+
+  def add(self, name, pattern):
+    """ adds a rule after the existing ones. returns self so calls can be chained """
+    utils.verify(_RE_RULE_NAME.match(name) and _GROUP_SEPARATOR not in name, "invalid rule name: {}".format(name))
+    utils.verify(name not in self._group_names, "rule already exists: {}".format(name))
+    group_names = [("".join([name, _GROUP_SEPARATOR, group]), group)
+                   for group, _ in sorted(re.compile(pattern).groupindex.items(), key=lambda kv: kv[1])]
+    self._rules.append((name, pattern))
+    self._group_names[name] = group_names
+    self._regex = None
+    return self
+
+  def rules(self):
+    return [name for name, _ in self._rules]
+
+  def _getRegex(self):
+    if not self._regex:
+      self._regex = re.compile("|".join("(?P<{}>{})".format(name, self._prefixGroups(name, pattern))
+                                        for name, pattern in self._rules), self._flags)
+    return self._regex
+
+  @staticmethod
+  def _prefixGroups(name, pattern):
+    return _RE_NAMED_GROUP.sub(lambda m: "(?P{}{}{}{}".format(m.group("kind"), name, _GROUP_SEPARATOR, m.group("name")),
+                               pattern)
+
+  def _toMatch(self, match):
+    rule = match.lastgroup
+    return PatternMatch(rule, match, self._group_names[rule])
+
+  def match(self, text):
+    """ returns a PatternMatch for the first rule that matches the start of text, otherwise None """
+    match = self._getRegex().match(text) if self._rules else None
+    return self._toMatch(match) if match else None
+
+  def matchAll(self, texts):
+    """ batched version of match(). returns a list with a PatternMatch or None for each text """
+    regex_match = self._getRegex().match if self._rules else lambda text: None
+    to_match = self._toMatch
+    ret = []
+    for text in texts:
+      match = regex_match(text)
+      ret.append(to_match(match) if match else None)
+    return ret
+
+  def findAll(self, text):
+    """ returns a list of PatternMatch for each non-overlapping match in text, from left to right. Where more than one
+    rule matches at the same position the first rule is used """
+    if not self._rules:
+      return []
+    group_names = self._group_names
+    return [PatternMatch(match.lastgroup, match, group_names[match.lastgroup])
+            for match in self._getRegex().finditer(text)]
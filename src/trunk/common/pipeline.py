@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------------------------------------------------
+# Project:             my-renamer
+# Repository:          http://code.google.com/p/my-renamer/
+# License:             Creative Commons GNU GPL v2 (http://creativecommons.org/licenses/GPL/2.0/)
+# Purpose of document: Producer / consumer pipeline of stages joined by bounded queues
+# --------------------------------------------------------------------------------------------------------------------
+"""
+sample usage:
+>>> p = Pipeline(iter(filenames)).addStage(parseFiles).addStage(lookupMovies, batch_size=50)
+>>> for movie in p:
+...   print movie, p.progress()
+"""
+import Queue
+import sys
+import threading
+
+DEFAULT_MAX_QUEUE_SIZE = 256
+_POLL_SECS = 0.1 # how often a blocked stage checks if the pipeline has been stopped
+
+_EMPTY = object() # returned by a non blocking get when there is nothing ready
+
+class _Done(object):
+  pass
+
+class _Error(object):
+  def __init__(self, exc_info):
+    self.exc_info = exc_info
+
+# --------------------------------------------------------------------------------------------------------------------
+class Pipeline(object):
+  """ runs the source and each stage on its own thread, joined by bounded queues, so the first results are available
+  while the source is still producing. Iterating the pipeline yields the output of the last stage.
+
+  A stage is a function that is given a list of items and returns a list of results. The items passed to a stage are
+  the ones that are ready, up to batch_size, rather than waiting for a full batch.
+
+  Errors raised by the source or a stage are re-raised when iterating.
+  """
+  def __init__(self, source, max_queue_size=DEFAULT_MAX_QUEUE_SIZE):
+    super(Pipeline, self).__init__()
+    self._source = source
+    self._max_queue_size = max_queue_size
+    self._stages = []
+    self._is_stopped = False
+    self._is_source_done = False
+    self._num_produced = 0
+    self._num_done = 0
+
+  def addStage(self, fn, batch_size=1):
+    """ adds a stage and returns self """
+    self._stages.append((fn, batch_size))
+    return self
+
+  def __iter__(self):
+    queue = self._start()
+    try:
+      while True:
+        item = self._get(queue)
+        if isinstance(item, _Done):
+          return
+        if isinstance(item, _Error):
+          raise item.exc_info[0], item.exc_info[1], item.exc_info[2]
+        self._num_done += 1
+        yield item
+    finally:
+      self.close()
+
+  def close(self):
+    """ stops all the threads """
+    self._is_stopped = True
+
+  def progress(self):
+    """ returns the estimated percentage complete. While the source is still producing the total is unknown so this is
+    the proportion of the items found so far that are done, held under 100 until the source is finished. Assumes the
+    stages return one result per item. """
+    if not self._num_produced:
+      return 0
+    percentage = min(int(100.0 * self._num_done / self._num_produced), 100)
+    return percentage if self._is_source_done else min(percentage, 99)
+
+  def _start(self):
+    in_queue = Queue.Queue(self._max_queue_size)
+    self._startThread(self._runSource, in_queue)
+    for fn, batch_size in self._stages:
+      out_queue = Queue.Queue(self._max_queue_size)
+      self._startThread(self._runStage, fn, batch_size, in_queue, out_queue)
+      in_queue = out_queue
+    return in_queue
+
+  def _startThread(self, target, *args):
+    t = threading.Thread(target=target, args=args)
+    t.daemon = True
+    t.start()
+
+  def _put(self, queue, item):
+    while not self._is_stopped:
+      try:
+        queue.put(item, timeout=_POLL_SECS)
+        return True
+      except Queue.Full:
+        pass
+    return False
+
+  def _get(self, queue, block=True):
+    while not self._is_stopped:
+      try:
+        return queue.get(block, _POLL_SECS)
+      except Queue.Empty:
+        if not block:
+          return _EMPTY
+    return _Done()
+
+  def _runSource(self, out_queue):
+    source = iter(self._source)
+    ret = _Done()
+    try:
+      for item in source:
+        self._num_produced += 1
+        if not self._put(out_queue, item):
+          break
+    except Exception:
+      ret = _Error(sys.exc_info())
+    finally:
+      close = getattr(source, "close", None)
+      if close:
+        close()
+      self._is_source_done = True
+    self._put(out_queue, ret)
+
+  def _runStage(self, fn, batch_size, in_queue, out_queue):
+    while not self._is_stopped:
+      batch = []
+      end = self._get(in_queue)
+      while not isinstance(end, (_Done, _Error)):
+        batch.append(end)
+        end = self._get(in_queue, block=False) if len(batch) < batch_size else _EMPTY
+        if end is _EMPTY:
+          break
+      if batch:
+        try:
+          results = fn(batch)
+        except Exception:
+          self._put(out_queue, _Error(sys.exc_info()))
+          return
+        for result in results:
+          if not self._put(out_queue, result):
+            return
+      if end is not _EMPTY:
+        self._put(out_queue, end)
+        return
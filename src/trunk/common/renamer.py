@@ -5,10 +5,25 @@
 # License:             Creative Commons GNU GPL v2 (http://creativecommons.org/licenses/GPL/2.0/)
 # Purpose of document: Class responsible for the moving/copying of files
 # --------------------------------------------------------------------------------------------------------------------
+import collections
+import functools
+import heapq
+import itertools
+import os
+import threading
+
 from common import file_helper
 from common import utils
+from common import worker
 
 _ID_COUNT = 0
+DEFAULT_NUM_RENAME_WORKERS = 4
+
+#when copied files are flushed to disk
+FSYNC_NONE = "none" #left to the os
+FSYNC_FILE = "file" #before each copy is reported as done
+FSYNC_BATCH = "batch" #once all the items queued together are done. see BaseRenamer.sync()
+FSYNC_POLICIES = (FSYNC_NONE, FSYNC_FILE, FSYNC_BATCH)
 
 # --------------------------------------------------------------------------------------------------------------------
 class BaseRenameItemGenerator(object):
@@ -35,7 +50,9 @@ class RenameItemGenerator(BaseRenameItemGenerator):
     return FileRenamer(item.filename, name, can_overwrite=not self.config.dont_overwrite,
         keep_source=not self.config.is_move,
         subtitle_extensions=self.config.getSubtitles(),
-        action_text="rename {}".format(item.getInfo().mode))
+        action_text="rename {}".format(item.getInfo().mode),
+        verify=self.config.verify,
+        fsync_policy=self.config.fsync_policy)
 
 # --------------------------------------------------------------------------------------------------------------------
 class BaseRenamer(object):
@@ -55,6 +72,21 @@ class BaseRenamer(object):
   def performAction(self, progress_cb=None):
     raise NotImplementedError("BaseRenamer.performAction not implemented")
 
+  def sync(self):
+    """ flushes anything written by performAction() that hasn't been flushed to disk yet. Called once all the items 
+    queued together have been performed """
+    pass
+
+  def getDevices(self):
+    """ returns the set of devices the action reads or writes file data on. Actions that share a device are run one 
+    at a time by RenameQueue. An empty set means the action is cheap (eg. a rename) and can run alongside anything """
+    return set()
+
+  def getPaths(self):
+    """ returns the set of normalised paths the action reads or writes. RenameQueue runs actions that share a path 
+    in the order they were added (eg. a->b before b->c) """
+    return set()
+
   def shortDescription(self):
     raise NotImplementedError("BaseRenamer.shortDescription not implemented")
   
@@ -68,15 +100,30 @@ class FileRenamer(BaseRenamer):
   COULD_NOT_OVERWRITE   = "Could not overwrite"
   INVALID_FILENAME      = "Destination file invalid"
 
-  def __init__(self, source, dest, can_overwrite, keep_source, action_text="", subtitle_extensions=None):
+  def __init__(self, source, dest, can_overwrite, keep_source, action_text="", subtitle_extensions=None, 
+               verify=False, fsync_policy=FSYNC_NONE):
     super(FileRenamer, self).__init__(action_text)
     self.source = source
     self.dest = dest
     self.can_overwrite = can_overwrite
     self.keep_source = keep_source
     self.subtitle_extensions = subtitle_extensions or []
+    self.verify = verify #if the data is copied, check the destination against a checksum of the source
+    self.digest = "" #"<algorithm>:<hex digest>" of the copied data when verified
+    self.fsync_policy = fsync_policy
+    self._unsynced_files = []
     self.status = FileRenamer.QUEUED
 
+  def getDevices(self):
+    source_device = file_helper.FileHelper.getDevice(self.source)
+    dest_device = file_helper.FileHelper.getDevice(self.dest)
+    if source_device == dest_device and not self.keep_source:
+      return set()
+    return set([source_device, dest_device])
+
+  def getPaths(self):
+    return set(os.path.normcase(os.path.abspath(path)) for path in (self.source, self.dest))
+
   def performAction(self, progress_cb=None):
     """ Move/Copy a file from source to destination. """
     #sanity checks
@@ -103,20 +150,56 @@ class FileRenamer(BaseRenamer):
         ret.append(sub)
     return ret
 
+  def _getHasher(self):
+    """ returns a hash object if the data will be copied and needs to be verified """
+    if not self.verify or (not self.keep_source and file_helper.FileHelper.isSameDevice(self.source, self.dest)):
+      return None
+    return file_helper.FileHelper.newHasher()
+
+  def _setDigest(self, hasher):
+    if hasher:
+      self.digest = "{}:{}".format(getattr(hasher, "name", "hash"), hasher.hexdigest())
+
+  def _copiesData(self):
+    return self.keep_source or not file_helper.FileHelper.isSameDevice(self.source, self.dest)
+
+  def _afterCopy(self, filename):
+    if self.fsync_policy == FSYNC_BATCH and self._copiesData():
+      self._unsynced_files.append(filename)
+
+  def sync(self):
+    for filename in self._unsynced_files:
+      file_helper.FileHelper.syncFile(filename)
+    self._unsynced_files = []
+
   def _moveFile(self, progress_cb):
-    if file_helper.FileHelper.moveFile(self.source, self.dest, progress_cb):
+    hasher = self._getHasher()
+    fsync = self.fsync_policy == FSYNC_FILE
+    if file_helper.FileHelper.moveFile(self.source, self.dest, progress_cb, hasher, fsync):
+      self._setDigest(hasher)
+      self._afterCopy(self.dest)
       for sub in self._subtitleFiles():
         ext = file_helper.FileHelper.changeExtension(self.dest, file_helper.FileHelper.getExtension(sub))
-        file_helper.FileHelper.moveFile(sub, ext)
+        if file_helper.FileHelper.moveFile(sub, ext, hasher=self._getHasher(), fsync=fsync):
+          self._afterCopy(ext)
+        else:
+          utils.logWarning("unable to move subtitle. source={} dest={}".format(sub, ext))
       return FileRenamer.SUCCESS
     else:
       return FileRenamer.FAILED
 
   def _copyFile(self, progress_cb):
-    if file_helper.FileHelper.copyFile(self.source, self.dest, progress_cb):
+    hasher = self._getHasher()
+    fsync = self.fsync_policy == FSYNC_FILE
+    if file_helper.FileHelper.copyFile(self.source, self.dest, progress_cb, hasher, fsync):
+      self._setDigest(hasher)
+      self._afterCopy(self.dest)
       for sub in self._subtitleFiles():
         ext = file_helper.FileHelper.changeExtension(self.dest, file_helper.FileHelper.getExtension(sub))
-        file_helper.FileHelper.copyFile(sub, ext)
+        if file_helper.FileHelper.copyFile(sub, ext, hasher=self._getHasher(), fsync=fsync):
+          self._afterCopy(ext)
+        else:
+          utils.logWarning("unable to copy subtitle. source={} dest={}".format(sub, ext))
       return FileRenamer.SUCCESS
     else:
       return FileRenamer.FAILED
@@ -126,4 +209,176 @@ class FileRenamer(BaseRenamer):
         file_helper.FileHelper.basename(self.dest), len(self._subtitleFiles()))
   
   def longDescription(self):
-    return "{} -> {} #subtitle files: {}".format(self.source, self.dest, len(self._subtitleFiles()))
+    ret = "{} -> {} #subtitle files: {}".format(self.source, self.dest, len(self._subtitleFiles()))
+    if self.digest:
+      ret = "{} verified: {}".format(ret, self.digest)
+    return ret
+
+# --------------------------------------------------------------------------------------------------------------------
+class RenameQueue(object):
+  """ thread safe queue of BaseRenamer objects shared by a pool of workers. get() returns the first item whose 
+  devices aren't in use by another worker, so renames within a device run in parallel while copies to and from the 
+  same disk run one at a time rather than competing for it. Items that share a path (see BaseRenamer.getPaths()) are
+  always run in the order they were added.
+
+  The waiting items are queued per path, and the items that are first in each of their paths' queues are kept in a
+  heap per set of devices. So get() only looks at the first item for each set of devices (one per pair of disks)
+  rather than at every waiting item. """
+  def __init__(self, items=None):
+    super(RenameQueue, self).__init__()
+    self._cond = threading.Condition()
+    self._count = itertools.count() #order the items were added in
+    self._items = {} #order to (item, devices, paths) of the waiting items
+    self._path_queues = {} #path to a deque of the order of the waiting items with the path
+    self._ready = {} #frozenset of devices to a heap of the order of the items that only wait on the devices
+    self._busy_devices = set()
+    self._busy_paths = set()
+    self._is_stopped = False
+    self.addItems(items or [])
+
+  def addItems(self, items):
+    items = [(item, frozenset(item.getDevices()), frozenset(item.getPaths())) for item in items]
+    with self._cond:
+      for entry in items:
+        order = next(self._count)
+        self._items[order] = entry
+        for path in entry[2]:
+          self._path_queues.setdefault(path, collections.deque()).append(order)
+        self._checkReady(order)
+      self._cond.notify_all()
+
+  def _checkReady(self, order):
+    """ queues the waiting item for get() if none of its paths are in use or needed by an earlier item """
+    _, devices, paths = self._items[order]
+    if all(self._path_queues[path][0] == order and path not in self._busy_paths for path in paths):
+      heapq.heappush(self._ready.setdefault(devices, []), order)
+
+  def get(self):
+    """ blocks until an item can be started. returns (item, resources) or None once the queue is empty or stopped.
+    call done() with the resources when the item is finished. """
+    with self._cond:
+      while not self._is_stopped and self._items:
+        free = [orders for devices, orders in self._ready.items() if not devices & self._busy_devices]
+        if free:
+          orders = min(free, key=lambda orders: orders[0])
+          item, devices, paths = self._items.pop(heapq.heappop(orders))
+          if not orders:
+            del self._ready[devices]
+          for path in paths:
+            queue = self._path_queues[path]
+            queue.popleft()
+            if not queue:
+              del self._path_queues[path]
+          self._busy_devices |= devices
+          self._busy_paths |= paths
+          return item, (devices, paths)
+        self._cond.wait()
+    return None
+
+  def done(self, resources):
+    devices, paths = resources
+    with self._cond:
+      self._busy_devices -= devices
+      self._busy_paths -= paths
+      for order in set(self._path_queues[path][0] for path in paths if path in self._path_queues):
+        self._checkReady(order)
+      self._cond.notify_all()
+
+  def stop(self):
+    with self._cond:
+      self._is_stopped = True
+      self._cond.notify_all()
+
+  def __len__(self):
+    with self._cond:
+      return len(self._items)
+
+# --------------------------------------------------------------------------------------------------------------------
+class RenameWorker(worker.Worker):
+  """ 
+  performs the rename of the items on a pool of threads. run() returns once there are no items left, including any 
+  added by addItems() while it was running.
+  
+  Args:
+    items: list of BaseRenamer objects to be renamed
+    num_workers: number of items that may be renamed at once. see RenameQueue
+
+  Attributes:
+    item_changed_cb: called with the item and its percentage complete as it progresses
+  """
+  def __init__(self, name="renamer", items=None, num_workers=DEFAULT_NUM_RENAME_WORKERS):
+    super(RenameWorker, self).__init__(name)
+    self._queue = RenameQueue(items)
+    self._num_workers = num_workers
+    self._done_items = []
+    self._lock = threading.Lock() #guards _threads and _is_active
+    self._threads = []
+    self._is_active = False
+    self.item_changed_cb = None
+    
+  def _run(self):
+    with self._lock:
+      self._is_active = True
+    while True:
+      self._runPool()
+      done_items, self._done_items = self._done_items, []
+      for item in done_items:
+        item.sync()
+      with self._lock:
+        #items may have been added (and threads started for them) while syncing
+        if not any(t.is_alive() for t in self._threads) and (self._user_stopped or not len(self._queue)):
+          self._is_active = False
+          return
+
+  def _runPool(self):
+    """ runs the pool threads until they have all finished """
+    with self._lock:
+      self._startThreads()
+    while True:
+      with self._lock:
+        threads = [t for t in self._threads if t.is_alive()]
+      if not threads:
+        break
+      threads[0].join()
+
+  def _startThreads(self):
+    """ tops the pool up to num_workers threads. must hold _lock """
+    self._threads = [t for t in self._threads if t.is_alive()]
+    if self._user_stopped:
+      return
+    for _ in range(self._num_workers - len(self._threads)):
+      t = threading.Thread(target=self._runWorker, name=self._name)
+      t.daemon = True
+      t.start()
+      self._threads.append(t)
+
+  def _runWorker(self):
+    while not self._user_stopped:
+      next_item = self._queue.get()
+      if not next_item:
+        break
+      item, resources = next_item
+      try:
+        item.performAction(progress_cb=functools.partial(self._itemUpdated, item))
+      finally:
+        self._queue.done(resources)
+      self._done_items.append(item)
+      self._itemUpdated(item)
+      
+  def _itemUpdated(self, item, percentage=0):
+    if self.item_changed_cb:
+      self.item_changed_cb(item, percentage)
+    return not self._user_stopped
+
+  def join(self):
+    super(RenameWorker, self).join()
+    self._queue.stop()
+
+  def addItems(self, items):
+    """ queues items. returns True if the worker is running and will rename them, otherwise it needs to be started.
+    Threads are added back to the pool as needed, eg. if only one is left finishing a long copy """
+    with self._lock:
+      self._queue.addItems(items)
+      if self._is_active:
+        self._startThreads()
+      return self._is_active
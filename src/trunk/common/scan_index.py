@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------------------------------------------------
+# Project:             my-renamer
+# Repository:          http://code.google.com/p/my-renamer/
+# License:             Creative Commons GNU GPL v2 (http://creativecommons.org/licenses/GPL/2.0/)
+# Purpose of document: Persistent index of directory listings so unchanged folders are not re-read on rescan
+# --------------------------------------------------------------------------------------------------------------------
+import os
+import sqlite3
+import threading
+import time
+
+try:
+  import cPickle as pickle
+except ImportError:
+  import pickle
+
+from common import cache
+from common import file_helper
+from common import utils
+
+IN_MEMORY = cache.IN_MEMORY
+_COMMIT_EVERY = 100 # number of writes before they are committed when there is no background flush
+RECENTLY_MODIFIED_SECS = 60 * 60 # folders with a file (or the folder itself) modified this recently aren't indexed
+
+def _toKey(path):
+  return sqlite3.Binary(path.encode("utf-8") if isinstance(path, unicode) else path)
+
+# --------------------------------------------------------------------------------------------------------------------
+class ScanIndex(object):
+  """ sqlite backed index of the common.file_helper.FileHelper.readDir() result of each folder. The listing is keyed
+  by the folder's path and is reused for as long as the folder's mtime and inode are unchanged, which costs a single
+  stat instead of reading the folder and stat'ing every file in it. What was parsed from the files of a folder (see
+  getParsed()) is stored alongside the listing and reused in the same way, so the files of an unchanged folder are 
+  not parsed again either.
+
+  A folder's mtime changes when entries are added, removed or renamed but not when an existing file is modified in
+  place. So that the sizes of files that are still being written (eg. downloads) aren't reused, a folder is only 
+  indexed once it and its files haven't been modified for RECENTLY_MODIFIED_SECS. Until then it is read each time.
+
+  Like common.cache.InfoCache, writes to a file are held in memory and written in the background every 
+  flush_interval_secs.
+  """
+  def __init__(self, filename=IN_MEMORY, flush_interval_secs=cache.DEFAULT_FLUSH_INTERVAL_SECS):
+    super(ScanIndex, self).__init__()
+    self._lock = threading.RLock()
+    self._num_pending_writes = 0
+    self._pending = {} #key to (mtime, ino, listing) not yet written
+    self._pending_results = {} #(key, name) to (mtime, ino, result) not yet written
+    self._versions = {} #key to the (mtime, ino) of the last listing returned by listDir(), used by getParsed()
+    self._conn = cache.openDatabase(filename)
+    with self._lock:
+      self._conn.execute("CREATE TABLE IF NOT EXISTS scan_index (path BLOB PRIMARY KEY, mtime REAL, ino INTEGER, "
+                         "listing BLOB)")
+      self._conn.execute("CREATE TABLE IF NOT EXISTS scan_results (path BLOB, name TEXT, mtime REAL, ino INTEGER, "
+                         "result BLOB, PRIMARY KEY (path, name))")
+      self._conn.commit()
+    self._flusher = None
+    if filename != IN_MEMORY and flush_interval_secs > 0:
+      self._flusher = cache.BackgroundFlusher(self.flush, flush_interval_secs, "scan index flusher")
+
+  def listDir(self, folder):
+    """ same as common.file_helper.FileHelper.readDir() but returns the indexed listing if folder is unchanged """
+    listing, version = self._listDir(folder)
+    if version:
+      with self._lock:
+        self._versions[_toKey(folder)] = version
+    return listing
+
+  def _listDir(self, folder):
+    """ returns the listing of folder and the (mtime, ino) it is indexed under, or None if it isn't indexed """
+    stat = os.stat(folder)
+    version = (stat.st_mtime, stat.st_ino)
+    key = _toKey(folder)
+    with self._lock:
+      row = self._pending.get(key) or self._conn.execute("SELECT mtime, ino, listing FROM scan_index WHERE path = ?",
+                                                          (key,)).fetchone()
+    if row and (row[0], row[1]) == version:
+      return pickle.loads(str(row[2])), version
+
+    listing = file_helper.FileHelper.readDir(folder)
+    min_mtime = time.time() - RECENTLY_MODIFIED_SECS
+    if stat.st_mtime >= min_mtime or any(mtime >= min_mtime for _, _, mtime in listing[1]):
+      return listing, None
+    with self._lock:
+      self._pending[key] = version + (sqlite3.Binary(pickle.dumps(listing, 2)),)
+      self._addPendingWrite()
+    return listing, version
+
+  def getParsed(self, folder, name, parse):
+    """ returns parse(records), where records is the list of common.file_helper.FileRecord objects for the files in 
+    folder. The result is stored under name and returned without calling parse again for as long as the listing of 
+    folder is unchanged. name must identify parse and any settings it depends on, and the result must be picklable.
+
+    If folder was listed by listDir() (eg. while walking it) that listing's result is returned, without a stat. """
+    key = _toKey(folder)
+    with self._lock:
+      version = self._versions.pop(key, None)
+    if not version:
+      stat = os.stat(folder)
+      version = (stat.st_mtime, stat.st_ino)
+    with self._lock:
+      row = self._pending_results.get((key, name)) or self._conn.execute(
+          "SELECT mtime, ino, result FROM scan_results WHERE path = ? AND name = ?", (key, name)).fetchone()
+    if row and (row[0], row[1]) == version:
+      return pickle.loads(str(row[2]))
+
+    (_, files), version = self._listDir(folder)
+    ret = parse([file_helper.FileRecord(file_helper.FileHelper.joinPath(folder, filename), size, mtime)
+                 for filename, size, mtime in files])
+    if version:
+      with self._lock:
+        self._pending_results[(key, name)] = version + (sqlite3.Binary(pickle.dumps(ret, 2)),)
+        self._addPendingWrite()
+    return ret
+
+  def _addPendingWrite(self):
+    """ must hold _lock """
+    self._num_pending_writes += 1
+    if not self._flusher and self._num_pending_writes >= _COMMIT_EVERY:
+      self._commit()
+
+  def _commit(self):
+    if self._pending:
+      self._conn.executemany("INSERT OR REPLACE INTO scan_index (path, mtime, ino, listing) VALUES (?, ?, ?, ?)",
+                             [(key,) + row for key, row in self._pending.items()])
+      self._pending = {}
+    if self._pending_results:
+      self._conn.executemany("INSERT OR REPLACE INTO scan_results (path, name, mtime, ino, result) "
+                             "VALUES (?, ?, ?, ?, ?)", [key + row for key, row in self._pending_results.items()])
+      self._pending_results = {}
+    self._conn.commit()
+    self._num_pending_writes = 0
+
+  def flush(self):
+    """ writes pending changes to disk """
+    with self._lock:
+      if self._num_pending_writes:
+        self._commit()
+
+  def clear(self):
+    """ removes all entries """
+    with self._lock:
+      self._pending = {}
+      self._pending_results = {}
+      self._versions = {}
+      self._conn.execute("DELETE FROM scan_index")
+      self._conn.execute("DELETE FROM scan_results")
+      self._commit()
+    utils.logDebug("scan index cleared")
+
+  def close(self):
+    if self._flusher:
+      self._flusher.stop()
+    with self._lock:
+      self._commit()
+      self._conn.close()
+
+  def __len__(self):
+    with self._lock:
+      self._commit()
+      return self._conn.execute("SELECT COUNT(*) FROM scan_index").fetchone()[0]
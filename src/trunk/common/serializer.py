@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------------------------------------------------
+# Project:             my-renamer
+# Repository:          http://code.google.com/p/my-renamer/
+# License:             Creative Commons GNU GPL v2 (http://creativecommons.org/licenses/GPL/2.0/)
+# Purpose of document: Compact, versioned json encoding of the info types
+# --------------------------------------------------------------------------------------------------------------------
+"""
+Unlike jsonpickle, which walks every attribute of an object and records its full class path, each supported type is
+written as a dictionary of just its fields plus a short type name and schema version. Anything else must be a plain
+json value (dictionaries must not use the TYPE_KEY key).
+
+sample usage:
+>>> text = encode(MovieInfo("Alien", "1979"))
+>>> decode(text)
+<MovieInfo>
+>>> dump(infos, f) # one encoded value per line
+>>> for info in load(f):
+...   print info
+"""
+import json
+
+from media.movie import types as movie_types
+from media.tv import types as tv_types
+
+TYPE_KEY = "_t"
+VERSION_KEY = "_v"
+
+_SEPARATORS = (",", ":")
+
+# --------------------------------------------------------------------------------------------------------------------
+def _movieToDict(info):
+  return {"title": info.title, "year": info.year, "genres": info.genres, "series": info.series, "part": info.part}
+
+def _movieFromDict(data):
+  return movie_types.MovieInfo(data["title"], data["year"], data["genres"], data["series"], data["part"])
+
+def _episodeToDict(info):
+  return {"ep_num": info.ep_num, "ep_name": info.ep_name}
+
+def _episodeFromDict(data):
+  return tv_types.EpisodeInfo(data["ep_num"], data["ep_name"])
+
+def _advancedEpisodeToDict(info):
+  return {"show_name": info.show_name, "season_num": info.season_num, "ep_num": info.ep_num,
+          "ep_name": info.ep_name}
+
+def _advancedEpisodeFromDict(data):
+  return tv_types.AdvancedEpisodeInfo(data["show_name"], data["season_num"], data["ep_num"], data["ep_name"])
+
+def _seasonToDict(info):
+  return {"show_name": info.show_name, "season_num": info.season_num,
+          "episodes": [[episode.ep_num, episode.ep_name] for episode in info.episodes]}
+
+def _seasonFromDict(data):
+  ret = tv_types.SeasonInfo(data["show_name"], data["season_num"])
+  ret.episodes = [tv_types.EpisodeInfo(ep_num, ep_name) for ep_num, ep_name in data["episodes"]]
+  return ret
+
+# type: (name, version, to dict, from dict). bump the version when the fields of a type change
+_SCHEMAS = {
+  movie_types.MovieInfo: ("movie", 1, _movieToDict, _movieFromDict),
+  tv_types.EpisodeInfo: ("episode", 1, _episodeToDict, _episodeFromDict),
+  tv_types.AdvancedEpisodeInfo: ("advanced_episode", 1, _advancedEpisodeToDict, _advancedEpisodeFromDict),
+  tv_types.SeasonInfo: ("season", 1, _seasonToDict, _seasonFromDict),
+}
+_SCHEMAS_BY_NAME = dict((name, (version, from_dict)) for name, version, _, from_dict in _SCHEMAS.values())
+
+# --------------------------------------------------------------------------------------------------------------------
+def toDict(value):
+  """ returns a json compatible version of value. raises TypeError for unsupported types """
+  schema = _SCHEMAS.get(type(value))
+  if schema:
+    name, version, to_dict, _ = schema
+    ret = to_dict(value)
+    ret[TYPE_KEY] = name
+    ret[VERSION_KEY] = version
+    return ret
+  if isinstance(value, (list, tuple)):
+    return [toDict(i) for i in value]
+  if isinstance(value, dict):
+    return dict((k, toDict(v)) for k, v in value.items())
+  if value is None or isinstance(value, (basestring, int, long, float, bool)):
+    return value
+  raise TypeError("unable to serialize type: {}".format(type(value).__name__))
+
+def fromDict(data):
+  """ reverse of toDict(). raises ValueError for unknown types or versions newer than this code supports """
+  if isinstance(data, list):
+    return [fromDict(i) for i in data]
+  if isinstance(data, dict):
+    if TYPE_KEY not in data:
+      return dict((k, fromDict(v)) for k, v in data.items())
+    name = data[TYPE_KEY]
+    if name not in _SCHEMAS_BY_NAME:
+      raise ValueError("unknown type: {}".format(name))
+    version, from_dict = _SCHEMAS_BY_NAME[name]
+    if data.get(VERSION_KEY, 0) > version:
+      raise ValueError("unsupported {} version: {}. max: {}".format(name, data.get(VERSION_KEY), version))
+    return from_dict(data)
+  return data
+
+def encode(value):
+  return json.dumps(toDict(value), separators=_SEPARATORS)
+
+def decode(text):
+  return fromDict(json.loads(text))
+
+# --------------------------------------------------------------------------------------------------------------------
+def dump(values, file_obj):
+  """ writes each value to file_obj on its own line. values can be any iterable so they don't need to be in memory """
+  for value in values:
+    file_obj.write(encode(value))
+    file_obj.write("\n")
+
+def load(file_obj):
+  """ generator returning the values written by dump() one line at a time """
+  for line in file_obj:
+    if line.strip():
+      yield decode(line)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------------------------------------------------
+# Project:             my-renamer
+# Repository:          http://code.google.com/p/my-renamer/
+# License:             Creative Commons GNU GPL v2 (http://creativecommons.org/licenses/GPL/2.0/)
+# Purpose of document: Worker abstraction that doesn't depend on Qt. see common.thread for the Qt adapter
+# --------------------------------------------------------------------------------------------------------------------
+"""
+sample usage:
+>>> w = MyWorker("search")
+>>> w.data_cb = results.append
+>>> w.start()
+>>> w.wait()
+"""
+import collections
+import threading
+import time
+
+from common import utils
+
+# --------------------------------------------------------------------------------------------------------------------
+def prettyTime(start_time):
+  secs = time.clock() - start_time
+  utils.verify(secs >= 0, "Can't be negative")
+  if secs < 60:
+    return "{:.1f} secs".format(secs)
+  mins = secs / 60
+  if mins < 60:
+    return "{:.1f} mins".format(mins)
+  hours = secs / (60 * 60)
+  return "{:.1f} hours".format(hours)
+
+# --------------------------------------------------------------------------------------------------------------------
+class WorkItem(object):
+  """ result and object. assumed result is human readible """
+  def __init__(self, obj, result):
+    super(WorkItem, self).__init__()
+    self.obj = obj
+    self.result = result
+
+# --------------------------------------------------------------------------------------------------------------------
+class Worker(object):
+  """ base worker intended for use on a list of tasks where it can periodically report progress, log and new data.
+  run() does the work on the calling thread, start() runs it on a new one.
+
+  Attributes:
+    progress_cb: called with the percentage complete
+    log_cb: called with log messages
+    data_cb: called with each new piece of data
+  """
+  def __init__(self, name):
+    super(Worker, self).__init__()
+    #utils.verifyType(name, str)
+    self._name = name
+    self._user_stopped = False
+    self._thread = None
+    self.start_time = None
+    self.progress_cb = None
+    self.log_cb = None
+    self.data_cb = None
+
+  def run(self):
+    self._user_stopped = False
+    self.start_time = time.clock()
+    self._run()
+
+  def _run(self):
+    raise NotImplementedError("Worker._run not implemented")
+
+  def start(self):
+    self._thread = threading.Thread(target=self.run, name=self._name)
+    self._thread.daemon = True
+    self._thread.start()
+
+  def isRunning(self):
+    return bool(self._thread and self._thread.is_alive())
+
+  def wait(self, timeout=None):
+    """ blocks until the thread started by start() is done """
+    if self._thread:
+      self._thread.join(timeout)
+
+  def join(self):
+    """ asks the worker to stop. doesn't block, see wait() """
+    self._user_stopped = True
+
+  def _onLog(self, msg):
+    if self.log_cb:
+      self.log_cb(msg)
+
+  def _onProgress(self, percentage):
+    if self.progress_cb:
+      self.progress_cb(percentage)
+
+  def _onData(self, data):
+    if self.data_cb:
+      self.data_cb(data)
+
+# --------------------------------------------------------------------------------------------------------------------
+class AdvancedWorker(Worker):
+  """ 'simplified' version of Worker were all summary messages are handled consistently """
+  def __init__(self, name):
+    super(AdvancedWorker, self).__init__(name)
+    self._i = 0
+    self._num_items = 0
+
+  def _getAllItems(self):
+    """ returns the items to apply _applyToItem() to. Either a list or an iterable (eg. a common.pipeline.Pipeline)
+    that may also provide progress() as an estimate of the percentage complete when the total is not known up front """
+    raise NotImplementedError("AdvancedWorker._getAllItems not implemented")
+
+  def _applyToItem(self, item):
+    raise NotImplementedError("AdvancedWorker._applyToItem not implemented")
+
+  def _run(self):
+    """ obfuscation for the win!! wow. this is madness. sorry """
+    items = self._getAllItems()
+    item_count = 0
+    self._num_items = len(items) if hasattr(items, "__len__") else 0
+    results = collections.Counter()
+    for self._i, input_item in enumerate(items):
+      item = self._applyToItem(input_item)
+      if item:
+        if item.obj != None:
+          self._onData(item.obj)
+          item_count += 1
+        results[item.result] += 1
+      if self._user_stopped:
+        """self._onLog(utils.LogItem(utils.LogLevel.INFO,
+                                     self._name,
+                                     "User cancelled. {} of {} processed.".format(self._i + 1, self._num_items)))"""
+        break
+      self._onProgress(self._getProgress(items))
+    close = getattr(items, "close", None)
+    if close:
+      close()
+
+    results["Total"] = sum(v for _, v in results.items())
+    summary_text = " ".join([("{}:{}".format(key, results[key]))
+                            for key in sorted(results, key=lambda k: results[k] + 1 if k == "Total" else 0)])
+    """self._onLog(utils.LogItem(utils.LogLevel.INFO,
+                                 self._name,
+                                 "Action complete. {} processed in {}. Summary: {}".format(item_count,
+                                                                                           prettyTime(self.start_time),
+                                                                                           summary_text)))"""
+
+  def _getProgress(self, items):
+    if self._num_items:
+      return int(100.0 * (self._i + 1) / self._num_items)
+    progress = getattr(items, "progress", None)
+    return progress() if progress else 0
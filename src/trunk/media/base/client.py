@@ -5,8 +5,35 @@
 # License:             Creative Commons GNU GPL v2 (http://creativecommons.org/licenses/GPL/2.0/)
 # Purpose of document: Module that defines the interface to the info clients and the container to client them
 # --------------------------------------------------------------------------------------------------------------------
+import pkgutil
+import sys
+import threading
+
 from common import utils
 
+try:
+  from importlib.util import find_spec as _find_spec
+except ImportError: #python 2
+  _find_spec = None
+
+DEFAULT_NUM_THREADS = 8
+DEFAULT_MAX_CONNECTIONS = 2
+
+# --------------------------------------------------------------------------------------------------------------------
+def hasLibrary(name):
+  """ returns True if the library can be imported without importing it. Only the top level package of a dotted name is
+  checked as finding a sub module would import its parent. The client libraries are imported on first use so startup 
+  doesn't pay for libraries that aren't used. """
+  package = name.split(".")[0]
+  if package in sys.modules:
+    return True
+  try:
+    if _find_spec:
+      return _find_spec(package) is not None
+    return pkgutil.find_loader(package) is not None
+  except (ImportError, ValueError):
+    return False
+
 # --------------------------------------------------------------------------------------------------------------------
 class BaseInfoClient(object):
   """ class to retrieve information from an online (or other) resource using a 3rd party library (source)
@@ -14,7 +41,8 @@ class BaseInfoClient(object):
     display_name: name of the library used
     source_name: name of the website the library is connected to
     url: url of the website being connected to
-    has_lib: was the library loaded successfully? ie. did import succeed.
+    has_lib: is the library installed? see hasLibrary(). The library itself is imported by _getAllInfo(), if that 
+      fails has_lib is set to False.
     requires_key: some sources require a key in order to access
   
   Attributes (configurable via media.base.widget.EditInfoClientsWidget):
@@ -22,10 +50,13 @@ class BaseInfoClient(object):
       library
     is_enabled: a boolean indicating whether or not to use the client for information retrieval. 
       Perhaps when a client is running slow you may want to disable the client. (default True).
+    max_connections: maximum number of concurrent requests made to the source. Requests beyond this will block
+      until a connection is freed.
       
   Only one function needs to be overwritten. 
   """
-  def __init__(self, display_name, source_name, url, has_lib, requires_key):
+  def __init__(self, display_name, source_name, url, has_lib, requires_key,
+               max_connections=DEFAULT_MAX_CONNECTIONS):
     super(BaseInfoClient, self).__init__()
     self.display_name = display_name
     self.source_name = source_name
@@ -34,6 +65,8 @@ class BaseInfoClient(object):
     self.requires_key = requires_key
     self.key = ""
     self.is_enabled = True
+    self.max_connections = max_connections
+    self._connections = threading.BoundedSemaphore(max_connections)
 
   def prettyName(self):
     """ display name, also used to uniquely identify client in """
@@ -56,16 +89,26 @@ class BaseInfoClient(object):
     return infos[0] if infos else None
 
   def getAllInfo(self, search_params):
-    """ returns a list of ResultHolder objects for all items matching the search parameters 
+    """ returns a list of ResultHolder objects for all items matching the search parameters. None is returned if the
+    library is unavailable or the lookup raised, ie. when it is unknown whether the item exists.
     Args: 
       search_params: media.base.BaseSearchParams object used to assist client finding info
     """    
     ret = []
     try:
-      ret = self._getAllInfo(search_params) if self.isAvailable() else None
+      if self.isAvailable():
+        with self._connections:
+          ret = self._getAllInfo(search_params)
+      else:
+        ret = None
+    except ImportError as ex:
+      utils.logWarning("unable to import lib. lib={} ex={}".format(self.display_name, ex))
+      self.has_lib = False
+      ret = None
     except Exception as ex:
       utils.logWarning("uncaught exception in lib. lib={} params={} ex={}".format(self.display_name,
           search_params.getKey(), ex))
+      ret = None
     return ret
 
   def _getAllInfo(self, search_params):
@@ -100,10 +143,16 @@ class InfoClientHolder(object):
   See media.tv.client.getInfoClientHolder() and media.movie.client.getInfoClientHolder() for sample usage.
   
   The clients can be modified using the media.base.widget.EditInfoClientsWidget.  
+
+  Lookups are performed on a bounded pool of num_threads threads. Each client additionally limits the number of 
+  concurrent requests made to its source (see BaseInfoClient.max_connections).
   """
-  def __init__(self):
+  def __init__(self, num_threads=DEFAULT_NUM_THREADS):
     super(InfoClientHolder, self).__init__()
     self.clients = []
+    self.num_threads = num_threads
+    self._pool = None
+    self._pool_lock = threading.Lock()
 
   def addClient(self, client):
     """ adds client to the end of list unless it is found to be already in the list """
@@ -152,11 +201,70 @@ class InfoClientHolder(object):
     Returns:
       media.base.types.BaseInfo
     """
-    return next(self.getAllInfo(search_params), ResultHolder(default, "")).info
+    info, _ = self.findInfo(search_params)
+    return info or default
 
-  def getAllInfo(self, search_params):
-    """ returns an iterator to ResultHolder objects """
+  def findInfo(self, search_params, skip_names=()):
+    """ queries the active clients in order until an info object is found
+    Args:
+      search_params: media.base.types.BaseSearchParams object used to define search
+      skip_names: names of clients (see BaseInfoClient.prettyName()) not to query. eg. clients already known not to
+        have the item
+    Returns:
+      tuple of the media.base.types.BaseInfo found (or None) and the list of client names that were queried and 
+      did not find anything
+    """
+    not_found = []
     for client in self.clients:
-      if client.isActive():
-        for info in client.getAllInfo(search_params):
-          yield ResultHolder(info, client.source_name)
+      if client.isActive() and not client.prettyName() in skip_names:
+        infos = client.getAllInfo(search_params)
+        if infos:
+          return infos[0], not_found
+        elif infos is not None:
+          not_found.append(client.prettyName())
+    return None, not_found
+
+  def findInfos(self, search_params_list, skip_names_cb=None):
+    """ concurrent version of findInfo(). each unique search params key is only looked up once.
+    Args:
+      search_params_list: list of media.base.types.BaseSearchParams objects
+      skip_names_cb: function taking the search params and returning the skip_names for findInfo()
+    Returns:
+      dictionary mapping search params key to the findInfo() result
+    """
+    unique = {}
+    for search_params in search_params_list:
+      unique.setdefault(search_params.getKey(), search_params)
+    keys = unique.keys()
+    skip_names_cb = skip_names_cb or (lambda _search_params: ())
+    results = self._getPool().map(lambda key: self.findInfo(unique[key], skip_names_cb(unique[key])), keys)
+    return dict(zip(keys, results))
+
+  def getInfos(self, search_params_list, default_cb=None):
+    """ concurrent version of getInfo(). each unique search params key is only looked up once.
+    Args:
+      search_params_list: list of media.base.types.BaseSearchParams objects
+      default_cb: function taking the search params and returning the value for items that could not be found
+    Returns:
+      dictionary mapping search params key to media.base.types.BaseInfo
+    """
+    default_cb = default_cb or (lambda _search_params: None)
+    defaults = dict((search_params.getKey(), search_params) for search_params in search_params_list)
+    return dict((key, info or default_cb(defaults[key]))
+                for key, (info, _) in self.findInfos(search_params_list).items())
+
+  def getAllInfo(self, search_params):
+    """ returns an iterator to ResultHolder objects. all active clients are queried concurrently, but the results are
+    returned in client priority order. """
+    clients = [client for client in self.clients if client.isActive()]
+    results = self._getPool().imap(lambda c: c.getAllInfo(search_params), clients)
+    for client in clients:
+      for info in next(results) or []:
+        yield ResultHolder(info, client.source_name)
+
+  def _getPool(self):
+    with self._pool_lock:
+      if not self._pool:
+        from multiprocessing.pool import ThreadPool #deferred as it is only needed once a lookup is made
+        self._pool = ThreadPool(self.num_threads)
+      return self._pool
@@ -5,25 +5,29 @@
 # License:             Creative Commons GNU GPL v2 (http://creativecommons.org/licenses/GPL/2.0/)
 # Purpose of document: cache of info client results 
 # --------------------------------------------------------------------------------------------------------------------
-import copy
-
-from common import file_helper
+from common import cache
 
 # --------------------------------------------------------------------------------------------------------------------
 class BaseManager(object):
   """ maintains a cache of previous info client results. if the item can not be found in the cache the info client
   hold is called to retrieve info directly from the 3rd party. 
+
+  Misses are cached too, along with the names of the clients that could not find the item. Those clients are not
+  queried again for the item until the miss expires, so only newly enabled clients are tried on a rescan.
   
   Attributes:
-    _cache: internal dictionary mapping searchParams key to base.types.BaseInfo objects
+    _cache: common.cache.InfoCache mapping searchParams key to base.types.BaseInfo objects. In memory until a 
+      persistent cache is set with setCache()
     _holder: base.client.InfoClientHolder object that will perform the info search 
+    _scan_index: common.scan_index.ScanIndex used to skip reading unchanged folders (None to always read them)
     
   The cache key is bound to the result of the base.types.BaseSearchParams.toKey() function.
   """
   def __init__(self, holder):
     super(BaseManager, self).__init__()
-    self._cache = {}
+    self._cache = cache.InfoCache()
     self._holder = holder
+    self._scan_index = None
 
   def getInfo(self, search_params, use_cache=True):
     """ retrieves season from cache or holder's InfoClient if not present. If the item is not retrived from cache the 
@@ -37,27 +41,67 @@ class BaseManager(object):
     """
     info = None
     cache_key = search_params.getKey()
-    if use_cache and cache_key in self._cache:
-      info = self._cache[cache_key]
-    else:
-      info = self._holder.getInfo(search_params, default=search_params.getInfo())
-      if info and info.isValid():
-        new_key = info.getSearchParams().getKey()
-        cached_item = copy.copy(info)
-        self._cache[new_key] = cached_item
-        self._cache[cache_key] = cached_item
+    if use_cache:
+      info = self._cache.get(cache_key)
+    if not info:
+      skip_names = self._getMissNames(cache_key, use_cache)
+      info, not_found = self._holder.findInfo(search_params, skip_names)
+      self._cacheResult(cache_key, info, skip_names, not_found)
+      info = info or search_params.getInfo()
     return info
 
+  def getInfos(self, search_params_list, use_cache=True):
+    """ batched version of getInfo(). items not in the cache are retrieved concurrently by the holder, with each 
+    unique key only being looked up once.
+    Args:
+      search_params_list: list of base.types.BaseSearchParams
+      use_cache: see getInfo()
+    Returns:
+      dictionary mapping the search params key to base.types.BaseInfo
+    """
+    ret = {}
+    missing = {}
+    for search_params in search_params_list:
+      cache_key = search_params.getKey()
+      info = self._cache.get(cache_key) if use_cache and not cache_key in ret else None
+      if info:
+        ret[cache_key] = info
+      elif not cache_key in ret:
+        missing[cache_key] = search_params
+    skip_names = dict((cache_key, self._getMissNames(cache_key, use_cache)) for cache_key in missing)
+    results = self._holder.findInfos(missing.values(), lambda params: skip_names[params.getKey()])
+    for cache_key, (info, not_found) in results.items():
+      self._cacheResult(cache_key, info, skip_names[cache_key], not_found)
+      ret[cache_key] = info or missing[cache_key].getInfo()
+    return ret
+
+  def _getMissNames(self, cache_key, use_cache):
+    """ names of the clients known not to have the item """
+    return (self._cache.getMissSources(cache_key) if use_cache else None) or []
+
+  def _cacheResult(self, cache_key, info, skip_names, not_found):
+    if info and info.isValid():
+      self._cache.set(info.getSearchParams().getKey(), info, aliases=[cache_key])
+    elif not_found: #only record the miss if a client was asked, otherwise the expiry would keep getting pushed back
+      self._cache.setMiss(cache_key, list(skip_names) + not_found)
+
   def setInfo(self, info):
     """ stores the base.types.BaseInfo object in cache (unfortunately the key is bound to the search params object). """
-    self._cache[info.getSearchParams().getKey()] = info
+    self._cache.set(info.getSearchParams().getKey(), info)
 
   def getHolder(self):
     return self._holder
 
-  def setCache(self, data):
-    self._cache = data
+  def setCache(self, info_cache):
+    """ replace the cache with a common.cache.InfoCache object """
+    self._cache = info_cache
 
   def cache(self):
     return self._cache
 
+  def setScanIndex(self, scan_index):
+    self._scan_index = scan_index
+
+  def scanIndex(self):
+    return self._scan_index
+
@@ -35,3 +35,43 @@ class BaseWorkBenchModel(object):
   def getRenameItem(self, index):
     raise NotImplementedError("BaseWorkBenchModel.getRenameItem not implemented")
 
+# --------------------------------------------------------------------------------------------------------------------
+class DuplicateIndex(object):
+  """ workbench items grouped by key, so the duplicates of an item are found without comparing it to every other 
+  item. Items are compared by identity. """
+  def __init__(self):
+    super(DuplicateIndex, self).__init__()
+    self._items = {} #key to the set of items with that key
+    self._keys = {} #item to the key it is stored under
+
+  def add(self, item, key):
+    """ stores item under key, removing it from any key it had. returns the set of items with key, including item """
+    self.remove(item)
+    self._keys[item] = key
+    items = self._items.setdefault(key, set())
+    items.add(item)
+    return items
+
+  def remove(self, item):
+    """ returns the set of items that had the same key as item, not including item """
+    if item not in self._keys:
+      return set()
+    key = self._keys.pop(item)
+    items = self._items[key]
+    items.discard(item)
+    if not items:
+      del self._items[key]
+    return items
+
+  def getDuplicates(self, item):
+    """ returns a list of the other items with the same key as item """
+    if item not in self._keys:
+      return []
+    return [other for other in self._items[self._keys[item]] if other is not item]
+
+  def clear(self):
+    self._items = {}
+    self._keys = {}
+
+  def __len__(self):
+    return len(self._keys)
@@ -17,9 +17,11 @@ from common import config
 from common import extension
 from common import file_helper
 from common import formatting
+from common import renamer
 from common import utils
 from common import thread
 from common import widget as common_widget
+from common import worker
 
 from media.base import client as base_client
 from media.base import types as base_types
@@ -332,6 +334,10 @@ class OutputWidget(ActionWidgetInterface):
   def __init__(self, mode, name_format_helper, parent=None):
     super(OutputWidget, self).__init__("output/{}".format(mode), parent)
     uic.loadUi("ui/ui_Output.ui", self)
+    if not file_helper.FileHelper.canDropCache():
+      self.verify_check_box.setToolTip("{}. On this system the copy may be read back from memory rather than the disk, "
+                                       "so only errors made while copying are caught".format(
+                                         self.verify_check_box.toolTip()))
 
     self._helper = name_format_helper
     self._initFormat()
@@ -392,11 +398,16 @@ class OutputWidget(ActionWidgetInterface):
     if self._helper.preview_info:
       prefix_text = "Preview"
       info = self._helper.preview_info
-    formatted_text = self._helper.formatter.getNameFromInfo(utils.toString(self.format_edit.text()), info)
+    fmt = utils.toString(self.format_edit.text())
+    error = self._helper.formatter.validate(fmt)
     color = "red"
-    if file_helper.FileHelper.isValidFilename(formatted_text):
-      color = "gray"
-    formatted_text = "{}: {}".format(prefix_text, file_helper.FileHelper.sanitizeFilename(formatted_text))
+    if error:
+      formatted_text = "Invalid format: {}".format(error)
+    else:
+      formatted_text = self._helper.formatter.getNameFromInfo(fmt, info)
+      if file_helper.FileHelper.isValidFilename(formatted_text):
+        color = "gray"
+      formatted_text = "{}: {}".format(prefix_text, file_helper.FileHelper.sanitizeFilename(formatted_text))
     self.format_example_label.setText(formatted_text)
     self.format_example_label.setStyleSheet("QLabel {{ color: {}; }}".format(color))
 
@@ -412,6 +423,8 @@ class OutputWidget(ActionWidgetInterface):
     data.use_source = self.use_source_radio.isChecked()
     data.is_move = self.is_move_radio.isChecked()
     data.dont_overwrite = self.is_no_overwrite_check_box.isChecked()
+    data.verify = self.verify_check_box.isChecked()
+    data.fsync_policy = renamer.FSYNC_POLICIES[self.fsync_combo_box.currentIndex()]
     data.show_help = self.help_group_box.isVisible()
     data.action_subtitles = self.subtitle_check_box.isChecked()
     ext = utils.toString(self.subtitle_edit.text())
@@ -432,6 +445,9 @@ class OutputWidget(ActionWidgetInterface):
     else:
       self.is_copy_radio.setChecked(True)
     self.is_no_overwrite_check_box.setChecked(data.dont_overwrite)
+    self.verify_check_box.setChecked(data.verify)
+    if data.fsync_policy in renamer.FSYNC_POLICIES:
+      self.fsync_combo_box.setCurrentIndex(renamer.FSYNC_POLICIES.index(data.fsync_policy))
     self.subtitle_edit.setText(data.subtitle_exts)
     self.subtitle_check_box.setChecked(data.action_subtitles)
 
@@ -741,7 +757,7 @@ class BaseEditInfoWidget(QtGui.QWidget):
     raise NotImplementedError("BaseEditInfoWidget.getInfo not implemented")
 
 # --------------------------------------------------------------------------------------------------------------------
-class SearchThread(thread.WorkerThread):
+class SearchWorker(worker.Worker):
   """ performs the search for media.base.types.BaseInfo objects using search params
     Attrs:
       _search_params: media.base.types.BaseSearchParams data use to perform the search
@@ -749,7 +765,7 @@ class SearchThread(thread.WorkerThread):
       _is_lucky: boolean flag defining whether to stop on first result or continue to find all
     """
   def __init__(self, search_params, holder, is_lucky):
-    super(SearchThread, self).__init__("search")
+    super(SearchWorker, self).__init__("search")
     self._search_params = search_params
     self._holder = holder
     self._is_lucky = is_lucky
@@ -869,8 +885,8 @@ class EditItemWidget(QtGui.QDialog):
     self._edit_info_widget.setEnabled(False)
     self._search_widget.setEnabled(False)
 
-    self._worker_thread = SearchThread(self._search_widget.getSearchParams(),
-        self.holder, self._is_lucky)
+    self._worker_thread = thread.WorkerThread(SearchWorker(self._search_widget.getSearchParams(),
+        self.holder, self._is_lucky))
     self._worker_thread.new_data_signal.connect(self._onDataFound)
     self._worker_thread.finished.connect(self._onThreadFinished)
     self._worker_thread.terminated.connect(self._onThreadFinished)
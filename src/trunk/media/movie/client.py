@@ -9,33 +9,11 @@ from common import utils
 from media.base import client as base_client
 from media.movie import types as movie_types
 
-_HAS_PYMDB = False
-try:
-  from pymdb import pymdb
-  _HAS_PYMDB = True
-except ImportError:
-  pass
-
-_HAS_TMDB = False
-try:
-  import tmdb
-  _HAS_TMDB = True
-except ImportError:
-  pass
-
-_HAS_IMDB_PY = False
-try:
-  from imdb import IMDb
-  _HAS_IMDB_PY = True
-except ImportError:
-  pass
-
-_HAS_ROTTEN_TOMATOES = False
-try:
-  from rottentomatoes import RT
-  _HAS_ROTTEN_TOMATOES = True
-except ImportError:
-  pass
+#the libraries are imported by the clients on first use
+_HAS_PYMDB = base_client.hasLibrary("pymdb")
+_HAS_TMDB = base_client.hasLibrary("tmdb")
+_HAS_IMDB_PY = base_client.hasLibrary("imdb")
+_HAS_ROTTEN_TOMATOES = base_client.hasLibrary("rottentomatoes")
 
 _STORE = None
 
@@ -62,6 +40,7 @@ class ImdbClient(BaseMovieInfoClient):
                                      requires_key=False)
 
   def _getAllInfo(self, search_params):
+    from pymdb import pymdb
     ret  = []
     info = None
     try:
@@ -86,6 +65,8 @@ class ImdbPyClient(BaseMovieInfoClient):
                                        requires_key=False)
 
   def _getAllInfo(self, search_params):
+    from imdb import IMDb
+    from pymdb import pymdb
     ret = []
     try:
       source = IMDb("http")
@@ -107,6 +88,7 @@ class TheMovieDbClient(BaseMovieInfoClient):
                                            requires_key=False)
 
   def _getAllInfo(self, search_params):
+    import tmdb
     ret = []
     try:
       pretty_title = str(search_params)
@@ -135,6 +117,7 @@ class RottenTomatoesClient(BaseMovieInfoClient):
                                                _HAS_ROTTEN_TOMATOES, True)
 
   def _getAllInfo(self, search_params):
+    from rottentomatoes import RT
     ret = []
     try:
       pretty_title = str(search_params)
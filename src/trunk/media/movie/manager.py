@@ -5,54 +5,104 @@
 # License:             Creative Commons GNU GPL v2 (http://creativecommons.org/licenses/GPL/2.0/)
 # Purpose of document: Module responsible for the renaming of movies
 # --------------------------------------------------------------------------------------------------------------------
+import collections
+import copy
+import functools
 import glob
 import os
 import re
 
 from media.base import manager as base_manager
 from common import file_helper
+from common import patterns
 from common import utils
 
 from media.movie import types as movie_types
 from media.movie import client as movie_client
 
-_PART_MATCH = re.compile(r".*(?:disc|cd)[\s0]*([1-9a-e]).*$", re.IGNORECASE)
-_MOVIE_YEAR_MATCH = re.compile(r"(?P<title>.+?)(?P<year>\d{4}).*$")
-_MOVIE_NO_YEAR_MATCH = re.compile(r"(?P<title>.+?)$")
+NAME_PATTERNS = patterns.PatternSet().add(
+    "title_year", r"(?P<title>.+?)(?P<year>\d{4}).*$").add(
+    "title", r"(?P<title>.+?)$")
+PART_PATTERNS = patterns.PatternSet(re.IGNORECASE).add(
+    "disc", r".*(?:disc|cd)[\s0]*(?P<part>[1-9a-e]).*$")
 
 # --------------------------------------------------------------------------------------------------------------------
 class MovieHelper:
   @staticmethod
-  def getFiles(folder, ext_filter, is_recursive, min_file_size_bytes):
-    files = []
-    for dir_name, _, filenames in os.walk(folder):
-      for basename in ext_filter.filterFiles(sorted(filenames)):
-        name = file_helper.FileHelper.joinPath(dir_name, basename)
-        if file_helper.FileHelper.getFileSize(name) > min_file_size_bytes:
-          files.append(name)
-      if not is_recursive:
-        break
-    return files
+  def iterFiles(folder, ext_filter, is_recursive, min_file_size_bytes, scan_index=None, num_threads=1,
+                ext_counts=None):
+    """ generator version of getFiles(). If ext_counts (a dictionary) is given it is filled with the 
+    countExtensions() of each folder before that folder's files are yielded, for use by extractMovieFromFile() """
+    for _, _, records in file_helper.FileHelper.parallelWalk(folder, is_recursive, num_threads, scan_index):
+      if ext_counts is not None and records:
+        ext_counts[file_helper.FileHelper.dirname(records[0].path)] = MovieHelper.countExtensions(records)
+      for filename in ext_filter.filterFiles(sorted(record.path for record in records
+                                                    if record.size > min_file_size_bytes)):
+        yield filename
 
   @staticmethod
-  def extractMovieFromFile(filename):
+  def iterMovies(folder, ext_filter, is_recursive, min_file_size_bytes, scan_index=None, num_threads=1):
+    """ generator of the MovieRenameItem extracted from each file iterFiles() finds. With a scan index the files of 
+    a folder are only parsed again if the folder has changed (see common.scan_index.ScanIndex.getParsed()) """
+    name = "movie:{}:{}".format(ext_filter.extensionString(), min_file_size_bytes)
+    parse = functools.partial(MovieHelper._parseRecords, ext_filter, min_file_size_bytes)
+    for sub_folder, _, records in file_helper.FileHelper.parallelWalk(folder, is_recursive, num_threads, scan_index):
+      for filename, title, year, part in (scan_index.getParsed(sub_folder, name, parse) if scan_index is not None 
+                                          else parse(records)):
+        yield movie_types.MovieRenameItem(filename, movie_types.MovieInfo(title, year, genres=[], series="", 
+                                                                          part=part))
+
+  @staticmethod
+  def _parseRecords(ext_filter, min_file_size_bytes, records):
+    """ returns a (filename, title, year, part) tuple for each movie in records, the files of a single folder """
+    if not records:
+      return []
+    ext_counts = {file_helper.FileHelper.dirname(records[0].path): MovieHelper.countExtensions(records)}
+    ret = []
+    for filename in ext_filter.filterFiles(sorted(record.path for record in records
+                                                  if record.size > min_file_size_bytes)):
+      info = MovieHelper.extractMovieFromFile(filename, ext_counts).getInfo()
+      ret.append((filename, info.title, info.year, info.part))
+    return ret
+
+  @staticmethod
+  def countExtensions(records):
+    """ returns a Counter of the lower case extension of each of the FileRecord objects. Hidden files are skipped, 
+    the same as glob """
+    return collections.Counter(os.path.splitext(record.path)[1].lower() for record in records
+                               if not file_helper.FileHelper.basename(record.path).startswith("."))
+
+  @staticmethod
+  def getFiles(folder, ext_filter, is_recursive, min_file_size_bytes, scan_index=None, num_threads=1, ext_counts=None):
+    return list(MovieHelper.iterFiles(folder, ext_filter, is_recursive, min_file_size_bytes, scan_index, num_threads,
+                                      ext_counts))
+
+  @staticmethod
+  def extractMovieFromFile(filename, ext_counts=None):
+    """ ext_counts is a dictionary of folder to countExtensions() for the files in the folder (see iterFiles()). 
+    If filename's folder is in ext_counts the file is assumed to exist and no file system calls are made """
     basename = file_helper.FileHelper.basename(filename)
     name, ext = os.path.splitext(basename)
     ext = ext.lower()
     title, part, year = "", "", ""
-    if os.path.exists(filename):
-      match = _MOVIE_YEAR_MATCH.match(name) or _MOVIE_NO_YEAR_MATCH.match(name)
+    dirname = file_helper.FileHelper.dirname(filename)
+    folder_ext_counts = ext_counts.get(dirname) if ext_counts else None
+    if folder_ext_counts is not None or os.path.exists(filename):
+      match = NAME_PATTERNS.match(name)
       assert(match)
-      title = match.groupdict().get("title")
-      year = match.groupdict().get("year", "")
+      title = match.groups["title"]
+      year = match.groups.get("year", "")
       part = ""
       part_str = basename
-      num_movies_in_folder = len(glob.glob("{}/*{}".format(file_helper.FileHelper.dirname(filename), ext)))
+      if folder_ext_counts is not None:
+        num_movies_in_folder = folder_ext_counts[ext]
+      else:
+        num_movies_in_folder = len(glob.glob("{}/*{}".format(dirname, ext)))
       if num_movies_in_folder < 3: #use the folder name if there aren't many files in the folder
         part_str = filename
-      part_match = _PART_MATCH.match(part_str)
+      part_match = PART_PATTERNS.match(part_str)
       if part_match:
-        part = part_match.group(1)
+        part = part_match.groups["part"]
         if part.isalpha():
           part = utils.toString(" abcdef".index(part))
         else:
@@ -68,16 +118,29 @@ class MovieHelper:
 class MovieManager(base_manager.BaseManager):
   helper = MovieHelper
 
-  def __init__(self):
-    super(MovieManager, self).__init__(movie_client.getInfoClientHolder())
+  def __init__(self, holder=None):
+    super(MovieManager, self).__init__(holder or movie_client.getInfoClientHolder())
 
-  def processFile(self, filename):
-    movie = MovieHelper.extractMovieFromFile(filename)
+  def processFile(self, filename, ext_counts=None):
+    movie = MovieHelper.extractMovieFromFile(filename, ext_counts)
     if movie.isValid():
       info = self.getInfo(movie.getInfo().getSearchParams())
       movie.setInfo(info)
     return movie
 
+  def processFiles(self, filenames, ext_counts=None):
+    """ batched version of processFile(). all the files are parsed up front so that the unique set of titles can be 
+    looked up together. """
+    return self.lookupMovies([MovieHelper.extractMovieFromFile(filename, ext_counts) for filename in filenames])
+
+  def lookupMovies(self, movies):
+    """ sets the info of the valid movies from a single batched lookup. returns movies """
+    valid_movies = [movie for movie in movies if movie.isValid()]
+    infos = self.getInfos([movie.getInfo().getSearchParams() for movie in valid_movies])
+    for movie in valid_movies:
+      movie.setInfo(copy.copy(infos[movie.getInfo().getSearchParams().getKey()]))
+    return movies
+
 _MANAGER = None
 
 def getManager():
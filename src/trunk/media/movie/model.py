@@ -55,11 +55,7 @@ class MovieItem(object):
     self.movie = movie
     self.index = index
     self.cached_status_text = movie.getStatus()
-    self.duplicates = []
-
-  def isMatch(self, other):
-    #utils.verifyType(other, MovieItem)
-    return self.movie.getStatus() == self.movie.READY and self.movie.getInfo() == other.movie.getInfo()
+    self.duplicates = [] #MovieItem objects
 
 # --------------------------------------------------------------------------------------------------------------------
 class MovieModel(QtCore.QAbstractTableModel, base_model.BaseWorkBenchModel):
@@ -79,6 +75,7 @@ class MovieModel(QtCore.QAbstractTableModel, base_model.BaseWorkBenchModel):
     super(QtCore.QAbstractTableModel, self).__init__(parent)
     super(base_model.BaseWorkBenchModel, self).__init__()
     self._movies = []
+    self._duplicate_index = base_model.DuplicateIndex()
     self._bulk_updating = False
     self._require_year = True
     self._require_genre = True
@@ -170,14 +167,13 @@ class MovieModel(QtCore.QAbstractTableModel, base_model.BaseWorkBenchModel):
       item = self._movies[index.row()]
       new_movie = copy.copy(value)
       if item.movie != new_movie:
-        old_dups = item.duplicates
+        old_matches = self._duplicate_index.remove(item)
         item.movie = new_movie
+        new_matches = self._indexItem(item)
         self._updateItemStatus(item)
-        new_dups = item.duplicates
-        for now_dup_index in (i for i in new_dups if not i in old_dups):
-          self._updateItemStatus(self._movies[now_dup_index])
-        for now_not_dup_index in (i for i in old_dups if not i in new_dups):
-          self._updateItemStatus(self._movies[now_not_dup_index])
+        for other in old_matches | new_matches:
+          if other is not item:
+            self._updateItemStatus(other)
     elif role == QtCore.Qt.CheckStateRole and index.column() == Columns.COL_CHECK:
       item = self._movies[index.row()]
       item.is_enabled = value == QtCore.Qt.Checked
@@ -225,6 +221,7 @@ class MovieModel(QtCore.QAbstractTableModel, base_model.BaseWorkBenchModel):
   def clear(self):
     self.beginResetModel()
     self._movies = []
+    self._duplicate_index.clear()
     self.endResetModel()
     if not self._bulk_updating:
       self._emitWorkbenchChanged()
@@ -236,6 +233,7 @@ class MovieModel(QtCore.QAbstractTableModel, base_model.BaseWorkBenchModel):
     self.beginInsertRows(QtCore.QModelIndex(), count, count)
     item = MovieItem(movie, count)
     self._movies.append(item)
+    self._indexItem(item)
     self.endInsertRows()
     if not self._bulk_updating:
       self._emitWorkbenchChanged()
@@ -273,7 +271,11 @@ class MovieModel(QtCore.QAbstractTableModel, base_model.BaseWorkBenchModel):
   def _updateDuplicatesForItem(self, item):
     item.duplicates = []
     if item.movie.canEditInfo():
-      item.duplicates = [m.index for m in self._movies if m.index != item.index and m.isMatch(item)]
+      item.duplicates = [m for m in self._duplicate_index.getDuplicates(item) if m.movie.getStatus() == m.movie.READY]
+
+  def _indexItem(self, item):
+    """ adds item to the duplicate index. returns the set of items with the same key """
+    return self._duplicate_index.add(item, item.movie.getInfo().getDuplicateKey())
 
   def overallCheckedState(self):
     filtered = [m for m in self._movies if self._isItemValid(m)]
@@ -341,13 +343,11 @@ class MovieModel(QtCore.QAbstractTableModel, base_model.BaseWorkBenchModel):
 
     row = index.row()
     self.beginRemoveRows(QtCore.QModelIndex(), row, row)
-    item = self._movies[row]
-    self._movies.pop(row)
-    for item in self._movies[row:]:
-      item.index -= 1
+    item = self._movies.pop(row)
+    for other in self._movies[row:]:
+      other.index -= 1
 
-    #update all duplicates as they may be pointing at the wrong rows
-    for item in self._movies:
-      if item.duplicates:
-        self._updateItemStatus(item)
+    #only items with the same key can have had the deleted item as a duplicate
+    for other in self._duplicate_index.remove(item):
+      self._updateItemStatus(other)
     self.endRemoveRows()
@@ -52,6 +52,10 @@ class MovieInfo(base_types.BaseInfo):
   def getGenre(self, default=""):
     return self.genres[0] if self.genres else default
 
+  def getDuplicateKey(self):
+    """ returns a key that is the same for infos that are equal """
+    return (self.title, self.year, self.part, self.getGenre())
+
   def getSearchParams(self):
     return MovieSearchParams(self.title, self.year)
 
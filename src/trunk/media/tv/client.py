@@ -9,21 +9,9 @@ from media.base import client as base_client
 from common import utils
 from media.tv import types as tv_types
 
-_HAS_TVDB = False
-try:
-  import tvdb_api
-  import tvdb_exceptions
-  _HAS_TVDB = True
-except ImportError:
-  pass
-
-_HAS_TVRAGE = False
-try:
-  import tvrage.api
-  import tvrage.exceptions
-  _HAS_TVRAGE = True
-except ImportError:
-  pass
+#the libraries are imported by the clients on first use
+_HAS_TVDB = base_client.hasLibrary("tvdb_api")
+_HAS_TVRAGE = base_client.hasLibrary("tvrage")
 
 # --------------------------------------------------------------------------------------------------------------------
 class TvInfoStoreHolder(base_client.InfoClientHolder):
@@ -52,6 +40,8 @@ class TvdbClient(BaseTvInfoClient):
                                      requires_key=False)
 
   def _getAllInfo(self, search_params):
+    import tvdb_api
+    import tvdb_exceptions
     ret = []
     try:
       source = tvdb_api.Tvdb()
@@ -79,6 +69,8 @@ class TvRageClient(BaseTvInfoClient):
                                        requires_key=False)
 
   def _getAllInfo(self, search_params):
+    import tvrage.api
+    import tvrage.exceptions
     ret = []
     try:
       source = tvrage.api.Show(search_params.show_name)
@@ -5,87 +5,147 @@
 # License:             Creative Commons GNU GPL v2 (http://creativecommons.org/licenses/GPL/2.0/)
 # Purpose of document: Helper functions associated with tv series
 # --------------------------------------------------------------------------------------------------------------------
+import copy
 import os
 import re
 
 from media.base import manager as base_manager
 from common import file_helper
+from common import patterns
 from media.tv import types as tv_types
 from media.tv import client as tv_client
 
-_RE_FOLDER_MATCH_1 = re.compile(r"^.*{0}(?P<name>.*){0}"
-                                r"(?:season|series)\s+(?P<num>\d+)[^{0}]*$".format(re.escape(os.sep)),
-                                flags=re.IGNORECASE) #/show/season
-_RE_FOLDER_MATCH_2 = re.compile(r"^.*{0}(?P<name>.*)\s+\-\s+(?:season|series)"
-                                r"\s+(?P<num>\d+)[^{0}]*$".format(re.escape(os.sep)),
-                                flags=re.IGNORECASE) #/show - season
-_RE_EPISODE_MATCH = re.compile(r"^.*?(?P<ep_num>\d\d?)\D*\.[^\.]*$")
+FOLDER_PATTERNS = patterns.PatternSet(re.IGNORECASE).add(
+    "show_folder_season", r"^.*{0}(?P<name>.*){0}(?:season|series)"
+                          r"\s+(?P<num>\d+)[^{0}]*$".format(re.escape(os.sep))).add(
+    "show_season", r"^.*{0}(?P<name>.*)\s+\-\s+(?:season|series)\s+(?P<num>\d+)[^{0}]*$".format(re.escape(os.sep)))
+# every number in a filename. numbers are grouped into tokens so the rule says what they are, but the numbers of
+# all the tokens are the same as re.findall(r"\d+")
+EPISODE_PATTERNS = patterns.PatternSet(re.IGNORECASE).add(
+    "season_episode", r"s(?P<season>\d+)\s*e(?P<episode>\d+)").add( #S01E02
+    "cross", r"(?<!\d)(?P<season>\d{1,2})x(?P<episode>\d{2,3})(?!\d)").add( #1x02
+    "date", r"(?<!\d)(?P<year>(?:19|20)\d\d)[\.\-_ ](?P<month>[01]\d)[\.\-_ ](?P<day>[0-3]\d)(?!\d)").add( #2012.05.31
+    "number", r"(?P<number>\d+)")
+_EXPLICIT_EPISODE_RULES = ("season_episode", "cross")
 
 # --------------------------------------------------------------------------------------------------------------------
 class TvHelper:
   @staticmethod
   def seasonFromFolderName(folder):
     #utils.verifyType(folder, str)
-    folder = file_helper.FileHelper.replaceSeparators(folder, os.sep)
-    show = tv_types.UNRESOLVED_NAME
-    series_num = tv_types.UNRESOLVED_KEY
-    for regex in (_RE_FOLDER_MATCH_1, _RE_FOLDER_MATCH_2):
-      match = regex.match(folder)
+    return TvHelper.seasonsFromFolderNames([folder])[0]
+
+  @staticmethod
+  def seasonsFromFolderNames(folders):
+    """ batched version of seasonFromFolderName() """
+    ret = []
+    for match in FOLDER_PATTERNS.matchAll([file_helper.FileHelper.replaceSeparators(folder, os.sep)
+                                           for folder in folders]):
       if match:
-        show = match.group("name")
-        series_num = int(match.group("num"))
-        break
-    return tv_types.TvSearchParams(show, series_num)
+        ret.append(tv_types.TvSearchParams(match.groups["name"], int(match.groups["num"])))
+      else:
+        ret.append(tv_types.TvSearchParams(tv_types.UNRESOLVED_NAME, tv_types.UNRESOLVED_KEY))
+    return ret
 
   @staticmethod
   def getSourcesFromFilenames(filenames):
-    def getEpisodeNumsFromFilename(filename):
-      """ returns a list of numbers for the filename """
-      return [int(match[-2:]) for match in re.findall(r"\d+", file_helper.FileHelper.basename(filename))] or \
-             [tv_types.UNRESOLVED_KEY]
-
+    """ each number in the filename is a candidate episode number. The position (counting numbers from the front and
+    then from the back) that gives the most unique episode numbers across all the files is used, unless every file
+    names its episode explicitly (eg. S01E02 or 1x02). Where files share an episode number only the first file gets 
+    it. """
     if not filenames:
       return tv_types.SourceFiles()
 
-    eps = [(filename, getEpisodeNumsFromFilename(filename)) for filename in filenames]
-    max_indexes = max(len(episode[1]) for episode in eps)
-    ret = []
-    for i in range(max_indexes):
-      sources = tv_types.SourceFiles()
-      for filename, indexes in eps:
-        sources.append(tv_types.SourceFile(indexes[i] if i < len(indexes) else tv_types.UNRESOLVED_KEY, filename))
-      ret.append(sources)
-    for i in range(max_indexes):
-      sources = tv_types.SourceFiles()
-      for filename, indexes in eps:
-        sources.append(tv_types.SourceFile(indexes[- i - 1] if i < len(indexes) else tv_types.UNRESOLVED_KEY, filename))
-      ret.append(sources)
-    return max(ret, key=lambda sources: len([source for source in sources if source.ep_num != tv_types.UNRESOLVED_KEY]))
+    tokens = [EPISODE_PATTERNS.findAll(file_helper.FileHelper.basename(filename)) for filename in filenames]
+    explicit_eps = [next((int(token.groups["episode"]) for token in file_tokens
+                          if token.rule in _EXPLICIT_EPISODE_RULES), None) for file_tokens in tokens]
+    if None not in explicit_eps:
+      return TvHelper._getSources(zip(filenames, explicit_eps))
+
+    eps = [(filename, [int(num[-2:]) for token in file_tokens for num in token.values()] or
+                      [tv_types.UNRESOLVED_KEY]) for filename, file_tokens in zip(filenames, tokens)]
+    max_indexes = max(len(nums) for _, nums in eps)
+    #first max_indexes are counted from the front, the rest from the back. ties go to the first, so the order matters
+    ep_nums_by_position = [set() for _ in range(2 * max_indexes)]
+    for _, nums in eps:
+      back_offset = max_indexes + len(nums) - 1
+      for i, num in enumerate(nums):
+        if num != tv_types.UNRESOLVED_KEY:
+          ep_nums_by_position[i].add(num)
+          ep_nums_by_position[back_offset - i].add(num)
+    best = max(range(len(ep_nums_by_position)), key=lambda i: len(ep_nums_by_position[i]))
+    from_back, index = divmod(best, max_indexes)
+    return TvHelper._getSources((filename, (nums[-index - 1] if from_back else nums[index])
+                                           if index < len(nums) else tv_types.UNRESOLVED_KEY)
+                                for filename, nums in eps)
+
+  @staticmethod
+  def _getSources(filename_eps):
+    """ returns SourceFiles for the (filename, ep_num) pairs, where only the first file gets a repeated ep_num """
+    sources = []
+    used = set()
+    for filename, ep_num in filename_eps:
+      if ep_num in used:
+        ep_num = tv_types.UNRESOLVED_KEY
+      used.add(ep_num)
+      sources.append(tv_types.SourceFile(ep_num, filename))
+    return tv_types.SourceFiles(sources)
 
 # --------------------------------------------------------------------------------------------------------------------
 class TvManager(base_manager.BaseManager):
   """ Collection of tv series functions. """
   helper = TvHelper
 
-  def __init__(self):
-    super(TvManager, self).__init__(tv_client.getInfoClientHolder())
+  def __init__(self, holder=None):
+    super(TvManager, self).__init__(holder or tv_client.getInfoClientHolder())
 
   def getSeasonForFolder(self, folder, extension_filter, min_file_size_bytes):
     #utils.verifyType(min_file_size_bytes, int)
     search_params = TvHelper.seasonFromFolderName(folder)
-    temp_files = [file_helper.FileHelper.joinPath(folder, i)
-                  for i in extension_filter.filterFiles(os.listdir(folder))]
-    files = [i for i in temp_files
-             if file_helper.FileHelper.isFile(i) and file_helper.FileHelper.getFileSize(i) > min_file_size_bytes]
+    info = None
+    if search_params.show_name != tv_types.UNRESOLVED_NAME:
+      info = self.getInfo(search_params)
+    return self._getSeason(folder, search_params, info, extension_filter, min_file_size_bytes)
+
+  def getSeasonsForFolders(self, folders, extension_filter, min_file_size_bytes):
+    """ batched version of getSeasonForFolder(). the season is parsed from all the folder names first so that each
+    unique show and season is only looked up once. Returns a list of Season objects (None if no season was found for
+    the folder). """
+    return self.lookupSeasons(zip(folders, TvHelper.seasonsFromFolderNames(folders)),
+                              extension_filter, min_file_size_bytes)
+
+  def lookupSeasons(self, folder_params, extension_filter, min_file_size_bytes):
+    """ same as getSeasonsForFolders() for a list of (folder, search params) tuples that have already been parsed """
+    infos = self.getInfos([search_params for _, search_params in folder_params
+                           if search_params.show_name != tv_types.UNRESOLVED_NAME])
+    ret = []
+    for folder, search_params in folder_params:
+      info = copy.copy(infos[search_params.getKey()]) if search_params.getKey() in infos else None
+      ret.append(self._getSeason(folder, search_params, info, extension_filter, min_file_size_bytes))
+    return ret
+
+  def _getSeason(self, folder, search_params, info, extension_filter, min_file_size_bytes):
+    sources = self._getSources(folder, extension_filter, min_file_size_bytes)
     season = None
-    if not search_params.show_name == tv_types.UNRESOLVED_NAME or len(files):
-      sources = TvHelper.getSourcesFromFilenames(files)
-      info = tv_types.SeasonInfo(search_params.show_name, search_params.season_num)
-      if search_params.show_name != tv_types.UNRESOLVED_NAME:
-        info = self.getInfo(search_params)
-      season = tv_types.Season(folder, info, sources)
+    if not search_params.show_name == tv_types.UNRESOLVED_NAME or len(sources):
+      season = tv_types.Season(folder, info or tv_types.SeasonInfo(search_params.show_name, search_params.season_num),
+                               sources)
     return season
 
+  def _getSources(self, folder, extension_filter, min_file_size_bytes):
+    """ returns the SourceFiles of the episode files in folder. With a scan index they are only worked out again if 
+    the folder has changed """
+    def parse(records):
+      files = extension_filter.filterFiles([record.path for record in records if record.size > min_file_size_bytes])
+      return [(source.ep_num, source.filename) for source in TvHelper.getSourcesFromFilenames(files)]
+
+    if self._scan_index is not None:
+      name = "tv:{}:{}".format(extension_filter.extensionString(), min_file_size_bytes)
+      ep_files = self._scan_index.getParsed(folder, name, parse)
+    else:
+      ep_files = parse(file_helper.FileHelper.getFileRecords(folder))
+    return tv_types.SourceFiles(tv_types.SourceFile(ep_num, filename) for ep_num, filename in ep_files)
+
 _MANAGER = None
 
 def getManager():
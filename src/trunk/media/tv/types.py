@@ -105,21 +105,48 @@ class SourceFile(object):
 
 # -----------------------------------------------------------------------------------
 class SourceFiles(list):
-  """ episode to filename map """
+  """ episode to filename map. The sources are indexed by episode number and filename, so they can only be added
+  with append() or extend(), removed with removeFile() and have their episode number changed with 
+  setEpisodeForFilename(). The other list methods that change the list raise TypeError. """
+  def __init__(self, sources=()):
+    super(SourceFiles, self).__init__()
+    self._by_ep_num = {} #ep_num to list of sources, in the order they were indexed
+    self._by_filename = {}
+    self.extend(sources)
+
+  def __copy__(self):
+    return SourceFiles(SourceFile(source.ep_num, source.filename) for source in self) #the sources are changed in place
+
+  def _unindexedChange(self, *_args):
+    raise TypeError("SourceFiles can only be changed with append(), extend(), removeFile() and setEpisodeForFilename()")
+
+  insert = remove = pop = _unindexedChange
+  __setitem__ = __delitem__ = __setslice__ = __delslice__ = __iadd__ = __imul__ = _unindexedChange
+
+  def _index(self, source):
+    self._by_ep_num.setdefault(source.ep_num, []).append(source)
+    self._by_filename.setdefault(source.filename, source)
+
+  def _unindex(self, source):
+    sources = self._by_ep_num[source.ep_num]
+    sources[:] = [s for s in sources if s is not source]
+    if not sources:
+      del self._by_ep_num[source.ep_num]
+    if self._by_filename.get(source.filename) is source:
+      del self._by_filename[source.filename]
+
   def removeFile(self, filename):
     source = self.getItemByFilename(filename)
     assert(source)
-    self.remove(source)
+    super(SourceFiles, self).__delitem__(next(i for i, s in enumerate(self) if s is source))
+    self._unindex(source)
 
   def getItemByEpisodeNum(self, ep_num):
-    for source in self:
-      if source.ep_num == ep_num:
-        return source
+    sources = self._by_ep_num.get(ep_num)
+    return sources[0] if sources else None
 
   def getItemByFilename(self, filename):
-    for source in self:
-      if source.filename == filename:
-        return source
+    return self._by_filename.get(filename)
 
   def setEpisodeForFilename(self, key, filename):
     new_ep = self.getItemByFilename(filename)
@@ -127,8 +154,13 @@ class SourceFiles(list):
     if not new_ep or old_ep == new_ep:
       return
     if old_ep:
-      old_ep.ep_num = UNRESOLVED_KEY
-    new_ep.ep_num = key
+      self._setEpisodeNum(old_ep, UNRESOLVED_KEY)
+    self._setEpisodeNum(new_ep, key)
+
+  def _setEpisodeNum(self, source, ep_num):
+    self._unindex(source)
+    source.ep_num = ep_num
+    self._index(source)
 
   def append(self, item):
     if not isinstance(item, SourceFile):
@@ -136,6 +168,14 @@ class SourceFiles(list):
     if self.getItemByEpisodeNum(item.ep_num):
       item.ep_num = UNRESOLVED_KEY
     super(SourceFiles, self).append(item)
+    self._index(item)
+
+  def extend(self, items):
+    """ unlike append(), episode numbers are not checked for duplicates """
+    items = list(items)
+    super(SourceFiles, self).extend(items)
+    for item in items:
+      self._index(item)
 
 # -----------------------------------------------------------------------------------
 class SeasonInfo(base_types.BaseInfo):
@@ -152,6 +192,14 @@ class SeasonInfo(base_types.BaseInfo):
         return episode
     return EpisodeInfo.createUnresolvedEpisode()
 
+  def getEpisodesByNum(self):
+    """ returns a dictionary of ep_num to episode. Use instead of getEpisodeByEpisodeNum() when looking up many 
+    episodes. Where episode numbers are repeated the first episode is used, same as getEpisodeByEpisodeNum(). """
+    ret = {}
+    for episode in self.episodes:
+      ret.setdefault(episode.ep_num, episode)
+    return ret
+
   def __copy__(self):
     ret = SeasonInfo(self.show_name, self.season_num)
     ret.episodes = list(self.episodes)
@@ -200,22 +248,24 @@ class Season(object):
 
   def _resolveEpisodeMoveItems(self):
     self.episode_move_items = []
-    temp_season_info = copy.copy(self.getInfo())
-    taken_keys = [] #dodgy...
     info = self.getInfo()
+    episodes = info.getEpisodesByNum()
+    taken_keys = set() #dodgy...
+    taken_episodes = set() #ids of the episodes matched to a source
     for source in self.sources:
       dest_ep = EpisodeInfo.createUnresolvedEpisode()
       if source.ep_num != UNRESOLVED_KEY and not source.ep_num in taken_keys:
-        dest_ep = temp_season_info.getEpisodeByEpisodeNum(source.ep_num)
+        dest_ep = episodes.get(source.ep_num, dest_ep)
         if dest_ep.ep_num != UNRESOLVED_KEY:
-          temp_season_info.episodes.remove(dest_ep)
-        taken_keys.append(source.ep_num)
+          taken_episodes.add(id(dest_ep))
+        taken_keys.add(source.ep_num)
       dest_ep = AdvancedEpisodeInfo(info.show_name, info.season_num, dest_ep.ep_num, dest_ep.ep_name)
       self.episode_move_items.append(EpisodeRenameItem(source.filename, dest_ep))
 
-    for episode in temp_season_info.episodes:
-      self.episode_move_items.append(EpisodeRenameItem("", 
-          AdvancedEpisodeInfo(info.show_name, info.season_num, episode.ep_num, episode.ep_name)))
+    for episode in info.episodes:
+      if not id(episode) in taken_episodes:
+        self.episode_move_items.append(EpisodeRenameItem("", 
+            AdvancedEpisodeInfo(info.show_name, info.season_num, episode.ep_num, episode.ep_name)))
 
     self.episode_move_items = sorted(self.episode_move_items, key=lambda item: item.getInfo().ep_num)
 
@@ -202,8 +202,9 @@ class EditSeasonInfoWidget(base_widget.BaseEditInfoWidget):
 
     ep_nums = [i for i in range(minValue, maxValue + 1)]
     self.episode_table.setRowCount(len(ep_nums))
+    episodes = info.getEpisodesByNum()
     for i, ep_num in enumerate(ep_nums):
-      ep = info.getEpisodeByEpisodeNum(ep_num)
+      ep = episodes.get(ep_num) or tv_types.EpisodeInfo.createUnresolvedEpisode()
       item = QtGui.QTableWidgetItem(ep.ep_name)
       item.setFlags(QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsEditable | QtCore.Qt.ItemIsEnabled)
       self.episode_table.setItem(i, _TITLE_COLUMN, item)
@@ -9,9 +9,6 @@ import argparse
 import os
 import sys
 
-from PyQt4 import QtGui
-
-from app import widget
 from common import utils
 
 # --------------------------------------------------------------------------------------------------------------------
@@ -28,6 +25,9 @@ def _runGUI():
   except NameError:
     pass
 
+  from PyQt4 import QtGui #imported here so the batch command can run without Qt
+  from app import widget
+
   app = QtGui.QApplication(sys.argv)
 
   mw = widget.MainWindow()
@@ -40,15 +40,26 @@ def _runTests():
 
   from test import test_renamer
   from test import test_move
+  from test import test_cache
+  from test import test_pipeline
+  from test import test_batch
 
   suite = unittest.TestSuite([
     unittest.TestLoader().loadTestsFromModule(test_renamer),
-    unittest.TestLoader().loadTestsFromModule(test_move)
+    unittest.TestLoader().loadTestsFromModule(test_move),
+    unittest.TestLoader().loadTestsFromModule(test_cache),
+    unittest.TestLoader().loadTestsFromModule(test_pipeline),
+    unittest.TestLoader().loadTestsFromModule(test_batch)
   ])
 
   runner = unittest.TextTestRunner(verbosity=2)
   return runner.run(suite)
 
+# --------------------------------------------------------------------------------------------------------------------
+def _runBatch(config_file):
+  from app import batch
+  return batch.run(config_file)
+
 # --------------------------------------------------------------------------------------------------------------------
 def main():
   utils.initLogging("log.txt") # TODO: make this configurable
@@ -57,10 +68,17 @@ def main():
   parser = argparse.ArgumentParser(description="run renamer app or unit tests")
   parser.add_argument("-u", "--unit-test", help="run unit tests", dest="is_test_only",
                       action="store_true", default=False)
+  parser.add_argument("command", nargs="?", choices=["gui", "batch"], default="gui",
+                      help="gui (default) or batch to rename without the gui, as described by config")
+  parser.add_argument("config", nargs="?", help="json config file used by the batch command. see app.batch")
   args = parser.parse_args()
 
   if args.is_test_only:
     _runTests()
+  elif args.command == "batch":
+    if not args.config:
+      parser.error("batch requires a config file")
+    sys.exit(_runBatch(args.config))
   else:
     _runGUI()
 
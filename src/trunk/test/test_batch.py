@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------------------------------------------------
+# Project:             my-renamer
+# Repository:          http://code.google.com/p/my-renamer/
+# License:             Creative Commons GNU GPL v2 (http://creativecommons.org/licenses/GPL/2.0/)
+# Purpose of document: Tests for the headless batch renamer
+# --------------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+  import sys
+  import os
+  sys.path.insert(0, os.path.abspath(__file__+"/../../"))
+
+import json
+import os
+import StringIO
+import unittest
+
+from app import batch
+from common import file_helper
+from common import renamer
+from media.base import types as base_types
+from media.movie import types as movie_types
+
+# --------------------------------------------------------------------------------------------------------------------
+class BatchConfigTest(unittest.TestCase):
+  def test_fromDict(self):
+    c = batch.BatchConfig.fromDict({"mode": "movie", "input": {"folder": "in", "recursive": False},
+                                    "output": {"folder": "out", "is_move": False}, "dry_run": True})
+    self.assertEqual(c.mode, base_types.MOVIE_MODE)
+    self.assertEqual(c.input.folder, "in")
+    self.assertFalse(c.input.recursive)
+    self.assertTrue(c.input.all_extensions is False) #default kept
+    self.assertEqual(c.output.folder, "out")
+    self.assertFalse(c.output.is_move)
+    self.assertTrue(c.dry_run)
+    c = batch.BatchConfig.fromDict({"input": {"folder": u"in", "recursive": 0, "min_file_size_bytes": 10}})
+    self.assertEqual((c.input.folder, c.input.recursive, c.input.min_file_size_bytes), (u"in", 0, 10))
+
+  def test_invalid(self):
+    self.assertRaises(ValueError, batch.BatchConfig.fromDict, {"input": {}})
+    self.assertRaises(ValueError, batch.BatchConfig.fromDict, {"mode": "music", "input": {"folder": "in"}})
+    self.assertRaises(ValueError, batch.BatchConfig.fromDict, {"input": {"folder": "in", "bogus": 1}})
+    self.assertRaises(ValueError, batch.BatchConfig.fromDict, {"input": {"folder": "in"}, "bogus": 1})
+    self.assertRaises(ValueError, batch.BatchConfig.fromDict, {"input": {"folder": "in", "recursive": "false"}})
+    self.assertRaises(ValueError, batch.BatchConfig.fromDict, {"input": {"folder": "in", "min_file_size_bytes": "1"}})
+    self.assertRaises(ValueError, batch.BatchConfig.fromDict, {"input": {"folder": "in", "sources": "tvdb"}})
+    self.assertRaises(ValueError, batch.BatchConfig.fromDict, {"input": {"folder": 1}})
+    self.assertRaises(ValueError, batch.BatchConfig.fromDict, {"input": {"folder": "in"}, "output": {"format": 1}})
+    self.assertRaises(ValueError, batch.BatchConfig.fromDict, {"input": {"folder": "in"}, "dry_run": "false"})
+    self.assertRaises(ValueError, batch.BatchConfig.fromDict, {"input": {"folder": "in"},
+                                                               "output": {"format": "%(<t>"}})
+
+# --------------------------------------------------------------------------------------------------------------------
+class BatchRenamerTest(unittest.TestCase):
+  def setUp(self):
+    self.src = os.path.abspath("batchSrc.avi")
+    self.dest_dir = os.path.abspath("batchDest")
+    with open(self.src, "w") as f:
+      f.write("data")
+
+  def tearDown(self):
+    file_helper.FileHelper.removeFile(self.src)
+    file_helper.FileHelper.removeDir(self.dest_dir)
+
+  def _renamer(self, **kwargs):
+    data = {"mode": "movie", "input": {"folder": "."},
+            "output": {"folder": self.dest_dir, "format": "<t> (<y>)", "is_move": False}}
+    data.update(kwargs)
+    out = StringIO.StringIO()
+    return batch.BatchRenamer(batch.BatchConfig.fromDict(data), out), out
+
+  def test_processItem(self):
+    r, out = self._renamer()
+    r._processItem(movie_types.MovieRenameItem(self.src, movie_types.MovieInfo("Alien", "1979")))
+    result = json.loads(out.getvalue())
+    self.assertEqual(result["status"], renamer.BaseRenamer.SUCCESS)
+    self.assertEqual(result["dest"], os.path.join(self.dest_dir, "Alien (1979).avi"))
+    self.assertTrue(file_helper.FileHelper.fileExists(result["dest"]))
+    self.assertTrue(file_helper.FileHelper.fileExists(self.src))
+
+  def test_dryRun(self):
+    r, out = self._renamer(dry_run=True)
+    r._processItem(movie_types.MovieRenameItem(self.src, movie_types.MovieInfo("Alien", "1979")))
+    r._processItem(movie_types.MovieRenameItem("missing.avi", movie_types.MovieInfo("Alien", "1979")))
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+    self.assertEqual([result["status"] for result in results], [batch.DRY_RUN, batch.SKIPPED])
+    self.assertFalse(file_helper.FileHelper.dirExists(self.dest_dir))
+
+# --------------------------------------------------------------------------------------------------------------------
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------------------------------------------------
+# Project:             my-renamer
+# Repository:          http://code.google.com/p/my-renamer/
+# License:             Creative Commons GNU GPL v2 (http://creativecommons.org/licenses/GPL/2.0/)
+# Purpose of document: tests for common.cache
+# --------------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+  import sys
+  import os
+  sys.path.insert(0, os.path.abspath(__file__+"/../../"))
+
+import os
+import sqlite3
+import StringIO
+import time
+import unittest
+
+from common import cache
+from common import file_helper
+from common import scan_index
+from common import serializer
+
+from media.movie import types as movie_types
+from media.tv import types as tv_types
+
+def _removeDatabase(filename):
+  for suffix in ("", "-wal", "-shm"): #write ahead log files
+    file_helper.FileHelper.removeFile(filename + suffix)
+
+# --------------------------------------------------------------------------------------------------------------------
+class InfoCacheTest(unittest.TestCase):
+  def setUp(self):
+    self.cache = cache.InfoCache()
+
+  def test_getAlias(self):
+    self.cache.set("Alien (1979)", movie_types.MovieInfo("Alien", "1979"), aliases=["alien"])
+    self.assertEqual(self.cache.get("alien").year, "1979")
+    self.assertEqual(self.cache.get("Alien (1979)").title, "Alien")
+    self.assertEqual(len(self.cache), 1)
+
+  def test_foundAfterMiss(self):
+    for info_cache in (self.cache, cache.InfoCache("testFoundAfterMiss.db", flush_interval_secs=60)):
+      info_cache.setMiss("alien", ["tmdb"])
+      info_cache.set("Alien (1979)", movie_types.MovieInfo("Alien", "1979"), aliases=["alien"])
+      for _ in range(2): #pending, then written
+        self.assertEqual(info_cache.get("alien").year, "1979")
+        self.assertFalse(info_cache.isMiss("alien"))
+        info_cache.flush()
+      self.assertEqual(len(info_cache), 1)
+      info_cache.set("alien", movie_types.MovieInfo("Alien", "1980")) #an alias becomes a key of its own
+      for _ in range(2):
+        self.assertEqual(info_cache.get("alien").year, "1980")
+        self.assertEqual(info_cache.get("Alien (1979)").year, "1979")
+        info_cache.flush()
+      info_cache.close()
+    _removeDatabase("testFoundAfterMiss.db")
+
+  def test_expired(self):
+    self.cache.positive_ttl_secs = -1
+    self.cache.set("Alien", movie_types.MovieInfo("Alien", "1979"))
+    self.assertEqual(self.cache.get("Alien"), None)
+
+  def test_miss(self):
+    self.cache.setMiss("home video", ["tmdb", "imdb"])
+    self.assertTrue(self.cache.isMiss("home video"))
+    self.assertEqual(self.cache.getMissSources("home video"), ["imdb", "tmdb"])
+    self.assertEqual(self.cache.get("home video"), None)
+    self.cache.negative_ttl_secs = -1
+    self.assertFalse(self.cache.isMiss("home video"))
+
+  def test_evictLeastRecentlyUsed(self):
+    for title in ("a", "b", "c"):
+      self.cache.set(title, movie_types.MovieInfo(title))
+    self.cache.get("a")
+    self.cache.max_bytes = 2 * len(self.cache._conn.execute("SELECT value FROM cache_cache").fetchone()[0])
+    self.cache.flush()
+    self.assertTrue(self.cache.get("a"))
+    self.assertFalse(self.cache.get("b"))
+
+  def test_persist(self):
+    filename = "testCache.db"
+    _removeDatabase(filename)
+    saved = cache.InfoCache(filename, "movie", "1.0")
+    saved.set("Alien", movie_types.MovieInfo("Alien", "1979"))
+    saved.close()
+    loaded = cache.InfoCache(filename, "movie", "1.0")
+    self.assertEqual(loaded.get("Alien").year, "1979")
+    loaded.close()
+    newer = cache.InfoCache(filename, "movie", "2.0")
+    self.assertEqual(newer.get("Alien"), None)
+    newer.close()
+    _removeDatabase(filename)
+
+  def test_writeBehind(self):
+    filename = "testWriteBehind.db"
+    _removeDatabase(filename)
+    saved = cache.InfoCache(filename, "movie", "1.0", flush_interval_secs=0.05)
+    saved.set("Alien (1979)", movie_types.MovieInfo("Alien", "1979"), aliases=["alien"])
+    self.assertEqual(saved.get("alien").year, "1979") #read before it is written
+    other = sqlite3.connect(filename)
+    deadline = time.time() + 5
+    while not other.execute("SELECT COUNT(*) FROM cache_movie").fetchone()[0] and time.time() < deadline:
+      time.sleep(0.01)
+    self.assertEqual(other.execute("SELECT alias, key FROM alias_movie").fetchall(), [("alien", "Alien (1979)")])
+    other.close()
+    saved.close()
+    _removeDatabase(filename)
+
+  def test_dumpLoad(self):
+    self.cache.set("Alien (1979)", movie_types.MovieInfo("Alien", "1979"), aliases=["alien"])
+    self.cache.setMiss("home video", ["tmdb"])
+    out = StringIO.StringIO()
+    self.cache.dump(out)
+    loaded = cache.InfoCache()
+    self.assertEqual(loaded.load(StringIO.StringIO(out.getvalue())), 2)
+    self.assertEqual(loaded.get("alien").year, "1979")
+    self.assertEqual(loaded.getMissSources("home video"), ["tmdb"])
+
+# --------------------------------------------------------------------------------------------------------------------
+class SerializerTest(unittest.TestCase):
+  def test_roundTrip(self):
+    season = tv_types.SeasonInfo("Seinfeld", 9)
+    season.episodes = [tv_types.EpisodeInfo(1, "The Butter Shave"), tv_types.EpisodeInfo(2, "The Voice")]
+    values = [movie_types.MovieInfo("Alien", "1979", ["scifi"], "", 1), season,
+              tv_types.AdvancedEpisodeInfo("Seinfeld", 9, 3, "The Serenity Now"), ["imdb", "tmdb"], None]
+    out = StringIO.StringIO()
+    serializer.dump(values, out)
+    loaded = list(serializer.load(StringIO.StringIO(out.getvalue())))
+    self.assertEqual(loaded[0], values[0])
+    self.assertEqual(loaded[0].genres, ["scifi"])
+    self.assertEqual((loaded[1].show_name, loaded[1].season_num), ("Seinfeld", 9))
+    self.assertEqual(loaded[1].episodes, season.episodes)
+    self.assertEqual(loaded[2].show_name, "Seinfeld")
+    self.assertEqual(loaded[2], values[2])
+    self.assertEqual(loaded[3:], values[3:])
+
+  def test_invalid(self):
+    self.assertRaises(TypeError, serializer.encode, object())
+    self.assertRaises(ValueError, serializer.decode, '{"_t":"movie","_v":99}')
+    self.assertRaises(ValueError, serializer.decode, '{"_t":"song","_v":1}')
+
+# --------------------------------------------------------------------------------------------------------------------
+class ScanIndexTest(unittest.TestCase):
+  def setUp(self):
+    self.folder = "scanIndex"
+    file_helper.FileHelper.removeDir(self.folder)
+    file_helper.FileHelper.createDir(file_helper.FileHelper.joinPath(self.folder, "sub"))
+    open(file_helper.FileHelper.joinPath(self.folder, "a.avi"), "w").close()
+    self._age(file_helper.FileHelper.joinPath(self.folder, "a.avi"),
+              file_helper.FileHelper.joinPath(self.folder, "sub"), self.folder)
+    self.index = scan_index.ScanIndex()
+
+  @staticmethod
+  def _age(*paths):
+    """ only folders that haven't been modified recently are indexed """
+    mtime = time.time() - scan_index.RECENTLY_MODIFIED_SECS - 60
+    for path in paths:
+      os.utime(path, (mtime, mtime))
+
+  def tearDown(self):
+    file_helper.FileHelper.removeDir(self.folder)
+
+  def test_unchangedFolderIsNotRead(self):
+    listing = self.index.listDir(self.folder)
+    self.assertEqual(listing[0], ["sub"])
+    self.assertEqual([name for name, _, _ in listing[1]], ["a.avi"])
+    read_dir = file_helper.FileHelper.__dict__["readDir"] #the staticmethod, not the unbound method
+    file_helper.FileHelper.readDir = None #will raise if called
+    try:
+      self.assertEqual(self.index.listDir(self.folder), listing)
+    finally:
+      file_helper.FileHelper.readDir = read_dir
+
+  def test_changedFolderIsRead(self):
+    self.index.listDir(self.folder)
+    file_helper.FileHelper.removeFile(file_helper.FileHelper.joinPath(self.folder, "a.avi"))
+    self.assertEqual(self.index.listDir(self.folder), (["sub"], []))
+
+  def test_recentlyModifiedFolderIsNotIndexed(self):
+    path = file_helper.FileHelper.joinPath(self.folder, "a.avi")
+    folder_stat = os.stat(self.folder)
+    with open(path, "a") as f: #a download that is still being written
+      f.write("more")
+    os.utime(self.folder, (folder_stat.st_atime, folder_stat.st_mtime)) #writing to the file doesn't change the folder
+    self.index.listDir(self.folder)
+    with open(path, "a") as f:
+      f.write("more")
+    os.utime(self.folder, (folder_stat.st_atime, folder_stat.st_mtime))
+    self.assertEqual([size for _, size, _ in self.index.listDir(self.folder)[1]], [8])
+    self.assertEqual(len(self.index), 0)
+
+  def test_getParsed(self):
+    parsed = []
+    def parse(records):
+      parsed.append(records)
+      return [file_helper.FileHelper.basename(record.path) for record in records]
+
+    self.assertEqual(self.index.getParsed(self.folder, "names", parse), ["a.avi"])
+    self.index.listDir(self.folder) #as a walk would
+    self.assertEqual(self.index.getParsed(self.folder, "names", parse), ["a.avi"])
+    self.assertEqual(self.index.getParsed(self.folder, "names", parse), ["a.avi"])
+    self.assertEqual(len(parsed), 1)
+    self.assertEqual(self.index.getParsed(self.folder, "other names", parse), ["a.avi"])
+    self.assertEqual(len(parsed), 2)
+    open(file_helper.FileHelper.joinPath(self.folder, "b.avi"), "w").close()
+    self.assertEqual(sorted(self.index.getParsed(self.folder, "names", parse)), ["a.avi", "b.avi"])
+    self.assertEqual(len(parsed), 3)
+
+  def test_getFolders(self):
+    folders = file_helper.FileHelper.getFolders(self.folder, True, self.index)
+    self.assertEqual(folders, [self.folder, file_helper.FileHelper.joinPath(self.folder, "sub")])
+    self.assertEqual(len(self.index), 2)
+
+  def test_walkRecords(self):
+    records = [record for _, _, folder_records in file_helper.FileHelper.walk(self.folder, True)
+               for record in folder_records]
+    self.assertEqual(records, [file_helper.FileRecord(file_helper.FileHelper.joinPath(self.folder, "a.avi"), 0,
+                                                      records[0].mtime)])
+    self.assertEqual(file_helper.FileHelper.readDir(self.folder),
+                     file_helper.FileHelper._readDirWithListDir(self.folder))
+
+  def test_parallelWalk(self):
+    for i in range(20):
+      file_helper.FileHelper.createDir(os.path.join(self.folder, "sub", str(i), "deeper"))
+    expected = [folder for folder, _, _ in file_helper.FileHelper.walk(self.folder, True)]
+    self.assertEqual(len(expected), 42)
+    for _ in range(5):
+      self.assertEqual(file_helper.FileHelper.getFolders(self.folder, True, self.index, num_threads=4), expected)
+    self.assertEqual(file_helper.FileHelper.getFolders(self.folder, False, num_threads=4), [self.folder])
+
+# --------------------------------------------------------------------------------------------------------------------
+if __name__ == '__main__':
+  unittest.main()
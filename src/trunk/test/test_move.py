@@ -10,6 +10,11 @@ if __name__ == "__main__":
   import os
   sys.path.insert(0, os.path.abspath(__file__+"/../../"))
 
+import errno
+import io
+import os
+import sys
+import threading
 import unittest
 
 from common import file_helper
@@ -70,6 +75,118 @@ class BasicCopyTest(unittest.TestCase):
     file_helper.FileHelper.removeFile(dest)
     file_helper.FileHelper.removeDir("test")
 
+  def test_copyWithProgress(self):
+    src = "copyWithProgressSrc.txt"
+    dest = "copyWithProgressDest.txt"
+    data = os.urandom(3 * pow(2, 20))
+    with open(src, "wb") as f:
+      f.write(data)
+    def kernelCopy(*args):
+      raise OSError(errno.EXDEV, "cross device") #falls back to reading into a buffer
+    old_copy_file_range, old_sendfile = file_helper._COPY_FILE_RANGE, file_helper._SENDFILE
+    file_helper._COPY_FILE_RANGE = file_helper._SENDFILE = kernelCopy
+    progress = []
+    try:
+      self.assertTrue(file_helper.FileHelper.copyFile(src, dest, lambda percentage: progress.append(percentage) or True))
+    finally:
+      file_helper._COPY_FILE_RANGE, file_helper._SENDFILE = old_copy_file_range, old_sendfile
+    with open(dest, "rb") as f:
+      self.assertEqual(f.read(), data)
+    self.assertEqual(progress[-1], 90)
+    file_helper.FileHelper.removeFile(dest)
+    self.assertFalse(file_helper.FileHelper.copyFile(src, dest, lambda percentage: False)) #cancelled
+    self.assertFalse(file_helper.FileHelper.fileExists(dest))
+    file_helper.FileHelper.removeFile(src)
+
+  def test_fsyncPolicy(self):
+    src = "fsyncSrc.txt"
+    dest = "fsyncDest.txt"
+    createTestFile(src)
+    item = renamer.FileRenamer(src, dest, can_overwrite=False, keep_source=True, fsync_policy=renamer.FSYNC_BATCH)
+    self.assertEqual(item.performAction(), renamer.FileRenamer.SUCCESS)
+    self.assertEqual(item._unsynced_files, [dest])
+    item.sync()
+    self.assertEqual(item._unsynced_files, [])
+    file_helper.FileHelper.removeFile(dest)
+    item = renamer.FileRenamer(src, dest, can_overwrite=False, keep_source=True, fsync_policy=renamer.FSYNC_FILE)
+    self.assertEqual(item.performAction(), renamer.FileRenamer.SUCCESS)
+    self.assertTrue(file_helper.FileHelper.fileExists(dest))
+    file_helper.FileHelper.removeFile(src)
+    file_helper.FileHelper.removeFile(dest)
+
+  def test_verifiedCopy(self):
+    src = "verifiedCopySrc.txt"
+    dest = "verifiedCopyDest.txt"
+    with open(src, "wb") as f:
+      f.write("some data")
+    item = renamer.FileRenamer(src, dest, can_overwrite=False, keep_source=True, verify=True)
+    self.assertEqual(item.performAction(), renamer.FileRenamer.SUCCESS)
+    expected = file_helper.FileHelper._hashFile(src, file_helper.FileHelper.newHasher()).hexdigest()
+    self.assertTrue(item.digest.endswith(":" + expected))
+    self.assertTrue(item.digest in item.longDescription())
+    file_helper.FileHelper.removeFile(dest)
+
+    hash_file = file_helper.FileHelper.__dict__["_hashFile"]
+    file_helper.FileHelper._hashFile = staticmethod(lambda filename, hasher: file_helper.FileHelper.newHasher())
+    try:
+      self.assertFalse(file_helper.FileHelper.copyFile(src, dest, hasher=file_helper.FileHelper.newHasher()))
+    finally:
+      file_helper.FileHelper._hashFile = hash_file
+    self.assertFalse(file_helper.FileHelper.fileExists(dest))
+    file_helper.FileHelper.removeFile(src)
+
+  def test_verifiedSubtitleCopy(self):
+    src = "verifiedSubtitleSrc.avi"
+    dest = "verifiedSubtitleDest.avi"
+    createTestFile(src)
+    createTestFile("verifiedSubtitleSrc.srt")
+    hashed = []
+    hash_file = file_helper.FileHelper.__dict__["_hashFile"]
+    def hashFile(filename, hasher):
+      hashed.append(filename)
+      return hash_file.__func__(filename, hasher)
+    file_helper.FileHelper._hashFile = staticmethod(hashFile)
+    try:
+      item = renamer.FileRenamer(src, dest, can_overwrite=False, keep_source=True, subtitle_extensions=[".srt"], 
+                                 verify=True)
+      self.assertEqual(item.performAction(), renamer.FileRenamer.SUCCESS)
+    finally:
+      file_helper.FileHelper._hashFile = hash_file
+    self.assertEqual(hashed, [dest, "verifiedSubtitleDest.srt"])
+    for filename in (src, dest, "verifiedSubtitleSrc.srt", "verifiedSubtitleDest.srt"):
+      file_helper.FileHelper.removeFile(filename)
+
+  def test_kernelCopy(self):
+    if not sys.platform.startswith("linux"): #from os on python 3, otherwise from the c library
+      return
+    src = "kernelCopySrc.txt"
+    dest = "kernelCopyDest.txt"
+    data = os.urandom(pow(2, 20))
+    with open(src, "wb") as f:
+      f.write(data)
+    for copier in (file_helper._copyChunkWithCopyFileRange, file_helper._copyChunkWithSendFile):
+      with io.open(src, "rb", buffering=0) as source, io.open(dest, "wb", buffering=0) as dest_file:
+        self.assertEqual(copier(source, dest_file, 0, 1000, None), 1000)
+        self.assertEqual(copier(source, dest_file, 1000, len(data), None), len(data) - 1000)
+      with open(dest, "rb") as f:
+        self.assertEqual(f.read(), data)
+      file_helper.FileHelper.removeFile(dest)
+    file_helper.FileHelper.removeFile(src)
+
+  def test_preallocate(self):
+    if not sys.platform.startswith("linux"): #from os on python 3, otherwise from the c library
+      return
+    filename = "preallocate.txt"
+    with io.open(filename, "wb", buffering=0) as f:
+      file_helper._preallocate(f, 5000)
+      self.assertEqual(os.fstat(f.fileno()).st_size, 5000)
+    file_helper.FileHelper.removeFile(filename)
+    self.assertRaises(OSError, file_helper._FALLOCATE, 999, 0, 10) #error number returned by posix_fallocate
+
+  def test_canDropCache(self):
+    if sys.platform.startswith("linux"): #from os on python 3, otherwise from the c library
+      self.assertTrue(file_helper.FileHelper.canDropCache())
+
 # --------------------------------------------------------------------------------------------------------------------
 class BasicMoveTest(unittest.TestCase):
   def test_createAndRemove(self):
@@ -265,6 +382,113 @@ class CopyItemTest(unittest.TestCase):
     self.assertFalse(file_helper.FileHelper.fileExists(dest))
     self.assertEqual(res, renamer.FileRenamer.SOURCE_DOES_NOT_EXIST)
 
+# --------------------------------------------------------------------------------------------------------------------
+class _FakeRenamer(renamer.BaseRenamer):
+  def __init__(self, devices, paths=()):
+    super(_FakeRenamer, self).__init__()
+    self.devices = set(devices)
+    self.paths = set(paths)
+    self.is_done = False
+
+  def getDevices(self):
+    return self.devices
+
+  def getPaths(self):
+    return self.paths
+
+  def performAction(self, progress_cb=None):
+    self.is_done = True
+    return renamer.BaseRenamer.SUCCESS
+
+class RenameQueueTest(unittest.TestCase):
+  def test_itemsOnBusyDevicesWait(self):
+    copy_a, copy_b, rename, copy_c = _FakeRenamer([1, 2]), _FakeRenamer([2]), _FakeRenamer([]), _FakeRenamer([3])
+    queue = renamer.RenameQueue([copy_a, copy_b, rename, copy_c])
+    first, first_resources = queue.get()
+    self.assertEqual(first, copy_a)
+    self.assertEqual(queue.get()[0], rename) #copy_b has to wait for copy_a
+    self.assertEqual(queue.get()[0], copy_c)
+    queue.done(first_resources)
+    self.assertEqual(queue.get()[0], copy_b)
+    self.assertEqual(queue.get(), None)
+
+  def test_itemsSharingAPathKeepTheirOrder(self):
+    a_to_b, b_to_c, x_to_y = _FakeRenamer([], ["a", "b"]), _FakeRenamer([], ["b", "c"]), _FakeRenamer([], ["x", "y"])
+    queue = renamer.RenameQueue([a_to_b, b_to_c, x_to_y])
+    first, first_resources = queue.get()
+    self.assertEqual(first, a_to_b)
+    self.assertEqual(queue.get()[0], x_to_y) #b_to_c has to wait for a_to_b
+    queue.done(first_resources)
+    self.assertEqual(queue.get()[0], b_to_c)
+
+  def test_itemWaitingOnAPathWaitsForItsDevices(self):
+    a_to_b, b_to_c, x_to_y = _FakeRenamer([], ["a", "b"]), _FakeRenamer([1], ["b", "c"]), _FakeRenamer([1], ["x", "y"])
+    queue = renamer.RenameQueue([a_to_b, b_to_c, x_to_y])
+    first, first_resources = queue.get()
+    second, second_resources = queue.get()
+    self.assertEqual([first, second], [a_to_b, x_to_y])
+    queue.done(first_resources) #b_to_c no longer waits on a path but device 1 is still in use
+    self.assertEqual(len(queue), 1)
+    queue.done(second_resources)
+    self.assertEqual(queue.get()[0], b_to_c)
+
+  def test_drainKeepsOrder(self):
+    items = [_FakeRenamer([i % 3], [str(i), str(i + 1)]) for i in range(200)]
+    queue = renamer.RenameQueue(items)
+    drained = []
+    while len(queue):
+      item, resources = queue.get()
+      drained.append(item)
+      queue.done(resources)
+    self.assertEqual(drained, items)
+    self.assertEqual(queue.get(), None)
+
+  def test_createDirInParallel(self):
+    folder = os.path.abspath("newParallelFolder")
+    file_helper.FileHelper.removeDir(folder)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(file_helper.FileHelper.createDir(folder)))
+               for _ in range(8)]
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+    file_helper.FileHelper.removeDir(folder)
+    self.assertEqual(results, [True] * 8)
+
+  def test_getDevices(self):
+    item = renamer.FileRenamer("a.avi", "b.avi", can_overwrite=False, keep_source=False)
+    self.assertEqual(item.getDevices(), set())
+    item.keep_source = True
+    self.assertEqual(item.getDevices(), set([os.stat(".").st_dev]))
+    self.assertTrue(file_helper.FileHelper.isSameDevice("a.avi", "new/folder/b.avi"))
+
+  def test_renameWorker(self):
+    items = [_FakeRenamer([i % 2]) for i in range(10)]
+    changed = []
+    worker = renamer.RenameWorker(items=items, num_workers=3)
+    worker.item_changed_cb = lambda item, percentage: changed.append(item)
+    worker.start()
+    worker.wait(10)
+    self.assertFalse(worker.isRunning())
+    self.assertTrue(all(item.is_done for item in items))
+    self.assertEqual(sorted(item.id_ for item in changed), sorted(item.id_ for item in items))
+
+  def test_renameWorkerAddItemsWhileSyncing(self):
+    syncing, can_finish = threading.Event(), threading.Event()
+    first = _FakeRenamer([])
+    first.sync = lambda: syncing.set() or can_finish.wait(10)
+    worker = renamer.RenameWorker(items=[first], num_workers=2)
+    self.assertFalse(worker.addItems([])) #not started yet
+    worker.start()
+    self.assertTrue(syncing.wait(10))
+    later = [_FakeRenamer([]) for _ in range(3)]
+    self.assertTrue(worker.addItems(later))
+    can_finish.set()
+    worker.wait(10)
+    self.assertFalse(worker.isRunning())
+    self.assertTrue(all(item.is_done for item in later))
+
 # --------------------------------------------------------------------------------------------------------------------
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------------------------------------------------
+# Project:             my-renamer
+# Repository:          http://code.google.com/p/my-renamer/
+# License:             Creative Commons GNU GPL v2 (http://creativecommons.org/licenses/GPL/2.0/)
+# Purpose of document: Tests for the producer / consumer pipeline
+# --------------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+  import sys
+  import os
+  sys.path.insert(0, os.path.abspath(__file__+"/../../"))
+
+import threading
+import unittest
+
+from common import pipeline
+from common import worker
+
+# --------------------------------------------------------------------------------------------------------------------
+class PipelineTest(unittest.TestCase):
+  def test_stages(self):
+    batch_sizes = []
+    def double(items):
+      batch_sizes.append(len(items))
+      return [i * 2 for i in items]
+    p = pipeline.Pipeline(iter(range(100))).addStage(double, batch_size=10).addStage(
+        lambda items: [None if i % 4 else i for i in items])
+    ret = list(p)
+    self.assertEqual([i for i in ret if i is not None], range(0, 200, 4))
+    self.assertEqual(len(ret), 100)
+    self.assertTrue(max(batch_sizes) <= 10)
+    self.assertEqual(p.progress(), 100)
+
+  def test_firstResultBeforeSourceIsDone(self):
+    release = threading.Event()
+    def source():
+      yield 1
+      release.wait(5)
+      yield 2
+    p = pipeline.Pipeline(source()).addStage(lambda items: items, batch_size=10)
+    it = iter(p)
+    self.assertEqual(next(it), 1)
+    self.assertTrue(p.progress() < 100)
+    release.set()
+    self.assertEqual(list(it), [2])
+
+  def test_error(self):
+    def fail(items):
+      raise ValueError("bad")
+    self.assertRaises(ValueError, list, pipeline.Pipeline(iter(range(5))).addStage(fail))
+
+# --------------------------------------------------------------------------------------------------------------------
+class _DoubleWorker(worker.AdvancedWorker):
+  def __init__(self, items):
+    super(_DoubleWorker, self).__init__("double")
+    self._items = items
+
+  def _getAllItems(self):
+    return pipeline.Pipeline(iter(self._items)).addStage(lambda items: [i * 2 for i in items], batch_size=4)
+
+  def _applyToItem(self, item):
+    return worker.WorkItem(item, "ok")
+
+class AdvancedWorkerTest(unittest.TestCase):
+  def test_pipelineItems(self):
+    w = _DoubleWorker(range(20))
+    data = []
+    progress = []
+    w.data_cb = data.append
+    w.progress_cb = progress.append
+    w.run()
+    self.assertEqual(sorted(data), range(0, 40, 2))
+    self.assertEqual(len(progress), 20)
+    self.assertTrue(all(0 <= p <= 100 for p in progress))
+
+# --------------------------------------------------------------------------------------------------------------------
+if __name__ == '__main__':
+  unittest.main()
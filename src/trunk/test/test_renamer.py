@@ -10,15 +10,28 @@ if __name__ == "__main__":
   import os
   sys.path.insert(0, os.path.abspath(__file__+"/../../"))
 
+import collections
 import copy
+import os
+import re
+import time
 import unittest
 
+from common import extension
+from common import file_helper
 from common import formatting
+from common import patterns
+from common import scan_index
+
+from media.base import client as base_client
+from media.base import manager as base_manager
+from media.base import model as base_model
 
 from media.tv import types as tv_types
 from media.tv import client as tv_client
 from media.tv import manager as tv_manager
 
+from media.movie import manager as movie_manager
 from media.movie import types as movie_types
 
 # --------------------------------------------------------------------------------------------------------------------
@@ -43,6 +56,46 @@ class SeriesTest(unittest.TestCase):
     self.assertEqual(search_params.show_name, tv_types.UNRESOLVED_NAME)
     self.assertEqual(search_params.season_num, tv_types.UNRESOLVED_KEY)
 
+  def test_seasonsFromFolderNames(self):
+    search_params = tv_manager.TvHelper.seasonsFromFolderNames(["c:/folder/Show/Season 1", "c:/folder/Show Seaso 1"])
+    self.assertEqual([(p.show_name, p.season_num) for p in search_params],
+                     [("Show", 1), (tv_types.UNRESOLVED_NAME, tv_types.UNRESOLVED_KEY)])
+
+  def test_getSourcesWithScanIndex(self):
+    folder = "getSources/Show - Season 1"
+    file_helper.FileHelper.removeDir("getSources")
+    file_helper.FileHelper.createDir(folder)
+    old_mtime = time.time() - scan_index.RECENTLY_MODIFIED_SECS - 60 #so the folder is indexed
+    for name in ("Show.S01E02.avi", "Show.S01E01.avi", ""):
+      if name:
+        open(file_helper.FileHelper.joinPath(folder, name), "w").close()
+      os.utime(file_helper.FileHelper.joinPath(folder, name), (old_mtime, old_mtime))
+    manager = tv_manager.TvManager(base_client.InfoClientHolder())
+    expected = manager._getSources(folder, extension.ALL_FILE_EXTENSIONS, -1)
+    self.assertEqual(sorted((s.ep_num, file_helper.FileHelper.basename(s.filename)) for s in expected),
+                     [(1, "Show.S01E01.avi"), (2, "Show.S01E02.avi")])
+    manager.setScanIndex(scan_index.ScanIndex())
+    self.assertEqual(manager._getSources(folder, extension.ALL_FILE_EXTENSIONS, -1), expected)
+    get_sources = tv_manager.TvHelper.__dict__["getSourcesFromFilenames"]
+    tv_manager.TvHelper.getSourcesFromFilenames = None #the folder is unchanged so it isn't parsed again
+    try:
+      sources = manager._getSources(folder, extension.ALL_FILE_EXTENSIONS, -1)
+    finally:
+      tv_manager.TvHelper.getSourcesFromFilenames = get_sources
+    self.assertEqual(sources, expected)
+    self.assertEqual(sources.getItemByEpisodeNum(2).filename, expected.getItemByEpisodeNum(2).filename)
+    file_helper.FileHelper.removeDir("getSources")
+
+  def test_episodeMapFromFilenamesExplicit(self):
+    #season number is ignored even though the folder has a single file
+    exp = tv_types.SourceFiles()
+    exp.extend([tv_types.SourceFile(10, "Show.S02E10.avi")])
+    self.assertEqual(tv_manager.TvHelper.getSourcesFromFilenames(["Show.S02E10.avi"]), exp)
+    exp = tv_types.SourceFiles()
+    exp.extend([tv_types.SourceFile(2, "Show.1x02.avi"),
+                tv_types.SourceFile(105, "Show.S01E105.avi")])
+    self.assertEqual(tv_manager.TvHelper.getSourcesFromFilenames(["Show.1x02.avi", "Show.S01E105.avi"]), exp)
+
   def test_episodeMapFromFilenamesGood(self):
     exp = tv_types.SourceFiles()
     exp.extend([tv_types.SourceFile(1,"a01.avi"),
@@ -59,6 +112,14 @@ class SeriesTest(unittest.TestCase):
     act = tv_manager.TvHelper.getSourcesFromFilenames(["a01.avi", "b02.avi", "c01.avi"])
     self.assertEqual(act, exp)
 
+  def test_episodeMapFromFilenamesNoNumbers(self):
+    exp = tv_types.SourceFiles()
+    exp.extend([tv_types.SourceFile(tv_types.UNRESOLVED_KEY,"xxx.avi"),
+                tv_types.SourceFile(1,"x.2012.01.avi"),
+                tv_types.SourceFile(2,"y.2012.02.avi")])
+    act = tv_manager.TvHelper.getSourcesFromFilenames(["xxx.avi", "x.2012.01.avi", "y.2012.02.avi"])
+    self.assertEqual(act, exp)
+
   def _testGetdestinationepisodemapfromtvdb(self):
     exp = tv_types.SeasonInfo("Entourage", 1)
     exp.episodes.extend([tv_types.EpisodeInfo(1,"Entourage (Pilot)"),
@@ -258,12 +319,43 @@ class SwitchFilesTest(unittest.TestCase):
     self.assertTrue(tv_types.SourceFile(2,"b02.avi") in act)
     self.assertTrue(tv_types.SourceFile(tv_types.UNRESOLVED_KEY,"a01.avi") in act)
 
+  def test_removeFile(self):
+    act = tv_manager.TvHelper.getSourcesFromFilenames(["a01.avi", "b02.avi", "c01.avi"])
+    act.removeFile("a01.avi")
+    self.assertEqual(act.getItemByFilename("a01.avi"), None)
+    self.assertEqual(act.getItemByEpisodeNum(1), None)
+    act.setEpisodeForFilename(1, "c01.avi")
+    self.assertEqual(act.getItemByEpisodeNum(1), tv_types.SourceFile(1, "c01.avi"))
+    self.assertEqual(act.getItemByEpisodeNum(tv_types.UNRESOLVED_KEY), None)
+
   def test_switchUnresolvedKeyForUnresolvedKey(self):
     before = tv_manager.TvHelper.getSourcesFromFilenames(["a01.avi", "b02.avi", "c03.avi", "xxx.avi"])
     after = copy.copy(before)
     after.setEpisodeForFilename(tv_types.UNRESOLVED_KEY, "xxx.avi")
     self.assertEqual(before, after)
 
+  def test_copyIsIndependent(self):
+    before = tv_manager.TvHelper.getSourcesFromFilenames(["a01.avi", "b02.avi"])
+    after = copy.copy(before)
+    after.setEpisodeForFilename(5, "a01.avi")
+    self.assertEqual(before.getItemByEpisodeNum(1), tv_types.SourceFile(1, "a01.avi"))
+    self.assertEqual(before.getItemByEpisodeNum(5), None)
+    self.assertEqual(after.getItemByEpisodeNum(5), tv_types.SourceFile(5, "a01.avi"))
+    self.assertEqual(after.getItemByEpisodeNum(1), None)
+
+  def test_unindexedChangesRaise(self):
+    act = tv_manager.TvHelper.getSourcesFromFilenames(["a01.avi", "b02.avi"])
+    source = tv_types.SourceFile(3, "c03.avi")
+    for change in (lambda: act.insert(0, source), lambda: act.remove(act[0]), lambda: act.pop(),
+                   lambda: act.__setitem__(0, source), lambda: act.__delitem__(0), lambda: act.__iadd__([source])):
+      self.assertRaises(TypeError, change)
+    with self.assertRaises(TypeError):
+      act[0:1] = [source]
+    with self.assertRaises(TypeError):
+      del act[0:1]
+    self.assertEqual(act, [tv_types.SourceFile(1, "a01.avi"), tv_types.SourceFile(2, "b02.avi")])
+    self.assertEqual(act.getItemByEpisodeNum(2).filename, "b02.avi")
+
 # --------------------------------------------------------------------------------------------------------------------
 class OutputFormatTest(unittest.TestCase):
   def setUp(self):
@@ -293,6 +385,202 @@ class AdvancedOutputFormat(unittest.TestCase):
     out = formatter.getNameFromInfo("<g> - <t> (<y>)%( - Disc <p>)%", info)
     self.assertEqual(out, "Comedy - Anchorman (2004) - Disc 2")
 
+  def test_folder(self):
+    formatter = formatting.MovieNameFormatter()
+    info = movie_types.MovieInfo("Anchorman", 2004, [], "", "")
+    out = formatter.getNameFromInfo(formatter.DEFAULT_FORMAT_STR, info, ".avi", "movies")
+    self.assertEqual(out, "movies//Anchorman (2004).avi")
+
+  def test_invalid(self):
+    formatter = formatting.MovieNameFormatter()
+    for fmt in ("<t> %( - Disc <p>", "%(<t> %(<p>)% )%", "<title>"):
+      self.assertRaises(formatting.FormatError, formatter.getNameFromInfo, fmt, movie_types.MovieInfo("Anchorman"))
+      self.assertTrue(formatter.validate(fmt))
+    self.assertEqual(formatter.validate(formatter.DEFAULT_FORMAT_STR), "")
+
+# --------------------------------------------------------------------------------------------------------------------
+class MovieHelperTest(unittest.TestCase):
+  def test_extractMovieFromFileWithExtCounts(self):
+    #the files don't exist so the ext counts must be used
+    filename = "movies/Alien CD2/Alien 1979.avi"
+    ext_counts = {"movies/Alien CD2": collections.Counter({".avi": 2})}
+    movie = movie_manager.MovieHelper.extractMovieFromFile(filename, ext_counts)
+    self.assertEqual((movie.getInfo().title, movie.getInfo().year, movie.getInfo().part), ("Alien", "1979", 2))
+    #too many movies in the folder to use its name for the part
+    ext_counts["movies/Alien CD2"][".avi"] = 3
+    movie = movie_manager.MovieHelper.extractMovieFromFile(filename, ext_counts)
+    self.assertEqual(movie.getInfo().part, "")
+    movie = movie_manager.MovieHelper.extractMovieFromFile(filename)
+    self.assertEqual(movie.getInfo().title, "")
+
+  def test_countExtensions(self):
+    records = [file_helper.FileRecord(name, 1, 0) for name in ("a/1.avi", "a/2.AVI", "a/3.srt", "a/.4.avi")]
+    self.assertEqual(movie_manager.MovieHelper.countExtensions(records), {".avi": 2, ".srt": 1})
+
+  def test_iterMovies(self):
+    folder = "iterMovies"
+    file_helper.FileHelper.removeDir(folder)
+    file_helper.FileHelper.createDir(folder)
+    for name in ("Alien (1979) CD1.avi", "Alien (1979) CD2.avi", "Aliens 1986.mkv"):
+      open(file_helper.FileHelper.joinPath(folder, name), "w").close()
+    old_mtime = time.time() - scan_index.RECENTLY_MODIFIED_SECS - 60 #so the folder is indexed
+    for name in os.listdir(folder) + [""]:
+      os.utime(file_helper.FileHelper.joinPath(folder, name), (old_mtime, old_mtime))
+    index = scan_index.ScanIndex()
+    getMovies = lambda *args: [(m.filename, m.getInfo().title, m.getInfo().year, m.getInfo().part)
+                               for m in movie_manager.MovieHelper.iterMovies(folder, extension.ALL_FILE_EXTENSIONS, 
+                                                                             True, -1, *args)]
+    expected = [(filename, m.getInfo().title, m.getInfo().year, m.getInfo().part) for filename in 
+                movie_manager.MovieHelper.getFiles(folder, extension.ALL_FILE_EXTENSIONS, True, -1) 
+                for m in [movie_manager.MovieHelper.extractMovieFromFile(filename)]]
+    self.assertEqual([part for _, _, _, part in expected], [1, 2, ""])
+    self.assertEqual(getMovies(), expected)
+    self.assertEqual(getMovies(index), expected)
+    extract = movie_manager.MovieHelper.__dict__["extractMovieFromFile"]
+    movie_manager.MovieHelper.extractMovieFromFile = None #the folder is unchanged so it isn't parsed again
+    try:
+      self.assertEqual(getMovies(index), expected)
+    finally:
+      movie_manager.MovieHelper.extractMovieFromFile = extract
+    file_helper.FileHelper.removeDir(folder)
+
+# --------------------------------------------------------------------------------------------------------------------
+class PatternSetTest(unittest.TestCase):
+  def setUp(self):
+    self.patterns = patterns.PatternSet(re.IGNORECASE).add(
+        "episode", r"s(?P<season>\d+)e(?P<num>\d+)").add(
+        "number", r"(?P<num>\d+)")
+
+  def test_match(self):
+    m = self.patterns.match("S01E02.avi")
+    self.assertEqual(m.rule, "episode")
+    self.assertEqual(m.text, "S01E02")
+    self.assertEqual(m.groups.items(), [("season", "01"), ("num", "02")])
+    self.assertEqual(self.patterns.match("12.avi").groups, {"num": "12"})
+    self.assertEqual(self.patterns.match("a12.avi"), None)
+
+  def test_matchAll(self):
+    self.assertEqual([m and m.rule for m in self.patterns.matchAll(["s1e2", "a", "3"])], ["episode", None, "number"])
+
+  def test_findAll(self):
+    self.assertEqual([(m.rule, m.text) for m in self.patterns.findAll("Show.S01E02.720p")],
+                     [("episode", "S01E02"), ("number", "720")])
+
+  def test_invalidRule(self):
+    self.assertRaises(AssertionError, self.patterns.add, "number", r"\d")
+    self.assertRaises(AssertionError, self.patterns.add, "bad__name", r"\d")
+
+# --------------------------------------------------------------------------------------------------------------------
+class _FakeMovieClient(base_client.BaseInfoClient):
+  def __init__(self, name, titles):
+    super(_FakeMovieClient, self).__init__(name, name, "", has_lib=True, requires_key=False)
+    self.titles = titles
+    self.num_calls = 0
+
+  def _getAllInfo(self, search_params):
+    self.num_calls += 1
+    return [movie_types.MovieInfo(search_params.title, name) for name in self.titles.get(search_params.title, [])]
+
+# --------------------------------------------------------------------------------------------------------------------
+class InfoClientHolderTest(unittest.TestCase):
+  def setUp(self):
+    self.first = _FakeMovieClient("first", {"Alien": ["first"]})
+    self.second = _FakeMovieClient("second", {"Alien": ["second"], "Heat": ["second"]})
+    self.holder = base_client.InfoClientHolder(num_threads=4)
+    self.holder.addClient(self.first)
+    self.holder.addClient(self.second)
+
+  def test_getAllInfoPriorityOrder(self):
+    results = [result.source_name for result in self.holder.getAllInfo(movie_types.MovieSearchParams("Alien"))]
+    self.assertEqual(results, ["first", "second"])
+
+  def test_getInfos(self):
+    params = [movie_types.MovieSearchParams(title) for title in ("Alien", "Heat", "Alien", "Nope", "Heat")]
+    infos = self.holder.getInfos(params)
+    self.assertEqual(infos["Alien"].year, "first")
+    self.assertEqual(infos["Heat"].year, "second")
+    self.assertEqual(infos["Nope"], None)
+    self.assertEqual(self.first.num_calls, 3)
+
+  def test_hasLibrary(self):
+    self.assertTrue(base_client.hasLibrary("unittest"))
+    self.assertTrue(base_client.hasLibrary("xml.dom"))
+    self.assertFalse(base_client.hasLibrary("not_a_real_library"))
+
+  def test_missingLibraryDisablesClient(self):
+    class _MissingLibClient(_FakeMovieClient):
+      def _getAllInfo(self, search_params):
+        import not_a_real_library
+    client = _MissingLibClient("missing", {})
+    self.assertEqual(client.getAllInfo(movie_types.MovieSearchParams("Alien")), None)
+    self.assertFalse(client.isAvailable())
+
+# --------------------------------------------------------------------------------------------------------------------
+class BaseManagerTest(unittest.TestCase):
+  def setUp(self):
+    self.client = _FakeMovieClient("client", {"Alien": ["1979"]})
+    holder = base_client.InfoClientHolder()
+    holder.addClient(self.client)
+    self.manager = base_manager.BaseManager(holder)
+
+  def test_getInfosUsesCache(self):
+    params = [movie_types.MovieSearchParams("Alien"), movie_types.MovieSearchParams("Alien")]
+    self.manager.getInfos(params)
+    infos = self.manager.getInfos(params)
+    self.assertEqual(infos["Alien"].year, "1979")
+    self.assertEqual(self.client.num_calls, 1)
+
+  def test_missIsCachedPerClient(self):
+    params = movie_types.MovieSearchParams("Home Video")
+    self.assertEqual(self.manager.getInfo(params).title, "Home Video")
+    self.manager.getInfos([params])
+    self.assertEqual(self.client.num_calls, 1)
+    new_client = _FakeMovieClient("new client", {"Home Video": ["2001"]})
+    self.manager.getHolder().addClient(new_client)
+    self.assertEqual(self.manager.getInfo(params).year, "2001")
+    self.assertEqual(self.client.num_calls, 1)
+    self.assertEqual(new_client.num_calls, 1)
+    self.assertEqual(self.manager.getInfo(params).year, "2001") #the found info replaces the cached miss
+    self.assertEqual(new_client.num_calls, 1)
+
+# --------------------------------------------------------------------------------------------------------------------
+class DuplicateIndexTest(unittest.TestCase):
+  """ the index used by media.movie.model.MovieModel to flag duplicate movies """
+  def setUp(self):
+    self.index = base_model.DuplicateIndex()
+    self.alien = self._add(movie_types.MovieRenameItem("alien.avi", movie_types.MovieInfo("Alien", "1979")))
+    self.copy = self._add(movie_types.MovieRenameItem("alien copy.avi", movie_types.MovieInfo("Alien", "1979")))
+    self.aliens = self._add(movie_types.MovieRenameItem("aliens.avi", movie_types.MovieInfo("Aliens", "1986")))
+
+  def _add(self, item):
+    self.index.add(item, item.getInfo().getDuplicateKey())
+    return item
+
+  def test_duplicates(self):
+    self.assertEqual(self.index.getDuplicates(self.alien), [self.copy])
+    self.assertEqual(self.index.getDuplicates(self.aliens), [])
+    self.assertEqual(len(self.index), 3)
+
+  def test_editChangesKey(self):
+    old_matches = self.index.remove(self.copy)
+    self.assertEqual(old_matches, set([self.alien]))
+    self.copy.setInfo(movie_types.MovieInfo("Aliens", "1986"))
+    new_matches = self.index.add(self.copy, self.copy.getInfo().getDuplicateKey())
+    self.assertEqual(new_matches, set([self.copy, self.aliens]))
+    self.assertEqual(self.index.getDuplicates(self.alien), [])
+    self.assertEqual(self.index.getDuplicates(self.aliens), [self.copy])
+    self.assertEqual(len(self.index), 3)
+
+  def test_remove(self):
+    self.assertEqual(self.index.remove(self.alien), set([self.copy]))
+    self.assertEqual(self.index.getDuplicates(self.copy), [])
+    self.assertEqual(self.index.getDuplicates(self.alien), [])
+    self.assertEqual(self.index.remove(self.alien), set())
+    self.assertEqual(self.index.remove(self.aliens), set())
+    self.assertEqual(len(self.index), 1)
+    self.index.clear()
+    self.assertEqual(len(self.index), 0)
+
 # --------------------------------------------------------------------------------------------------------------------
 if __name__ == '__main__':
   unittest.main()